@@ -2,6 +2,8 @@ from .simple_gene import SimpleGene
 from .shuffler_chromosome import ShufflerChromosome
 from .simple_chromosome import SimpleChromosome
 from .ocl_ga import OpenCLGA
+from .multi_device_ga import MultiDeviceOpenCLGA
+from .numpy_ga import NumpyGA
 from .ocl_ga_server import start_ocl_ga_server
 from .ocl_ga_client import start_ocl_ga_client
 from . import utils
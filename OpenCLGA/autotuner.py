@@ -0,0 +1,130 @@
+#!/usr/bin/python3
+import os
+import json
+import time
+import pyopencl as cl
+from pyopencl import kernel_work_group_info as kwgi
+from .utilities.generaltaskthread import Logger
+
+## An autotuner which benchmarks kernels over candidate local work sizes.
+#  The winners are persisted in a JSON profile, keyed by device, program,
+#  kernel name and population, and are reused by later runs without
+#  benchmarking again. Kernels of the same name differ between programs, e.g.
+#  the fitness function and the gene type, so the program is identified by the
+#  hash of its final source and build options.
+#  @var __profile_path The path of the profile file.
+#  @var __repeat The number of runs to benchmark a candidate.
+#  @var __profile A dictionary of key to the best local size.
+class Autotuner(Logger):
+    DEFAULT_PROFILE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'OpenCLGA', 'autotune.json')
+
+    def __init__(self, profile_path = None, repeat = 3):
+        Logger.__init__(self)
+        self.__profile_path = profile_path if profile_path else Autotuner.DEFAULT_PROFILE_PATH
+        self.__repeat = repeat
+        self.__profile = {}
+        self.__load()
+
+    @property
+    def profile_path(self):
+        return self.__profile_path
+
+    def __load(self):
+        if not os.path.isfile(self.__profile_path):
+            return
+        try:
+            with open(self.__profile_path, 'r') as f:
+                self.__profile = json.load(f)
+        except Exception as e:
+            self.warning('Failed to load autotune profile {} : {}'.format(self.__profile_path, e))
+
+    def __save(self):
+        try:
+            folder = os.path.dirname(self.__profile_path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            # Write to a temporary file at first to prevent other processes
+            # from reading an incomplete file.
+            temp_path = '{}.{}.tmp'.format(self.__profile_path, os.getpid())
+            with open(temp_path, 'w') as f:
+                json.dump(self.__profile, f, indent=2, sort_keys=True)
+            os.replace(temp_path, self.__profile_path)
+        except Exception as e:
+            self.warning('Failed to save autotune profile {} : {}'.format(self.__profile_path, e))
+
+    def get_key(self, device, program_key, kernel_name, population):
+        return '|'.join([device.platform.name, device.name, device.driver_version,
+                         program_key, kernel_name, str(population)])
+
+    def __get_max_size(self, kernel, device):
+        return min(device.max_work_group_size,
+                   kernel.get_work_group_info(kwgi.WORK_GROUP_SIZE, device))
+
+    ## Return the tuned local size, or None if it is not tuned yet. A size
+    #  which no longer fits the kernel is dropped from the profile.
+    #  @param prg The built program.
+    #  @param device The device to run the kernel.
+    #  @param program_key The hash of the final source and build options.
+    #  @param kernel_name The name of the kernel.
+    #  @param population The number of population.
+    def lookup(self, prg, device, program_key, kernel_name, population):
+        key = self.get_key(device, program_key, kernel_name, population)
+        size = self.__profile.get(key, None)
+        if size is None:
+            return None
+        max_size = self.__get_max_size(cl.Kernel(prg, kernel_name), device)
+        if size > max_size:
+            self.warning('Drop the local size {} of {} which exceeds {}'.format(size, kernel_name,
+                                                                                max_size))
+            del self.__profile[key]
+            self.__save()
+            return None
+        return size
+
+    ## The candidates are 1 and power of 2 multiples of the preferred work group
+    #  size multiple which are allowed by the device and the kernel.
+    def get_candidates(self, prg, device, kernel_name, population):
+        kernel = cl.Kernel(prg, kernel_name)
+        max_size = self.__get_max_size(kernel, device)
+        multiple = kernel.get_work_group_info(kwgi.PREFERRED_WORK_GROUP_SIZE_MULTIPLE, device)
+        candidates = [1]
+        size = multiple
+        while size <= max_size and size < population * 2:
+            if size not in candidates:
+                candidates.append(size)
+            size *= 2
+        return candidates
+
+    ## Benchmark a kernel with all candidates if it is not tuned yet.
+    #  @param queue The command queue to run the kernel.
+    #  @param prg The built program.
+    #  @param program_key The hash of the final source and build options.
+    #  @param kernel_name The name of the kernel.
+    #  @param population The number of population.
+    #  @param run A function which takes a local size, enqueues the kernel and
+    #             returns the list of events.
+    #  @return The best local size.
+    def tune(self, queue, prg, program_key, kernel_name, population, run):
+        device = queue.device
+        best_size = self.lookup(prg, device, program_key, kernel_name, population)
+        if best_size is not None:
+            return best_size
+
+        best_time = None
+        for size in self.get_candidates(prg, device, kernel_name, population):
+            # warm up
+            cl.wait_for_events(run(size))
+            elapsed = None
+            for i in range(self.__repeat):
+                start = time.perf_counter()
+                cl.wait_for_events(run(size))
+                diff = time.perf_counter() - start
+                elapsed = diff if elapsed is None else min(elapsed, diff)
+            if best_time is None or elapsed < best_time:
+                best_time = elapsed
+                best_size = size
+
+        self.info('Autotune {} : local size {} ({:.6f} sec.)'.format(kernel_name, best_size, best_time))
+        self.__profile[self.get_key(device, program_key, kernel_name, population)] = best_size
+        self.__save()
+        return best_size
@@ -0,0 +1,2 @@
+from .problems import PROBLEMS
+from .runner import run_benchmark, compare_results
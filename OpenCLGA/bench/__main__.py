@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+import sys
+import json
+import argparse
+from .problems import PROBLEMS
+from .runner import run_benchmark, compare_results
+
+## Run benchmarks of the bundled problems headlessly, e.g.
+#  python3 -m OpenCLGA.bench --populations 256 1024 --output result.json
+#  python3 -m OpenCLGA.bench --compare result.json
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark OpenCLGA with the bundled problems')
+    parser.add_argument('--problems', nargs='+', choices=sorted(PROBLEMS.keys()),
+                        help='the problems to be benchmarked, all by default')
+    parser.add_argument('--populations', nargs='+', type=int, default=[256, 1024],
+                        help='the population sizes')
+    parser.add_argument('--lengths', nargs='+', type=int,
+                        help='the chromosome lengths, the default ones of each problem if not set')
+    parser.add_argument('--generations', type=int, default=50,
+                        help='the number of generations of each case')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='the seed of problem data and random numbers')
+    parser.add_argument('--examples', help='the path of examples folder')
+    parser.add_argument('--profile', action='store_true',
+                        help='record the time of each kernel phase with OpenCL profiling')
+    parser.add_argument('--output', help='the file to write the results in JSON')
+    parser.add_argument('--compare', help='the baseline results in JSON to be compared with')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='the tolerated ratio of regression')
+    parser.add_argument('--timeout-per-gen', type=float, default=10,
+                        help='the seconds allowed for each generation before a case fails')
+    args = parser.parse_args()
+
+    current = run_benchmark(args.problems, args.populations, args.lengths, args.generations,
+                            args.seed, args.examples, args.profile, log=print,
+                            timeout_per_gen=args.timeout_per_gen)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, current, args.threshold)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
+        print('No regression against ' + args.compare)
+    elif any(['error' in result for result in current['results']]):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
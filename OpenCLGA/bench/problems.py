@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+import os
+import json
+import random
+import numpy
+from ..simple_gene import SimpleGene
+from ..simple_chromosome import SimpleChromosome
+from ..shuffler_chromosome import ShufflerChromosome
+
+## The bundled problems of examples. Each problem builds the options of
+#  OpenCLGA for a chromosome length, except population and termination.
+#  The random data of problems are generated from a given seed, so the same
+#  case is benchmarked with the same data every time.
+
+def read_kernel(examples_path, *names):
+    with open(os.path.join(examples_path, *names), 'r') as f:
+        return f.read()
+
+def build_tsp(examples_path, length, rand):
+    city_ids = list(range(length))
+    points = numpy.array([(rand.random() * 100, rand.random() * 100) for city_id in city_ids],
+                         dtype=numpy.float32)
+    return { 'sample_chromosome' : ShufflerChromosome([SimpleGene(v, city_ids) for v in city_ids]),
+             'fitness_kernel_str' : read_kernel(examples_path, 'tsp', 'kernel', 'simple_tsp.cl'),
+             'fitness_func' : 'simple_tsp_fitness',
+             'fitness_args' : [{ 't' : 'float', 'v' : points[:, 0], 'n' : 'x', 'placement' : 'read_only' },
+                               { 't' : 'float', 'v' : points[:, 1], 'n' : 'y', 'placement' : 'read_only' }],
+             'opt_for_max' : 'min' }
+
+def build_grouping(examples_path, length, rand):
+    num_of_groups = 10
+    group_id_set = list(range(num_of_groups))
+    points = numpy.array([(rand.random() * 100, rand.random() * 100) for i in range(length)],
+                         dtype=numpy.float32)
+    group_ids = [rand.randint(0, num_of_groups - 1) for i in range(length)]
+    return { 'sample_chromosome' : SimpleChromosome([SimpleGene(group_id, group_id_set)
+                                                     for group_id in group_ids]),
+             'fitness_kernel_str' : read_kernel(examples_path, 'grouping', 'grouping.cl'),
+             'fitness_func' : 'grouping_fitness',
+             'fitness_args' : [{ 't' : 'int', 'v' : num_of_groups, 'n' : 'numOfGroups',
+                                 'placement' : 'read_only' },
+                               { 't' : 'float', 'v' : points[:, 0], 'n' : 'x', 'placement' : 'read_only' },
+                               { 't' : 'float', 'v' : points[:, 1], 'n' : 'y', 'placement' : 'read_only' }],
+             'opt_for_max' : 'min' }
+
+## The length of algebra expansion is fixed to 11 genes.
+def build_algebra_expansion(examples_path, length, rand):
+    value_ranges = [10, 20, 50, 150, 250, 300, 250, 150, 50, 20, 10]
+    return { 'sample_chromosome' : SimpleChromosome([SimpleGene(0, list(range(v)))
+                                                     for v in value_ranges]),
+             'fitness_kernel_str' : read_kernel(examples_path, 'algebra_expansion', 'kernel',
+                                                'expansion.cl'),
+             'fitness_func' : 'expansion_fitness',
+             'opt_for_max' : 'min' }
+
+## The first 'length' cities of the Taiwan travel problem, sorted as the
+#  example does.
+def build_taiwan_travel(examples_path, length, rand):
+    with open(os.path.join(examples_path, 'taiwan_travel', 'TW319_368Addresses-no-far-islands.json'),
+              'r', encoding='UTF-8') as f:
+        groups = json.load(f)
+    cities = numpy.array(sorted([(float(city['Longitude']), float(city['Latitude']))
+                                 for group in groups.values() for city in group.values()],
+                                key=lambda city: -city[1])[:length], dtype=numpy.float32)
+    city_ids = list(range(len(cities)))
+    return { 'sample_chromosome' : ShufflerChromosome([SimpleGene(v, city_ids) for v in city_ids]),
+             'fitness_kernel_str' : read_kernel(examples_path, 'taiwan_travel', 'kernel',
+                                                'taiwan_fitness.cl'),
+             'fitness_func' : 'taiwan_fitness',
+             'fitness_args' : [{ 't' : 'float', 'v' : cities[:, 0], 'n' : 'x', 'placement' : 'read_only' },
+                               { 't' : 'float', 'v' : cities[:, 1], 'n' : 'y', 'placement' : 'read_only' }],
+             'opt_for_max' : 'min' }
+
+## Problem name to a tuple of the builder and the default chromosome lengths.
+#  None means the length is fixed.
+PROBLEMS = { 'tsp' : (build_tsp, [20, 50]),
+             'grouping' : (build_grouping, [50, 100]),
+             'algebra_expansion' : (build_algebra_expansion, [None]),
+             'taiwan_travel' : (build_taiwan_travel, [100, 350]) }
+
+## Return the examples folder of a source checkout.
+def default_examples_path():
+    return os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                         '..', '..', 'examples'))
+
+## Build the options of a problem.
+#  @param name The name of problem in PROBLEMS.
+#  @param length The chromosome length, None for the fixed one.
+#  @param seed The seed of random data.
+#  @param examples_path The examples folder which has the kernels and data.
+def build_problem(name, length, seed, examples_path = None):
+    builder, lengths = PROBLEMS[name]
+    if lengths == [None]:
+        length = None
+    return builder(examples_path or default_examples_path(), length, random.Random(seed))
@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+import time
+import threading
+import pyopencl as cl
+from .. import utils
+from ..ocl_ga import OpenCLGA
+from .problems import PROBLEMS, build_problem
+
+## Return the generation which reaches the final best fitness within the
+#  tolerance, in ratio of the improvement from the first generation.
+def converged_generation(bests, tolerance = 0.01):
+    improvement = abs(bests[-1] - bests[0])
+    for index, best in enumerate(bests):
+        if abs(bests[-1] - best) <= improvement * tolerance:
+            return index
+    return len(bests) - 1
+
+## Wait until the GA is stopped. The GA thread ends without reaching the
+#  stopped state if it raises, so it is checked while waiting, too.
+#  @param ga The OpenCLGA which is running.
+#  @param evt The event which is set when the GA is stopped.
+#  @param timeout The max seconds to wait.
+def wait_for_stopped(ga, evt, timeout):
+    deadline = time.time() + timeout
+    while not evt.wait(1):
+        if not ga.thread.is_alive():
+            raise RuntimeError('The GA thread ended before the GA is stopped')
+        if time.time() > deadline:
+            # Stop it without waiting, it may never respond.
+            threading.Thread(target=ga.stop, daemon=True).start()
+            raise TimeoutError('The GA is not stopped in {} seconds'.format(timeout))
+
+## Run a single benchmark case and return its result as a dictionary.
+#  @param cl_context The OpenCL context shared by all cases.
+#  @param problem The name of problem in PROBLEMS.
+#  @param population The population size.
+#  @param length The chromosome length, None for the fixed one.
+#  @param generations The number of generations to be evolved.
+#  @param seed The seed of problem data and GA random numbers.
+#  @param examples_path The examples folder, None for the one of source checkout.
+#  @param profiling Record the time of each kernel phase at device, too.
+#  @param timeout_per_gen The seconds allowed for each generation. The case
+#                         fails if it isn't done in 60 seconds plus them.
+def run_case(cl_context, problem, population, length, generations, seed = 1,
+             examples_path = None, prob_mutation = 0.1, prob_crossover = 0.8,
+             profiling = False, timeout_per_gen = 10):
+    options = build_problem(problem, length, seed, examples_path)
+    options.update({ 'population' : population,
+                     'termination' : { 'type' : 'count', 'count' : generations },
+                     'cl_context' : cl_context,
+                     'seed' : seed,
+                     'profiling' : profiling })
+    sample_chromosome = options['sample_chromosome']
+    evt = threading.Event()
+    def state_changed(state):
+        if 'stopped' == state:
+            evt.set()
+
+    phases = {}
+    start = time.time()
+    ga = OpenCLGA(options, action_callbacks = { 'state' : state_changed })
+    phases['build'] = time.time() - start
+    start = time.time()
+    ga.prepare()
+    phases['prepare'] = time.time() - start
+    start = time.time()
+    ga.run(prob_mutation, prob_crossover)
+    wait_for_stopped(ga, evt, 60 + generations * timeout_per_gen)
+    phases['evolve'] = time.time() - start
+
+    statistics = ga.get_statistics()
+    generations_done = sorted(key for key in statistics if key != 'avg_time_per_gen')
+    bests = [float(statistics[gen]['best']) for gen in generations_done]
+    _, best_fitness, _ = ga.get_the_best()
+    if profiling:
+        phases.update({ phase : info['total_time'] for phase, info in ga.get_profile().items() })
+    return { 'problem' : problem,
+             'population' : population,
+             'length' : sample_chromosome.num_of_genes,
+             'generations' : generations,
+             'generations_per_sec' : generations / phases['evolve'],
+             'avg_time_per_gen' : float(statistics.get('avg_time_per_gen', 0)),
+             'phases' : phases,
+             'device_memory' : utils.get_device_memory_size(ga, sample_chromosome),
+             'convergence' : { 'first_best' : bests[0],
+                               'last_best' : bests[-1],
+                               'converged_generation' : converged_generation(bests) },
+             'best_fitness' : float(best_fitness) }
+
+## Run all combinations of problems, populations and chromosome lengths.
+#  @param problems The names of problems, all of PROBLEMS by default.
+#  @param populations The population sizes.
+#  @param lengths The chromosome lengths, the default ones of each problem
+#                 if None.
+#  @param profiling Record the time of each kernel phase at device, too.
+#  @param log The function to show progress, e.g. print.
+#  @param timeout_per_gen The seconds allowed for each generation of a case.
+#  @return A dictionary of device information and the results of cases. A
+#          failed case has only 'problem', 'population', 'length',
+#          'generations' and 'error', and the next cases are still run.
+def run_benchmark(problems = None, populations = [256, 1024], lengths = None,
+                  generations = 50, seed = 1, examples_path = None, profiling = False,
+                  log = None, timeout_per_gen = 10):
+    cl_context = cl.create_some_context(interactive = False)
+    device = cl_context.devices[0]
+    results = []
+    for problem in (problems or sorted(PROBLEMS.keys())):
+        problem_lengths = PROBLEMS[problem][1]
+        if lengths is not None and problem_lengths != [None]:
+            problem_lengths = lengths
+        for length in problem_lengths:
+            for population in populations:
+                try:
+                    result = run_case(cl_context, problem, population, length, generations,
+                                      seed, examples_path, profiling=profiling,
+                                      timeout_per_gen=timeout_per_gen)
+                except Exception as e:
+                    result = { 'problem' : problem,
+                               'population' : population,
+                               'length' : length,
+                               'generations' : generations,
+                               'error' : '{}: {}'.format(type(e).__name__, e) }
+                if log and 'error' in result:
+                    log('%s population %d length %s: failed, %s'%(
+                        problem, population, result['length'], result['error']))
+                elif log:
+                    log('%s population %d length %d: %.2f gens/sec, best %f'%(
+                        problem, population, result['length'],
+                        result['generations_per_sec'], result['best_fitness']))
+                results.append(result)
+    return { 'platform' : device.platform.name,
+             'device' : device.name,
+             'generations' : generations,
+             'seed' : seed,
+             'results' : results }
+
+## Compare the current results with the baseline ones. Cases are matched by
+#  problem, population and chromosome length.
+#  @param baseline The output of run_benchmark as baseline.
+#  @param current The output of run_benchmark to be checked.
+#  @param threshold The tolerated ratio of slowdown or worse final best.
+#  @return A list of regression messages. It is empty if there's no regression.
+#          Failed cases of current results are regressions, too.
+def compare_results(baseline, current, threshold = 0.1):
+    def key_of(result):
+        return (result['problem'], result['population'], result['length'])
+    baseline_results = { key_of(result) : result for result in baseline['results']
+                                                  if 'error' not in result }
+    regressions = []
+    for result in current['results']:
+        name = '%s population %d length %s'%key_of(result)
+        if 'error' in result:
+            regressions.append('%s: failed, %s'%(name, result['error']))
+            continue
+        base = baseline_results.get(key_of(result), None)
+        if base is None:
+            continue
+        ratio = result['generations_per_sec'] / base['generations_per_sec']
+        if ratio < 1 - threshold:
+            regressions.append('%s: %.2f gens/sec, %.1f%% slower than baseline %.2f'%(
+                name, result['generations_per_sec'], (1 - ratio) * 100,
+                base['generations_per_sec']))
+        # All bundled problems are minimization problems.
+        tolerance = abs(base['best_fitness']) * threshold
+        if result['best_fitness'] > base['best_fitness'] + tolerance:
+            regressions.append('%s: best fitness %f is worse than baseline %f'%(
+                name, result['best_fitness'], base['best_fitness']))
+    return regressions
@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+import threading
+from collections import deque
+from .utilities.generaltaskthread import Logger
+
+## A dispatcher which delivers notifications to a callback on its own thread.
+#  Notifications are kept in a bounded queue, so the caller never waits for
+#  the callback. When the queue is full, the policy decides what to do.
+#  If policy is 'drop_new', the incoming notification is dropped.
+#  If policy is 'drop_old', the oldest pending notification is dropped.
+#  If policy is 'coalesce', the incoming notification is merged into the
+#  latest pending one, e.g. only the latest statistics are kept with size 1.
+#  @var __callback The function to be called with the arguments of notify.
+#  @var __max_size The max number of pending notifications.
+#  @var __policy 'drop_new', 'drop_old' or 'coalesce'.
+#  @var __merge A function which takes the arguments of the pending and the
+#               incoming notifications and returns the merged arguments. The
+#               incoming one replaces the pending one by default.
+#  @var __queue The pending notifications.
+#  @var __cond The condition to protect the queue and wake up the thread.
+#  @var __busy True when the callback is being called.
+#  @var __stopped True if the dispatcher is stopped.
+#  @var delivered The number of delivered notifications.
+#  @var dropped The number of dropped notifications.
+#  @var merged The number of notifications merged into others.
+class CallbackDispatcher(Logger):
+    POLICIES = ['drop_new', 'drop_old', 'coalesce']
+
+    def __init__(self, callback, max_size = 64, policy = 'coalesce', merge = None, name = 'GACallback'):
+        Logger.__init__(self)
+        assert max_size > 0
+        assert policy in CallbackDispatcher.POLICIES
+        self.__callback = callback
+        self.__max_size = max_size
+        self.__policy = policy
+        self.__merge = merge if merge else lambda pending, incoming: incoming
+        self.__queue = deque()
+        self.__cond = threading.Condition()
+        self.__busy = False
+        self.__stopped = False
+        self.delivered = 0
+        self.dropped = 0
+        self.merged = 0
+        self.__thread = threading.Thread(target=self.__run, name=name)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    @property
+    def metrics(self):
+        with self.__cond:
+            return { 'delivered' : self.delivered,
+                     'dropped' : self.dropped,
+                     'merged' : self.merged,
+                     'pending' : len(self.__queue) }
+
+    ## Queue a notification without blocking.
+    #  @param args The arguments to call the callback.
+    def notify(self, *args):
+        with self.__cond:
+            if self.__stopped:
+                self.dropped += 1
+                return
+            if len(self.__queue) >= self.__max_size:
+                if self.__policy == 'drop_new':
+                    self.dropped += 1
+                    return
+                elif self.__policy == 'drop_old':
+                    self.__queue.popleft()
+                    self.dropped += 1
+                else:
+                    self.__queue[-1] = self.__merge(self.__queue[-1], args)
+                    self.merged += 1
+                    return
+            self.__queue.append(args)
+            self.__cond.notify_all()
+
+    def __run(self):
+        while True:
+            with self.__cond:
+                while len(self.__queue) == 0 and not self.__stopped:
+                    self.__cond.wait()
+                if len(self.__queue) == 0:
+                    break
+                args = self.__queue.popleft()
+                self.__busy = True
+            try:
+                self.__callback(*args)
+            except Exception as e:
+                self.error('Callback failed : {}'.format(e))
+            with self.__cond:
+                self.__busy = False
+                self.delivered += 1
+                self.__cond.notify_all()
+
+    ## Wait until all pending notifications are delivered. It returns at once
+    #  if it is called by the callback itself.
+    def flush(self):
+        if threading.current_thread() is self.__thread:
+            return
+        with self.__cond:
+            while len(self.__queue) > 0 or self.__busy:
+                self.__cond.wait()
+
+    ## Stop the dispatcher after delivering pending notifications.
+    def stop(self):
+        with self.__cond:
+            self.__stopped = True
+            self.__cond.notify_all()
+        if threading.current_thread() is not self.__thread:
+            self.__thread.join()
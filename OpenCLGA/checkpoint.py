@@ -0,0 +1,160 @@
+#!/usr/bin/python3
+import os
+import time
+import queue
+import numpy
+import pickle
+import shutil
+import threading
+import pyopencl as cl
+from .utilities.generaltaskthread import Logger
+
+## A checkpointer which takes snapshots of device memory while running.
+#  The device buffers are read back without blocking into one of two sets of
+#  pinned host buffers, and a background thread writes them to a snapshot
+#  folder once the readback is done. A snapshot folder contains a .npy file for
+#  each buffer and meta.pickle for other information. Snapshots could be
+#  loaded with memory mapping by load_checkpoint.
+#  If both sets of host buffers are still being written, the checkpoint is
+#  skipped, so that the evolution never waits for the disk.
+#  @var __path The folder to keep snapshot folders.
+#  @var __interval The interval in seconds between two checkpoints.
+#  @var __keep The number of latest snapshots to be kept.
+#  @var __slots Two sets of host buffers, each is a dictionary of buffer name
+#               to a tuple of the mapped numpy array and the pinned buffer.
+#  @var __busy Whether a set of host buffers is waiting to be written.
+#  @var __pending The queue of checkpoints for the writer thread.
+#  @var __last_time The timestamp of the last checkpoint.
+#  @var written The number of written snapshots.
+#  @var skipped The number of skipped checkpoints.
+class Checkpointer(Logger):
+    PREFIX = 'checkpoint-'
+    META_FILE = 'meta.pickle'
+
+    def __init__(self, path, interval = 300, keep = 2):
+        Logger.__init__(self)
+        assert keep > 0
+        self.__path = path
+        self.__interval = interval
+        self.__keep = keep
+        self.__slots = [{}, {}]
+        self.__busy = [False, False]
+        self.__lock = threading.Lock()
+        self.__pending = queue.Queue()
+        self.__last_time = time.time()
+        self.written = 0
+        self.skipped = 0
+        self.__thread = threading.Thread(target=self.__run, name='GACheckpoint')
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    @property
+    def path(self):
+        return self.__path
+
+    def is_due(self):
+        return time.time() - self.__last_time >= self.__interval
+
+    ## Allocate a host buffer which is backed by a pinned(page-locked) memory
+    #  if the OpenCL implementation supports it.
+    def __allocate_host_buffer(self, cl_queue, shape, dtype):
+        mf = cl.mem_flags
+        nbytes = int(numpy.prod(shape)) * numpy.dtype(dtype).itemsize
+        pinned = cl.Buffer(cl_queue.context, mf.READ_WRITE | mf.ALLOC_HOST_PTR, nbytes)
+        host, evt = cl.enqueue_map_buffer(cl_queue, pinned,
+                                          cl.map_flags.READ | cl.map_flags.WRITE,
+                                          0, shape, dtype)
+        evt.wait()
+        return host, pinned
+
+    ## Read device buffers back without blocking and write them on the
+    #  background thread.
+    #  @param cl_queue The command queue. The readback is enqueued after all
+    #                  enqueued commands.
+    #  @param buffers A dictionary of name to a tuple of the device buffer, the
+    #                 shape and the numpy dtype.
+    #  @param meta A dictionary of other information to be pickled.
+    #  @return False if it is skipped.
+    def capture(self, cl_queue, buffers, meta):
+        self.__last_time = time.time()
+        with self.__lock:
+            if all(self.__busy):
+                self.skipped += 1
+                self.warning('Checkpoint is skipped since the previous ones are still being written.')
+                return False
+            slot = self.__busy.index(False)
+            self.__busy[slot] = True
+
+        hosts = self.__slots[slot]
+        evts = []
+        for name, (dev, shape, dtype) in buffers.items():
+            if name not in hosts or hosts[name][0].shape != shape or hosts[name][0].dtype != dtype:
+                hosts[name] = self.__allocate_host_buffer(cl_queue, shape, dtype)
+            evts.append(cl.enqueue_copy(cl_queue, hosts[name][0], dev, is_blocking=False))
+        self.__pending.put((slot, evts, meta))
+        return True
+
+    def __run(self):
+        while True:
+            item = self.__pending.get()
+            if item is None:
+                break
+            slot, evts, meta = item
+            try:
+                cl.wait_for_events(evts)
+                self.__write(slot, meta)
+                self.written += 1
+            except Exception as e:
+                self.error('Failed to write checkpoint : {}'.format(e))
+            with self.__lock:
+                self.__busy[slot] = False
+
+    def __write(self, slot, meta):
+        folder = os.path.join(self.__path, '{}{:010d}'.format(Checkpointer.PREFIX,
+                                                             meta['generation_idx']))
+        # Write to a temporary folder at first to prevent restoring from an
+        # incomplete snapshot.
+        temp_folder = folder + '.tmp'
+        if os.path.isdir(temp_folder):
+            shutil.rmtree(temp_folder)
+        os.makedirs(temp_folder)
+        for name, (host, pinned) in self.__slots[slot].items():
+            numpy.save(os.path.join(temp_folder, name + '.npy'), host)
+        with open(os.path.join(temp_folder, Checkpointer.META_FILE), 'wb') as f:
+            pickle.dump(meta, f)
+        if os.path.isdir(folder):
+            shutil.rmtree(folder)
+        os.replace(temp_folder, folder)
+        self.info('Checkpoint is written to {}'.format(folder))
+
+        for old in list_checkpoints(self.__path)[:-self.__keep]:
+            shutil.rmtree(old, ignore_errors=True)
+
+    ## Stop the writer thread after writing pending checkpoints.
+    def stop(self):
+        self.__pending.put(None)
+        self.__thread.join()
+
+## Return the snapshot folders in path from the oldest to the latest one.
+def list_checkpoints(path):
+    if not os.path.isdir(path):
+        return []
+    names = sorted([name for name in os.listdir(path)
+                    if name.startswith(Checkpointer.PREFIX) and not name.endswith('.tmp')])
+    return [os.path.join(path, name) for name in names]
+
+## Load a snapshot. The arrays are memory-mapped in copy-on-write mode without
+#  reading the whole file.
+#  @param path A snapshot folder, or a folder of snapshots for the latest one.
+#  @return A dictionary of the meta information and the arrays.
+def load_checkpoint(path):
+    if not os.path.isfile(os.path.join(path, Checkpointer.META_FILE)):
+        checkpoints = list_checkpoints(path)
+        assert len(checkpoints) > 0, 'No checkpoint in {}'.format(path)
+        path = checkpoints[-1]
+    with open(os.path.join(path, Checkpointer.META_FILE), 'rb') as f:
+        data = pickle.load(f)
+    for name in os.listdir(path):
+        if name.endswith('.npy'):
+            data[name[:-4]] = numpy.load(os.path.join(path, name), mmap_mode='c')
+    return data
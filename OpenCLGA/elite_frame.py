@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+import zlib
+import struct
+import numpy
+
+## The binary frame of elites sent from workers to the server.
+#  A frame is a header followed by the body. The body is the raw DNA array of
+#  all elites and then their float32 fitnesses. It is compressed with zlib if
+#  the COMPRESSED flag is set. All fields are little-endian, since frames
+#  travel between machines.
+#  header: magic(4s), version(B), flags(B), dna dtype char(c), reserved(x),
+#          number of elites(I), dna size of an elite(I)
+MAGIC = b'OGEF'
+VERSION = 1
+FLAG_COMPRESSED = 0x01
+HEADER = struct.Struct('<4sBBcxII')
+DEFAULT_COMPRESS_THRESHOLD = 1024
+
+## Encode elites into a binary frame.
+#  @param elites The numpy array of DNA of all elites.
+#  @param fitnesses The fitnesses of all elites.
+#  @param dna_size The DNA size of an elite.
+#  @param compress_level The zlib compression level, 0 or None for no compression.
+#  @param compress_threshold The body is not compressed if its size is smaller
+#                            than this value in bytes.
+#  @return The frame in bytes.
+def encode_elites(elites, fitnesses, dna_size, compress_level = None,
+                  compress_threshold = DEFAULT_COMPRESS_THRESHOLD):
+    elites = numpy.asarray(elites)
+    elites = numpy.ascontiguousarray(elites, dtype=elites.dtype.newbyteorder('<'))
+    fitnesses = numpy.ascontiguousarray(fitnesses, dtype='<f4')
+    body = elites.tobytes() + fitnesses.tobytes()
+    flags = 0
+    if compress_level and len(body) >= compress_threshold:
+        body = zlib.compress(body, compress_level)
+        flags |= FLAG_COMPRESSED
+    header = HEADER.pack(MAGIC, VERSION, flags, elites.dtype.char.encode('ascii'),
+                         len(fitnesses), dna_size)
+    return header + body
+
+## Decode a frame from encode_elites. The arrays are views of the frame (or
+#  the decompressed body) without copying, so they are read-only.
+#  @param frame The frame in bytes.
+#  @return A dictionary with 'elites', 'fitnesses' and 'dna_size'.
+def decode_elites(frame):
+    magic, version, flags, dtype_char, top, dna_size = HEADER.unpack_from(frame)
+    assert magic == MAGIC, 'Not an elite frame'
+    assert version == VERSION, 'Unsupported elite frame version {}'.format(version)
+    body = memoryview(frame)[HEADER.size:]
+    if flags & FLAG_COMPRESSED:
+        body = zlib.decompress(body)
+    dtype = numpy.dtype(dtype_char.decode('ascii')).newbyteorder('<')
+    elites = numpy.frombuffer(body, dtype=dtype, count=top * dna_size)
+    fitnesses = numpy.frombuffer(body, dtype='<f4', count=top,
+                                 offset=elites.nbytes)
+    return { 'elites' : elites,
+             'fitnesses' : fitnesses,
+             'dna_size' : dna_size }
@@ -57,7 +57,7 @@ void ant_tsp_calculate_path_probabilities(global int* ant_visited_nodes,
   }
 }
 
-int ant_tsp_random_choose(global float* tmp_path_probabilities, uint* rand_holder)
+int ant_tsp_random_choose(global float* tmp_path_probabilities, rand_state* rand_holder)
 {
   return random_choose_by_ratio(tmp_path_probabilities, rand_holder, NODE_COUNT);
 }
@@ -93,8 +93,8 @@ __kernel void ant_tsp_run_ant(global int* ant_visited_nodes,
     return;
   }
   // init random numbers.
-  uint ra[1];
-  init_rand(rand_input[idx], ra);
+  rand_state ra[1];
+  init_rand(ra, rand_input[idx], 0, idx, 0);
 
   int next_index = 1;
 
@@ -29,7 +29,7 @@ float acceptance_probability(float old_cost, float new_cost, float temperature)
   return exp((old_cost - new_cost) / temperature);
 }
 
-void find_neighbor(uint* rand_holder, local int* ori_solution,
+void find_neighbor(rand_state* rand_holder, local int* ori_solution,
                    local int* neighbor_solution)
 {
   int rndIdxA, rndIdxB;
@@ -57,8 +57,8 @@ __kernel void ocl_sa_populate_solutions(int iterations,
     return;
   }
   // create a private variable for each kernel to hold randome number.
-  uint ra[1];
-  init_rand(rand_holder[idx], ra);
+  rand_state ra[1];
+  init_rand(ra, rand_holder[idx], 0, idx, 0);
 
   int elements[] = ELEMENT_SPACE;
   int rndIdx;
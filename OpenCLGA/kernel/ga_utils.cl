@@ -3,6 +3,74 @@
 
 #include "Noise.cl"
 
+/**
+ * GENE_TYPE is the integer type to store a gene. It is the narrowest one which
+ * holds the largest gene index, e.g. uchar, ushort or int, and is set by the
+ * kernelize function of chromosomes.
+ */
+#ifndef GENE_TYPE
+#define GENE_TYPE int
+#endif
+
+/**
+ * The layout of chromosomes. CHROMOSOME_INTERLEAVED is set at ocl_ga.py.
+ * If it is 0, chromosomes are stored one by one and the genes of a chromosome
+ * are contiguous. If it is 1, gene i of all chromosomes are contiguous. The
+ * memory accesses of adjacent work items are coalesced in this layout.
+ * CHROMOSOME_AT(cs, idx) gives the chromosome at idx of cs, and
+ * CHROMOSOME_GENE(c, i) is gene i of chromosome c. Please use them to access
+ * genes in fitness functions, then the layout is hidden from them.
+ */
+#ifndef CHROMOSOME_INTERLEAVED
+#define CHROMOSOME_INTERLEAVED 0
+#endif
+#if CHROMOSOME_INTERLEAVED
+#define CHROMOSOME_AT(cs, idx) (((global GENE_TYPE*) (cs)) + (idx))
+#define CHROMOSOME_GENE_STRIDE POPULATION_SIZE
+#else
+#define CHROMOSOME_AT(cs, idx) (((global GENE_TYPE*) (cs)) + (idx) * CHROMOSOME_SIZE)
+#define CHROMOSOME_GENE_STRIDE 1
+#endif
+#define CHROMOSOME_GENE(c, i) (((global GENE_TYPE*) (c))[(i) * CHROMOSOME_GENE_STRIDE])
+
+/**
+ * The population could be split into ISLAND_COUNT islands which are evolved
+ * separately and exchange chromosomes by migrations. ISLAND_COUNT is set at
+ * ocl_ga.py. Island i holds the contiguous chromosomes from i * ISLAND_SIZE,
+ * and ISLAND_BASE(idx) is the first chromosome of the island of idx. Parents
+ * for crossover are chosen in the same island.
+ */
+#ifndef ISLAND_COUNT
+#define ISLAND_COUNT 1
+#endif
+#define ISLAND_SIZE (POPULATION_SIZE / ISLAND_COUNT)
+#define ISLAND_BASE(idx) ((idx) / ISLAND_SIZE * ISLAND_SIZE)
+
+/**
+ * If ISLAND_INDEPENDENT is 1, islands are independent runs of a batch. Each
+ * run has its own probabilities of mutation and crossover, which are given by
+ * ISLAND_PROB_MUTATION_LIST and ISLAND_PROB_CROSSOVER_LIST, and its own best
+ * and worst fitnesses. ISLAND_PROB_MUTATION(idx, prob) and
+ * ISLAND_PROB_CROSSOVER(idx, prob) give the probability for chromosome idx,
+ * which is prob if islands are not independent. ISLAND_FITNESS(list, idx)
+ * gives the best(or worst) fitness for chromosome idx from a list which has
+ * an item for each island, or only one item if islands are not independent.
+ */
+#ifndef ISLAND_INDEPENDENT
+#define ISLAND_INDEPENDENT 0
+#endif
+#if ISLAND_INDEPENDENT
+constant float island_prob_mutation[ISLAND_COUNT] = ISLAND_PROB_MUTATION_LIST;
+constant float island_prob_crossover[ISLAND_COUNT] = ISLAND_PROB_CROSSOVER_LIST;
+#define ISLAND_PROB_MUTATION(idx, prob) (island_prob_mutation[(idx) / ISLAND_SIZE])
+#define ISLAND_PROB_CROSSOVER(idx, prob) (island_prob_crossover[(idx) / ISLAND_SIZE])
+#define ISLAND_FITNESS(list, idx) ((list)[(idx) / ISLAND_SIZE])
+#else
+#define ISLAND_PROB_MUTATION(idx, prob) (prob)
+#define ISLAND_PROB_CROSSOVER(idx, prob) (prob)
+#define ISLAND_FITNESS(list, idx) ((list)[0])
+#endif
+
 /**
  * prints the value of chromosomes. We can also use this function to print a
  * single chromome with 1 value of num_of_chromosomes.
@@ -12,7 +80,7 @@
  * @param *fitnesses (global) the fitness array of all chromosomes. The size of
  *        this array is num_of_chromosomes.
  */
-void print_chromosomes(global int* chromosomes, int size_of_chromosome,
+void print_chromosomes(global GENE_TYPE* chromosomes, int size_of_chromosome,
                        int num_of_chromosomes, global float* fitnesses)
 {
   int idx = get_global_id(0);
@@ -33,31 +101,83 @@ void print_chromosomes(global int* chromosomes, int size_of_chromosome,
   printf("\n");
 }
 
+/**
+ * The random numbers are generated by a counter-based generator, Philox4x32-10.
+ * Each number is a pure function of a key and a counter, so there is no seed
+ * buffer to be read and written back by kernels. The key is the seed of a run
+ * and the counter is (draw, work item, generation, kernel id). Each kernel
+ * which draws random numbers has its own kernel id, so the same seed gives
+ * the same numbers in the same generation no matter on which device or after
+ * pause and restore.
+ */
+#define RAND_KERNEL_POPULATE 0
+#define RAND_KERNEL_MUTATE 1
+#define RAND_KERNEL_PICK 2
+#define RAND_KERNEL_CROSSOVER 3
+
+#define PHILOX_M0 0xD2511F53
+#define PHILOX_M1 0xCD9E8D57
+#define PHILOX_W0 0x9E3779B9
+#define PHILOX_W1 0xBB67AE85
+
+/**
+ * rand_state keeps the key and counter of a work item. A block of 4 numbers
+ * is generated by a counter, and the draw part of counter is increased after
+ * all of them are used.
+ */
+typedef struct {
+  uint4 counter;
+  uint2 key;
+  uint block[4];
+  uint used;
+} rand_state;
+
+/**
+ * philox4x32 generates 4 random numbers with 10 rounds of Philox.
+ * @param counter the counter.
+ * @param key the key.
+ * @return 4 random uint values.
+ */
+uint4 philox4x32(uint4 counter, uint2 key)
+{
+  uint hi0, lo0, hi1, lo1;
+  for (int i = 0; i < 10; i++) {
+    hi0 = mul_hi((uint) PHILOX_M0, counter.x);
+    lo0 = PHILOX_M0 * counter.x;
+    hi1 = mul_hi((uint) PHILOX_M1, counter.z);
+    lo1 = PHILOX_M1 * counter.z;
+    counter = (uint4)(hi1 ^ counter.y ^ key.x, lo1, hi0 ^ counter.w ^ key.y, lo0);
+    key += (uint2)(PHILOX_W0, PHILOX_W1);
+  }
+  return counter;
+}
+
 /**
  * rand generates a random number between 0 to max value of uint.
- * NOTE : Since we cannot create a real random number in kernel,
- *        By passing in a random value from python, and storing the last
- *        random value generated from table, we could simulate a pesudo random
- *        number in kernel.
- * @param *holder a pointer of uint for storing the last rand value.
+ * @param *holder the random state of current work item.
  * @return a random uint value.
  */
-uint rand(uint* holder)
+uint rand(rand_state* holder)
 {
-  uint b = ParallelRNG(holder[0]);
-  uint c = ParallelRNG2(b, holder[0]);
-  uint d = ParallelRNG3(c, b, holder[0]);
-  holder[0] = c;
-  return d;
+  if (holder->used == 4) {
+    uint4 block = philox4x32(holder->counter, holder->key);
+    holder->block[0] = block.x;
+    holder->block[1] = block.y;
+    holder->block[2] = block.z;
+    holder->block[3] = block.w;
+    holder->counter.x++;
+    holder->used = 0;
+  }
+  return holder->block[holder->used++];
 }
 
 /**
  * rand_range generates a random number between 0 <= return_vlue < range.
- * @param *holder a pointer of uint for storing the last rand value.
+ * @param *holder the random state of current work item.
  * @param range the max value of random number.
  * @return a random uint value in the range.
  */
-uint rand_range(uint* holder, uint range)
+uint rand_range(rand_state* holder, uint range)
 {
   uint r = rand(holder) % range;
   return r;
@@ -66,12 +186,12 @@ uint rand_range(uint* holder, uint range)
 /**
  * rand_range_exclude generates a random number between 0 < return_vlue < range.
  * But the value aExcluded is excluded.
- * @param *holder a pointer of uint for storing the last rand value.
+ * @param *holder the random state of current work item.
  * @param range the max value of random number.
  * @param aExclude the excluded value
  * @return a random uint value in the range except aExcluded.
  */
-uint rand_range_exclude(uint* holder, uint range, uint aExcluded)
+uint rand_range_exclude(rand_state* holder, uint range, uint aExcluded)
 {
   uint r = rand(holder) % (range - 1);
   return r == aExcluded ? range - 1 : r;
@@ -79,10 +199,10 @@ uint rand_range_exclude(uint* holder, uint range, uint aExcluded)
 
 /**
  * rand_prob generates a random number between 0 < return_vlue < 1 in float.
- * @param *holder a pointer of uint for storing the last rand value.
+ * @param *holder the random state of current work item.
  * @return a random float value.
  */
-float rand_prob(uint* holder)
+float rand_prob(rand_state* holder)
 {
   uint r = rand(holder);
   float p = r / (float)UINT_MAX;
@@ -90,13 +210,19 @@ float rand_prob(uint* holder)
 }
 
 /**
- * initialze the random seed.
- * @param seed the reandom seed.
- * @param *holder a pointer of uint for storing the last rand value.
+ * initialze the random state of a work item.
+ * @param *holder the random state to be initialized.
+ * @param seed the random seed of a run.
+ * @param generation the index of current generation.
+ * @param idx the index of work item.
+ * @param kernel_id the id of kernel, e.g. RAND_KERNEL_POPULATE.
  */
-void init_rand(int seed, uint* holder)
+void init_rand(rand_state* holder, ulong seed, uint generation, uint idx,
+               uint kernel_id)
 {
-  holder[0] = ParallelRNG(seed);
+  holder->key = (uint2)((uint) seed, (uint) (seed >> 32));
+  holder->counter = (uint4)(0, idx, generation, kernel_id);
+  holder->used = 4;
 }
 
 /**
@@ -106,10 +232,10 @@ void init_rand(int seed, uint* holder)
  * size. The value in ratio array is the uniform[0, 1] distribution value. The
  * accumulated value of the whole array is 1.
  * @param *ratio (global) the probability array for each chromosomes.
- * @param *holder a pointer of uint for storing the last rand value.
+ * @param *holder the random state of current work item.
  * @param num_of_chromosomes the size of ratio.
  */
-int random_choose_by_ratio(global float* ratio, uint* holder,
+int random_choose_by_ratio(global float* ratio, rand_state* holder,
                            int num_of_chromosomes)
 {
 
@@ -127,64 +253,285 @@ int random_choose_by_ratio(global float* ratio, uint* holder,
   return num_of_chromosomes - 1;
 }
 
+// STATISTICS_TOP_SIZE is set at ocl_ga.py, it is the size of ranked lists.
+#ifndef STATISTICS_TOP_SIZE
+#define STATISTICS_TOP_SIZE 1
+#endif
+
+/**
+ * IS_BETTER_FITNESS tells if fitness a is better than fitness b. The definition
+ * of better is based on the initial options of OpenCLGA.
+ */
+#if OPTIMIZATION_FOR_MAX
+#define IS_BETTER_FITNESS(a, b) ((a) > (b))
+#define WORST_POSSIBLE_FITNESS -INFINITY
+#else
+#define IS_BETTER_FITNESS(a, b) ((a) < (b))
+#define WORST_POSSIBLE_FITNESS INFINITY
+#endif
+
 /**
- * calc_min_max_fitness find the max and min value among all fitness values.
- * @param *fitnesses (global) the fitness value array of all chromosomes
- * @param num_of_chromosomes the number of chromosomes
- * @param *min (out) for returing the min fitness value
- * @param *max (out) for returning the max fitness value
+ * utils_insert_ranked_fitness inserts a fitness into a sorted list of size
+ * length if it is ranked. The list is sorted from the most preferred to the
+ * least preferred one. If better is 1, the better fitness is preferred.
+ * Otherwise, the worse fitness is preferred.
+ * @param *fitnesses the sorted fitness list.
+ * @param *indices the chromosome indices of the sorted fitness list.
+ * @param length the size of the list.
+ * @param fitness the fitness to be inserted.
+ * @param index the chromosome index of the fitness.
+ * @param better 1 for keeping the best ones, 0 for keeping the worst ones.
  */
-void calc_min_max_fitness(global float* fitnesses, int num_of_chromosomes,
-                          float* min, float* max)
+void utils_insert_ranked_fitness(float* fitnesses, int* indices, int length,
+                                 float fitness, int index, int better)
 {
-  for (int i = 0; i < num_of_chromosomes; i++) {
-    max[0] = fmax(fitnesses[i], max[0]);
-    min[0] = fmin(fitnesses[i], min[0]);
+  int i = length - 1;
+  // an empty slot is marked with -1 index and all fitnesses are preferred.
+  if (indices[i] >= 0 && (better ? !IS_BETTER_FITNESS(fitness, fitnesses[i])
+                                 : !IS_BETTER_FITNESS(fitnesses[i], fitness))) {
+    return;
   }
+  // shift the less preferred ones to the end of list
+  for (; i > 0; i--) {
+    if (indices[i - 1] >= 0 &&
+        (better ? !IS_BETTER_FITNESS(fitness, fitnesses[i - 1])
+                : !IS_BETTER_FITNESS(fitnesses[i - 1], fitness))) {
+      break;
+    }
+    fitnesses[i] = fitnesses[i - 1];
+    indices[i] = indices[i - 1];
+  }
+  fitnesses[i] = fitness;
+  indices[i] = index;
 }
 
 /**
- * utils_calc_ratio find the best, worst, avg fitnesses among all chromosomes.
- * It also calculates the probability for each chromosomes based on their
- * fitness value. The best and worst definition is based on the initial options
- * of OpenCLGA.
+ * utils_merge_ranked_fitness merges two sorted lists of size length into the
+ * first one and keeps the most preferred length items. The first list wins
+ * when two fitnesses are equal to keep the result stable.
+ * @param *fitnesses_a (local, in/out) the first sorted fitness list.
+ * @param *indices_a (local, in/out) the chromosome indices of the first list.
+ * @param *fitnesses_b (local) the second sorted fitness list.
+ * @param *indices_b (local) the chromosome indices of the second list.
+ * @param length the size of lists.
+ * @param better 1 for keeping the best ones, 0 for keeping the worst ones.
+ */
+void utils_merge_ranked_fitness(local float* fitnesses_a, local int* indices_a,
+                                local float* fitnesses_b, local int* indices_b,
+                                int length, int better)
+{
+  float merged_fitnesses[STATISTICS_TOP_SIZE];
+  int merged_indices[STATISTICS_TOP_SIZE];
+  int a = 0;
+  int b = 0;
+  int take_a;
+  for (int i = 0; i < length; i++) {
+    if (indices_b[b] < 0) {
+      take_a = 1;
+    } else if (indices_a[a] < 0) {
+      take_a = 0;
+    } else if (better) {
+      take_a = !IS_BETTER_FITNESS(fitnesses_b[b], fitnesses_a[a]);
+    } else {
+      take_a = !IS_BETTER_FITNESS(fitnesses_a[a], fitnesses_b[b]);
+    }
+    if (take_a) {
+      merged_fitnesses[i] = fitnesses_a[a];
+      merged_indices[i] = indices_a[a];
+      a++;
+    } else {
+      merged_fitnesses[i] = fitnesses_b[b];
+      merged_indices[i] = indices_b[b];
+      b++;
+    }
+  }
+  for (int i = 0; i < length; i++) {
+    fitnesses_a[i] = merged_fitnesses[i];
+    indices_a[i] = merged_indices[i];
+  }
+}
+
+/**
+ * utils_calc_cumulative_ratio calculates the cumulative probability of each
+ * chromosome based on their fitness value. The probability of a chromosome is
+ * the square of the difference between its fitness and the worst fitness. The
+ * worst definition is based on the initial options of OpenCLGA.
+ * It should be called by all work items of a single work group. Each work item
+ * handles a contiguous part of chromosomes. The worst fitness is found by a
+ * parallel reduction and the cumulative probabilities are built by a parallel
+ * inclusive scan in local memory.
  * @param *fitness (global) the fitness value array of all chromosomes
- * @param *ratio (global, out) the probability array of each chromosomes
+ * @param *ratio (global, out) the cumulative probability array of all
+ *               chromosomes. The last one is 1.
+ * @param *l_values (local) a float for each work item.
  * @param num_of_chromosomes the number of chromosomes.
  */
-void utils_calc_ratio(global float* fitness,
-                      global float* ratio,
-                      int num_of_chromosomes)
+void utils_calc_cumulative_ratio(global float* fitness,
+                                 global float* ratio,
+                                 local float* l_values,
+                                 int num_of_chromosomes)
 {
-  float local_min = INT_MAX;
-  float local_max = 0;
-  // OPTIMIZATION_FOR_MAX is set at ocl_ga.py
-  float best;
-  float worst;
-#if OPTIMIZATION_FOR_MAX
-  calc_min_max_fitness(fitness, num_of_chromosomes, &local_max, &local_min);
-  best = local_max;
-  worst = local_min;
-#else
-  calc_min_max_fitness(fitness, num_of_chromosomes, &local_min, &local_max);
-  best = local_min;
-  worst = local_max;
-#endif
-
-  float temp_worst = worst;
-  float diffTotal = 0;
+  int lid = get_local_id(0);
+  int lsize = get_local_size(0);
+  int chunk = (num_of_chromosomes + lsize - 1) / lsize;
+  int start = min(lid * chunk, num_of_chromosomes);
+  int end = min(start + chunk, num_of_chromosomes);
   int i;
-  // we use total and diff to calculate the probability for each chromosome
-  for (i = 0; i < num_of_chromosomes; i++) {
-    // to have a significant different between better and worst, we use square
-    // of diff to calculate the probability.
-    diffTotal += (temp_worst - fitness[i]) * (temp_worst - fitness[i]);
+
+  // find the worst fitness of all chromosomes. lsize must be power of 2.
+  float worst = -WORST_POSSIBLE_FITNESS;
+  for (i = start; i < end; i++) {
+    if (IS_BETTER_FITNESS(worst, fitness[i])) {
+      worst = fitness[i];
+    }
   }
-  // calculate probability for each one
-  for (i = 0; i < num_of_chromosomes; i++) {
-    ratio[i] = (temp_worst - fitness[i]) * (temp_worst - fitness[i]) /
-               diffTotal;
+  l_values[lid] = worst;
+  barrier(CLK_LOCAL_MEM_FENCE);
+  for (int stride = lsize / 2; stride > 0; stride /= 2) {
+    if (lid < stride && IS_BETTER_FITNESS(l_values[lid], l_values[lid + stride])) {
+      l_values[lid] = l_values[lid + stride];
+    }
+    barrier(CLK_LOCAL_MEM_FENCE);
+  }
+  worst = l_values[0];
+  barrier(CLK_LOCAL_MEM_FENCE);
+
+  // to have a significant different between better and worst, we use square
+  // of diff to calculate the probability. Each work item accumulates its own
+  // part at first.
+  float sum = 0;
+  for (i = start; i < end; i++) {
+    sum += (worst - fitness[i]) * (worst - fitness[i]);
+    ratio[i] = sum;
+  }
+  l_values[lid] = sum;
+  barrier(CLK_LOCAL_MEM_FENCE);
+
+  // inclusive scan of the sums of all work items.
+  float value;
+  for (int offset = 1; offset < lsize; offset *= 2) {
+    value = lid >= offset ? l_values[lid - offset] : 0;
+    barrier(CLK_LOCAL_MEM_FENCE);
+    l_values[lid] += value;
+    barrier(CLK_LOCAL_MEM_FENCE);
+  }
+
+  float total = l_values[lsize - 1];
+  float base = lid > 0 ? l_values[lid - 1] : 0;
+  for (i = start; i < end; i++) {
+    // all chromosomes are the same, every one has the same probability.
+    ratio[i] = total > 0 ? (base + ratio[i]) / total
+                         : (i + 1) / (float) num_of_chromosomes;
+  }
+}
+
+/**
+ * random choose a chromosome based on the cumulative ratio which is calculated
+ * by utils_calc_cumulative_ratio. It finds the first chromosome whose
+ * cumulative ratio is larger than a random number with binary search.
+ * @param *cumulative_ratio (global) the cumulative probability array for each
+ *                          chromosomes.
+ * @param *holder the random state of current work item.
+ * @param num_of_chromosomes the size of cumulative_ratio.
+ */
+int random_choose_by_cumulative_ratio(global float* cumulative_ratio,
+                                      rand_state* holder, int num_of_chromosomes)
+{
+  // generate a random number from between 0 and 1
+  float rand_choose = rand_prob(holder);
+  int low = 0;
+  int high = num_of_chromosomes - 1;
+  int mid;
+  while (low < high) {
+    mid = (low + high) / 2;
+    if (cumulative_ratio[mid] > rand_choose) {
+      high = mid;
+    } else {
+      low = mid + 1;
+    }
+  }
+  return low;
+}
+
+/**
+ * random choose a chromosome by k-way tournament. k chromosomes are chosen
+ * uniformly and the best one of them wins. No global normalization is needed.
+ * @param *fitness (global) the fitness value array of all chromosomes
+ * @param *holder the random state of current work item.
+ * @param num_of_chromosomes the size of fitness.
+ * @param size the number of chromosomes in a tournament.
+ */
+int random_choose_by_tournament(global float* fitness, rand_state* holder,
+                                int num_of_chromosomes, int size)
+{
+  int best = rand_range(holder, num_of_chromosomes);
+  int candidate;
+  for (int i = 1; i < size; i++) {
+    candidate = rand_range(holder, num_of_chromosomes);
+    if (IS_BETTER_FITNESS(fitness[candidate], fitness[best])) {
+      best = candidate;
+    }
   }
+  return best;
+}
+
+/**
+ * random choose a chromosome by linear rank selection. The probability of a
+ * chromosome is linear to its rank, and the best one is chosen pressure times
+ * as often as the median one. Instead of sorting all chromosomes, we choose 2
+ * chromosomes uniformly and take the better one with probability pressure / 2.
+ * The expected probability of this is the same as linear ranking.
+ * @param *fitness (global) the fitness value array of all chromosomes
+ * @param *holder the random state of current work item.
+ * @param num_of_chromosomes the size of fitness.
+ * @param pressure the selection pressure, between 1 and 2.
+ */
+int random_choose_by_rank(global float* fitness, rand_state* holder,
+                          int num_of_chromosomes, float pressure)
+{
+  int a = rand_range(holder, num_of_chromosomes);
+  int b = rand_range(holder, num_of_chromosomes);
+  int better = IS_BETTER_FITNESS(fitness[b], fitness[a]) ? b : a;
+  int worse = better == a ? b : a;
+  return rand_prob(holder) < pressure / 2 ? better : worse;
+}
+
+// SELECTION_TYPE is set at ocl_ga.py, it should be one of the following.
+#define SELECTION_ROULETTE 0
+#define SELECTION_TOURNAMENT 1
+#define SELECTION_RANK 2
+#ifndef SELECTION_TYPE
+#define SELECTION_TYPE SELECTION_ROULETTE
+#endif
+#ifndef SELECTION_TOURNAMENT_SIZE
+#define SELECTION_TOURNAMENT_SIZE 2
+#endif
+#ifndef SELECTION_RANK_PRESSURE
+#define SELECTION_RANK_PRESSURE 1.5f
+#endif
+
+/**
+ * utils_select_chromosome chooses a chromosome for crossover with the selection
+ * method specified in the options of OpenCLGA.
+ * @param *fitness (global) the fitness value array of all chromosomes
+ * @param *ratio (global) the cumulative probability array of all chromosomes.
+ *               It is only used by roulette wheel selection.
+ * @param *holder the random state of current work item.
+ * @param num_of_chromosomes the number of chromosomes.
+ * @return the index of chosen chromosome.
+ */
+int utils_select_chromosome(global float* fitness, global float* ratio,
+                            rand_state* holder, int num_of_chromosomes)
+{
+#if SELECTION_TYPE == SELECTION_TOURNAMENT
+  return random_choose_by_tournament(fitness, holder, num_of_chromosomes,
+                                     SELECTION_TOURNAMENT_SIZE);
+#elif SELECTION_TYPE == SELECTION_RANK
+  return random_choose_by_rank(fitness, holder, num_of_chromosomes,
+                               SELECTION_RANK_PRESSURE);
+#else
+  return random_choose_by_cumulative_ratio(ratio, holder, num_of_chromosomes);
+#endif
 }
 
 #endif
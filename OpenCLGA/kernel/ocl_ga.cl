@@ -1,26 +1,403 @@
 #include "ga_utils.cl"
 
+/**
+ * ocl_ga_compact_dirty collects the indices of dirty chromosomes, whose genes
+ * are changed since their fitnesses were calculated, into a dense list. Each
+ * work group counts its dirty chromosomes in local memory and reserves a range
+ * of the list with a single atomic operation, so the order of indices in the
+ * list is not specified. dirty_count must be 0 before it is run.
+ * Note: this is a kernel function and will be called by python.
+ *
+ * @param *dirty (global) the dirty flag of each chromosome.
+ * @param *dirty_indices (global, out) the indices of dirty chromosomes.
+ * @param *dirty_count (global, out) the number of dirty chromosomes.
+ */
+__kernel void ocl_ga_compact_dirty(global uchar* dirty,
+                                   global int* dirty_indices,
+                                   global int* dirty_count)
+{
+  local int l_count;
+  local int l_base;
+  int idx = get_global_id(0);
+  int lid = get_local_id(0);
+  int pos = -1;
+
+  if (lid == 0) {
+    l_count = 0;
+  }
+  barrier(CLK_LOCAL_MEM_FENCE);
+  // out of bound kernel tasks for padding still reach the barriers.
+  if (idx < POPULATION_SIZE && dirty[idx]) {
+    pos = atomic_inc(&l_count);
+  }
+  barrier(CLK_LOCAL_MEM_FENCE);
+  if (lid == 0) {
+    l_base = atomic_add(dirty_count, l_count);
+  }
+  barrier(CLK_LOCAL_MEM_FENCE);
+  if (pos >= 0) {
+    dirty_indices[l_base + pos] = idx;
+  }
+}
+
 /**
  * ocl_ga_calculate_fitness is a wrapper function to call specified fitness
  * function. To simplify the implementation of fitness calcuation, we handles
  * the multi-threading part and let implementor write the core calculation.
+ * If FITNESS_DIRTY_ONLY is 1, work item i calculates the i-th chromosome in
+ * the list of ocl_ga_compact_dirty, and the ones after dirty_count return at
+ * once. Otherwise, work item i calculates chromosome i. The dirty flag of the
+ * calculated chromosome is cleared.
  * Note: this is a kernel function and will be called by python.
  *
  * @param *chromosomes (global) the chromosomes array
  * @param *fitness (global) the fitness array for each chromosomes.
+ * @param *dirty (global) the dirty flag of each chromosome.
+ * @param *dirty_indices (global) the indices of dirty chromosomes.
+ * @param *dirty_count (global) the number of dirty chromosomes.
  * @param FITNESS_ARGS the fitness arguments from ocl_ga options.
  */
-__kernel void ocl_ga_calculate_fitness(global int* chromosomes,
-                                       global float* fitness FITNESS_ARGS)
+__kernel void ocl_ga_calculate_fitness(global GENE_TYPE* chromosomes,
+                                       global float* fitness,
+                                       global uchar* dirty,
+                                       global int* dirty_indices,
+                                       global int* dirty_count FITNESS_ARGS)
 {
+#if FITNESS_DIRTY_ONLY
+  int i = get_global_id(0);
+  // only the first dirty_count work items have chromosomes to calculate.
+  if (i >= *dirty_count) {
+    return;
+  }
+  int idx = dirty_indices[i];
+#else
   int idx = get_global_id(0);
   // out of bound kernel task for padding
   if (idx >= POPULATION_SIZE) {
     return;
   }
+#endif
+  dirty[idx] = 0;
   // calls the fitness function specified by user and gives the chromosome for
   // current thread.
-  CALCULATE_FITNESS(((global CHROMOSOME_TYPE*) chromosomes) + idx,
+  CALCULATE_FITNESS((global CHROMOSOME_TYPE*) CHROMOSOME_AT(chromosomes, idx),
                     fitness + idx,
                     CHROMOSOME_SIZE, POPULATION_SIZE FITNESS_ARGV);
 }
+
+/**
+ * ocl_ga_calculate_statistics finds the top N best and the bottom N worst
+ * fitnesses, their indices and the average fitness of all chromosomes on the
+ * device. N is STATISTICS_TOP_SIZE. It should be run in a single work group.
+ * Each work item scans a strided part of fitnesses and keeps its own ranked
+ * lists. After that, the lists are merged as a tree in local memory.
+ * Note: this is a kernel function and will be called by python.
+ *
+ * @param *fitness (global) the fitness array of all chromosomes.
+ * @param *best_indices (global, out) the indices of top N best chromosomes.
+ * @param *best_fitnesses (global, out) the fitnesses of top N best chromosomes.
+ * @param *worst_indices (global, out) the indices of bottom N worst
+ *                       chromosomes. The worst one is the first.
+ * @param *worst_fitnesses (global, out) the fitnesses of bottom N worst
+ *                         chromosomes.
+ * @param *avg (global, out) the average fitness of all chromosomes.
+ * @param *history (global, out) the best, worst and avg fitness of each
+ *                 generation in a batch, 3 floats for each generation.
+ * @param history_index the index of current generation in a batch.
+ * @param *l_best_fitnesses (local) N fitnesses for each work item.
+ * @param *l_best_indices (local) N indices for each work item.
+ * @param *l_worst_fitnesses (local) N fitnesses for each work item.
+ * @param *l_worst_indices (local) N indices for each work item.
+ * @param *l_sums (local) the partial sum for each work item.
+ */
+__kernel void ocl_ga_calculate_statistics(global float* fitness,
+                                          global int* best_indices,
+                                          global float* best_fitnesses,
+                                          global int* worst_indices,
+                                          global float* worst_fitnesses,
+                                          global float* avg,
+                                          global float* history,
+                                          int history_index,
+                                          local float* l_best_fitnesses,
+                                          local int* l_best_indices,
+                                          local float* l_worst_fitnesses,
+                                          local int* l_worst_indices,
+                                          local float* l_sums)
+{
+  int lid = get_local_id(0);
+  int lsize = get_local_size(0);
+  float p_best_fitnesses[STATISTICS_TOP_SIZE];
+  int p_best_indices[STATISTICS_TOP_SIZE];
+  float p_worst_fitnesses[STATISTICS_TOP_SIZE];
+  int p_worst_indices[STATISTICS_TOP_SIZE];
+  float sum = 0.0;
+  int i;
+
+  for (i = 0; i < STATISTICS_TOP_SIZE; i++) {
+    p_best_indices[i] = -1;
+    p_worst_indices[i] = -1;
+  }
+  // each work item keeps the ranked lists of its own part.
+  for (i = lid; i < POPULATION_SIZE; i += lsize) {
+    sum += fitness[i];
+    utils_insert_ranked_fitness(p_best_fitnesses, p_best_indices,
+                                STATISTICS_TOP_SIZE, fitness[i], i, 1);
+    utils_insert_ranked_fitness(p_worst_fitnesses, p_worst_indices,
+                                STATISTICS_TOP_SIZE, fitness[i], i, 0);
+  }
+
+  int offset = lid * STATISTICS_TOP_SIZE;
+  for (i = 0; i < STATISTICS_TOP_SIZE; i++) {
+    l_best_fitnesses[offset + i] = p_best_fitnesses[i];
+    l_best_indices[offset + i] = p_best_indices[i];
+    l_worst_fitnesses[offset + i] = p_worst_fitnesses[i];
+    l_worst_indices[offset + i] = p_worst_indices[i];
+  }
+  l_sums[lid] = sum;
+  barrier(CLK_LOCAL_MEM_FENCE);
+
+  // merge the lists of work items as a tree. lsize must be power of 2.
+  for (int stride = lsize / 2; stride > 0; stride /= 2) {
+    if (lid < stride) {
+      int other = (lid + stride) * STATISTICS_TOP_SIZE;
+      utils_merge_ranked_fitness(l_best_fitnesses + offset,
+                                 l_best_indices + offset,
+                                 l_best_fitnesses + other,
+                                 l_best_indices + other,
+                                 STATISTICS_TOP_SIZE, 1);
+      utils_merge_ranked_fitness(l_worst_fitnesses + offset,
+                                 l_worst_indices + offset,
+                                 l_worst_fitnesses + other,
+                                 l_worst_indices + other,
+                                 STATISTICS_TOP_SIZE, 0);
+      l_sums[lid] += l_sums[lid + stride];
+    }
+    barrier(CLK_LOCAL_MEM_FENCE);
+  }
+
+  if (lid > 0) {
+    return;
+  }
+  for (i = 0; i < STATISTICS_TOP_SIZE; i++) {
+    best_indices[i] = l_best_indices[i];
+    best_fitnesses[i] = l_best_fitnesses[i];
+    worst_indices[i] = l_worst_indices[i];
+    worst_fitnesses[i] = l_worst_fitnesses[i];
+  }
+  avg[0] = l_sums[0] / POPULATION_SIZE;
+  history[history_index * 3] = best_fitnesses[0];
+  history[history_index * 3 + 1] = worst_fitnesses[0];
+  history[history_index * 3 + 2] = avg[0];
+}
+
+// The island topologies. ISLAND_TOPOLOGY, ISLAND_NEIGHBORS, ISLAND_MIGRANTS
+// and ISLAND_TORUS_COLUMNS are set at ocl_ga.py if there are islands.
+#define ISLAND_TOPOLOGY_RING 0
+#define ISLAND_TOPOLOGY_TORUS 1
+#define ISLAND_TOPOLOGY_FULL 2
+#ifndef ISLAND_TOPOLOGY
+#define ISLAND_TOPOLOGY ISLAND_TOPOLOGY_RING
+#endif
+#ifndef ISLAND_NEIGHBORS
+#define ISLAND_NEIGHBORS 1
+#endif
+#ifndef ISLAND_MIGRANTS
+#define ISLAND_MIGRANTS 1
+#endif
+#ifndef ISLAND_TORUS_COLUMNS
+#define ISLAND_TORUS_COLUMNS 1
+#endif
+
+/**
+ * ocl_ga_island_neighbor gives the island which sends migrants to an island.
+ * For ring, island i receives from island i - 1.
+ * For torus, islands are placed in a grid with ISLAND_TORUS_COLUMNS columns
+ * and island i receives from the islands above, below, left and right to it.
+ * For full, island i receives from all other islands.
+ * @param island the island which receives migrants.
+ * @param neighbor the index of neighbors, 0 <= neighbor < ISLAND_NEIGHBORS.
+ * @return the index of the neighbor island.
+ */
+int ocl_ga_island_neighbor(int island, int neighbor)
+{
+#if ISLAND_TOPOLOGY == ISLAND_TOPOLOGY_TORUS
+  int rows = ISLAND_COUNT / ISLAND_TORUS_COLUMNS;
+  int row = island / ISLAND_TORUS_COLUMNS;
+  int column = island % ISLAND_TORUS_COLUMNS;
+  switch (neighbor) {
+    case 0:
+      row = (row + rows - 1) % rows;
+      break;
+    case 1:
+      row = (row + 1) % rows;
+      break;
+    case 2:
+      column = (column + ISLAND_TORUS_COLUMNS - 1) % ISLAND_TORUS_COLUMNS;
+      break;
+    default:
+      column = (column + 1) % ISLAND_TORUS_COLUMNS;
+      break;
+  }
+  return row * ISLAND_TORUS_COLUMNS + column;
+#elif ISLAND_TOPOLOGY == ISLAND_TOPOLOGY_FULL
+  return neighbor < island ? neighbor : neighbor + 1;
+#else
+  return (island + ISLAND_COUNT - 1) % ISLAND_COUNT;
+#endif
+}
+
+/**
+ * ocl_ga_rank_islands finds the ISLAND_MIGRANTS best chromosomes of each
+ * island which will be sent to neighbors, and the
+ * ISLAND_MIGRANTS * ISLAND_NEIGHBORS worst chromosomes which will be replaced
+ * by migrants. A work item handles an island. The worst ones are scanned
+ * backward, so that the best ones and the worst ones never overlap even if
+ * all fitnesses are the same.
+ * Note: this is a kernel function and will be called by python.
+ *
+ * @param *fitness (global) the fitness array of all chromosomes.
+ * @param *island_best (global, out) the indices of best ones of each island.
+ * @param *island_worst (global, out) the indices of worst ones of each island.
+ */
+__kernel void ocl_ga_rank_islands(global float* fitness,
+                                  global int* island_best,
+                                  global int* island_worst)
+{
+  int island = get_global_id(0);
+  // out of bound kernel task for padding
+  if (island >= ISLAND_COUNT) {
+    return;
+  }
+  float p_best_fitnesses[ISLAND_MIGRANTS];
+  int p_best_indices[ISLAND_MIGRANTS];
+  float p_worst_fitnesses[ISLAND_MIGRANTS * ISLAND_NEIGHBORS];
+  int p_worst_indices[ISLAND_MIGRANTS * ISLAND_NEIGHBORS];
+  int base = island * ISLAND_SIZE;
+  int i;
+
+  for (i = 0; i < ISLAND_MIGRANTS; i++) {
+    p_best_indices[i] = -1;
+  }
+  for (i = 0; i < ISLAND_MIGRANTS * ISLAND_NEIGHBORS; i++) {
+    p_worst_indices[i] = -1;
+  }
+  for (i = 0; i < ISLAND_SIZE; i++) {
+    utils_insert_ranked_fitness(p_best_fitnesses, p_best_indices, ISLAND_MIGRANTS,
+                                fitness[base + i], base + i, 1);
+    utils_insert_ranked_fitness(p_worst_fitnesses, p_worst_indices,
+                                ISLAND_MIGRANTS * ISLAND_NEIGHBORS,
+                                fitness[base + ISLAND_SIZE - 1 - i],
+                                base + ISLAND_SIZE - 1 - i, 0);
+  }
+  for (i = 0; i < ISLAND_MIGRANTS; i++) {
+    island_best[island * ISLAND_MIGRANTS + i] = p_best_indices[i];
+  }
+  for (i = 0; i < ISLAND_MIGRANTS * ISLAND_NEIGHBORS; i++) {
+    island_worst[island * ISLAND_MIGRANTS * ISLAND_NEIGHBORS + i] = p_worst_indices[i];
+  }
+}
+
+/**
+ * ocl_ga_migrate copies the best ones of each island to replace the worst
+ * ones of its neighbors, see ocl_ga_island_neighbor. A work item copies a
+ * migrant with its fitness, so no fitness calculation is needed. It should be
+ * run after ocl_ga_rank_islands.
+ * Note: this is a kernel function and will be called by python.
+ *
+ * @param *chromosomes (global) the chromosomes array
+ * @param *fitness (global) the fitness array of all chromosomes.
+ * @param *island_best (global) the indices of best ones of each island.
+ * @param *island_worst (global) the indices of worst ones of each island.
+ */
+__kernel void ocl_ga_migrate(global GENE_TYPE* chromosomes,
+                             global float* fitness,
+                             global int* island_best,
+                             global int* island_worst)
+{
+  int idx = get_global_id(0);
+  // out of bound kernel task for padding
+  if (idx >= ISLAND_COUNT * ISLAND_NEIGHBORS * ISLAND_MIGRANTS) {
+    return;
+  }
+  int island = idx / (ISLAND_NEIGHBORS * ISLAND_MIGRANTS);
+  int neighbor = idx / ISLAND_MIGRANTS % ISLAND_NEIGHBORS;
+  int source = ocl_ga_island_neighbor(island, neighbor);
+  int from = island_best[source * ISLAND_MIGRANTS + idx % ISLAND_MIGRANTS];
+  int to = island_worst[idx];
+  global GENE_TYPE* migrant = CHROMOSOME_AT(chromosomes, from);
+  global GENE_TYPE* target = CHROMOSOME_AT(chromosomes, to);
+  for (int i = 0; i < CHROMOSOME_SIZE; i++) {
+    CHROMOSOME_GENE(target, i) = CHROMOSOME_GENE(migrant, i);
+  }
+  fitness[to] = fitness[from];
+}
+
+/**
+ * ocl_ga_calculate_island_statistics finds the best, worst and average
+ * fitness of each island. It should be run in a work group for each island,
+ * and the work items of a group reduce the fitnesses of the island as a tree
+ * in local memory.
+ * Note: this is a kernel function and will be called by python.
+ *
+ * @param *fitness (global) the fitness array of all chromosomes.
+ * @param *island_best (global, out) the best fitness of each island.
+ * @param *island_worst (global, out) the worst fitness of each island.
+ * @param *history (global, out) the best, worst and avg fitness of each island
+ *                 of each generation in a batch, 3 floats for each island.
+ * @param history_index the index of current generation in a batch.
+ * @param *l_best (local) the best fitness for each work item.
+ * @param *l_worst (local) the worst fitness for each work item.
+ * @param *l_sums (local) the partial sum for each work item.
+ */
+__kernel void ocl_ga_calculate_island_statistics(global float* fitness,
+                                                 global float* island_best,
+                                                 global float* island_worst,
+                                                 global float* history,
+                                                 int history_index,
+                                                 local float* l_best,
+                                                 local float* l_worst,
+                                                 local float* l_sums)
+{
+  int island = get_group_id(0);
+  int lid = get_local_id(0);
+  int lsize = get_local_size(0);
+  int base = island * ISLAND_SIZE;
+  float best = WORST_POSSIBLE_FITNESS;
+  float worst = -WORST_POSSIBLE_FITNESS;
+  float sum = 0.0;
+
+  for (int i = lid; i < ISLAND_SIZE; i += lsize) {
+    float value = fitness[base + i];
+    sum += value;
+    best = IS_BETTER_FITNESS(value, best) ? value : best;
+    worst = IS_BETTER_FITNESS(worst, value) ? value : worst;
+  }
+  l_best[lid] = best;
+  l_worst[lid] = worst;
+  l_sums[lid] = sum;
+  barrier(CLK_LOCAL_MEM_FENCE);
+
+  // lsize must be power of 2.
+  for (int stride = lsize / 2; stride > 0; stride /= 2) {
+    if (lid < stride) {
+      if (IS_BETTER_FITNESS(l_best[lid + stride], l_best[lid])) {
+        l_best[lid] = l_best[lid + stride];
+      }
+      if (IS_BETTER_FITNESS(l_worst[lid], l_worst[lid + stride])) {
+        l_worst[lid] = l_worst[lid + stride];
+      }
+      l_sums[lid] += l_sums[lid + stride];
+    }
+    barrier(CLK_LOCAL_MEM_FENCE);
+  }
+
+  if (lid > 0) {
+    return;
+  }
+  island_best[island] = l_best[0];
+  island_worst[island] = l_worst[0];
+  int offset = (history_index * ISLAND_COUNT + island) * 3;
+  history[offset] = l_best[0];
+  history[offset + 1] = l_worst[0];
+  history[offset + 2] = l_sums[0] / ISLAND_SIZE;
+}
@@ -7,7 +7,7 @@
  * __ShufflerChromosome is a struct for accessing n gene.
  */
 typedef struct {
-  int genes[SHUFFLER_CHROMOSOME_GENE_SIZE];
+  GENE_TYPE genes[SHUFFLER_CHROMOSOME_GENE_SIZE];
 } __ShufflerChromosome;
 
 /**
@@ -22,7 +22,7 @@ typedef struct {
 void shuffler_chromosome_check_dup(global __ShufflerChromosome* chromosome) {
   for (int i = 0; i < SHUFFLER_CHROMOSOME_GENE_SIZE; i++) {
     for (int j = i + 1; j < SHUFFLER_CHROMOSOME_GENE_SIZE; j++) {
-      if (chromosome->genes[i] == chromosome->genes[j]) {
+      if (CHROMOSOME_GENE(chromosome, i) == CHROMOSOME_GENE(chromosome, j)) {
         printf("after chromosome element duplicated @%d, %d\n", i, j);
         return;
       }
@@ -36,10 +36,10 @@ void shuffler_chromosome_check_dup(global __ShufflerChromosome* chromosome) {
  * is a shuffler chromosome, the elements index of a gene is the size of
  * chromosome. This function random shuffles the whole chromosome.
  * @param *chromosome (global) the chromosome we want to populate
- * @param *rand_holder the random value holder
+ * @param *rand_holder the random state of current work item.
  */
 void shuffler_chromosome_do_populate(global __ShufflerChromosome* chromosome,
-                                     uint* rand_holder) {
+                                     rand_state* rand_holder) {
   int gene_elements[] = SIMPLE_GENE_ELEMENTS;
   int rndIdx;
   // The algorithm here is:
@@ -49,11 +49,11 @@ void shuffler_chromosome_do_populate(global __ShufflerChromosome* chromosome,
   // 4. put the left element to the end of chromosome.
   for (int i = 0; i < SHUFFLER_CHROMOSOME_GENE_SIZE - 1; i++) {
     rndIdx = rand_range(rand_holder, (SHUFFLER_CHROMOSOME_GENE_SIZE - i - 1));
-    chromosome->genes[i] = gene_elements[rndIdx];
+    CHROMOSOME_GENE(chromosome, i) = gene_elements[rndIdx];
     gene_elements[rndIdx] = gene_elements[
                                 SHUFFLER_CHROMOSOME_GENE_SIZE - i - 1];
   }
-  chromosome->genes[SHUFFLER_CHROMOSOME_GENE_SIZE - 1] = gene_elements[0];
+  CHROMOSOME_GENE(chromosome, SHUFFLER_CHROMOSOME_GENE_SIZE - 1) = gene_elements[0];
 }
 
 /**
@@ -61,21 +61,25 @@ void shuffler_chromosome_do_populate(global __ShufflerChromosome* chromosome,
  * design is to generate a chromosome in a thread.
  * Note: this is a kernel function and will be called by python.
  * @param *chromosomes (global) all memory storage for populating chromosomes.
- * @param *input_rand (global) random seeds for all threads.
+ * @param rand_seed the random seed of the run.
+ * @param generation the index of current generation.
+ * @param *dirty (global, out) the dirty flag of each chromosome.
  */
-__kernel void shuffler_chromosome_populate(global int* chromosomes,
-                                           global uint* input_rand) {
+__kernel void shuffler_chromosome_populate(global GENE_TYPE* chromosomes,
+                                           ulong rand_seed,
+                                           uint generation,
+                                           global uchar* dirty) {
   int idx = get_global_id(0);
   // out of bound kernel task for padding
   if (idx >= POPULATION_SIZE) {
     return;
   }
   // create a private variable for each kernel to hold randome number.
-  uint ra[1];
-  init_rand(input_rand[idx], ra);
-  shuffler_chromosome_do_populate(((global CHROMOSOME_TYPE*) chromosomes) + idx,
+  rand_state ra[1];
+  init_rand(ra, rand_seed, generation, idx, RAND_KERNEL_POPULATE);
+  shuffler_chromosome_do_populate((global CHROMOSOME_TYPE*) CHROMOSOME_AT(chromosomes, idx),
                                   ra);
-  input_rand[idx] = ra[0];
+  dirty[idx] = 1;
 }
 /* ============== end of populating functions ============== */
 
@@ -89,9 +93,9 @@ __kernel void shuffler_chromosome_populate(global int* chromosomes,
 void shuffler_chromosome_swap(global __ShufflerChromosome* chromosome, int p1,
                               int p2)
 {
-  int temp_p = chromosome->genes[p1];
-  chromosome->genes[p1] = chromosome->genes[p2];
-  chromosome->genes[p2] = temp_p;
+  int temp_p = CHROMOSOME_GENE(chromosome, p1);
+  CHROMOSOME_GENE(chromosome, p1) = CHROMOSOME_GENE(chromosome, p2);
+  CHROMOSOME_GENE(chromosome, p2) = temp_p;
 }
 
 /**
@@ -99,32 +103,77 @@ void shuffler_chromosome_swap(global __ShufflerChromosome* chromosome, int p1,
  * hinting the better result for swapping the selected gene. Since this is a
  * user provided function, we only need to implement a dummy function here.
  * @param *chromosome (global) the chromosome for improving. Please note this
- *                             chromosome is in int array mode.
+ *                             chromosome is in GENE_TYPE array mode.
  * @param idx the position of a gene which will be swapped.
  * @param chromosome_size the size of a chromosome.
  * @param FITNESS_ARGS the fitness arguments from ocl_ga options.
  * @return the index of suggested position for swapping.
  */
-int shuffler_chromosome_dummy_improving_func(global int* chromosome,
+int shuffler_chromosome_dummy_improving_func(global GENE_TYPE* chromosome,
                                              int idx,
                                              int chromosome_size FITNESS_ARGS)
 {
   return 0;
 }
 
+#if SHUFFLER_CHROMOSOME_DELTA_FITNESS
+/**
+ * the improving function built on the delta fitness function. It tries to swap
+ * the selected gene with all others, and returns the position which improves
+ * the fitness most. It costs O(n) calls of DELTA_FITNESS_FUNC instead of O(n)
+ * fitness calculations.
+ * @param *chromosome (global) the chromosome for improving.
+ * @param idx the position of a gene which will be swapped.
+ * @param chromosome_size the size of a chromosome.
+ * @param FITNESS_ARGS the fitness arguments from ocl_ga options.
+ * @return the position for swapping, or idx if no swapping improves it.
+ */
+int shuffler_chromosome_delta_improving_func(global GENE_TYPE* chromosome,
+                                             int idx,
+                                             int chromosome_size FITNESS_ARGS)
+{
+  int best_index = idx;
+  float best_delta = 0.0;
+  float delta;
+  for (int i = 0; i < chromosome_size; i++) {
+    if (i == idx) {
+      continue;
+    }
+    delta = DELTA_FITNESS_FUNC(chromosome, idx, i, chromosome_size FITNESS_ARGV);
+#if OPTIMIZATION_FOR_MAX
+    if (delta > best_delta) {
+#else
+    if (delta < best_delta) {
+#endif
+      best_delta = delta;
+      best_index = i;
+    }
+  }
+  return best_index;
+}
+#endif
+
 /**
  * shuffler_chromosome_single_gene_mutate does the mutation of all chromosomes.
+ * If SHUFFLER_CHROMOSOME_DELTA_FITNESS is 1, the fitness of a chromosome which
+ * is not dirty is updated by DELTA_FITNESS_FUNC, so it is not marked dirty.
  *
  * Note: this is a kernel function and will be called by python.
  * @param *cs (global) all chromosomes.
- * @param *input_rand (global) random seeds array for all threads.
+ * @param *fitness (global) the fitness of all chromosomes.
+ * @param rand_seed the random seed of the run.
+ * @param generation the index of current generation.
+ * @param *dirty (global, out) the dirty flag of each chromosome.
  * @param prob_mutate the threshold for mutation.
  * @param improve a flag to say if we need to call improving function.
  * @param FITNESS_ARGS the fitness arguments from ocl_ga options for improving
  *                     function.
  */
-__kernel void shuffler_chromosome_single_gene_mutate(global int* cs,
-                                                     global uint* input_rand,
+__kernel void shuffler_chromosome_single_gene_mutate(global GENE_TYPE* cs,
+                                                     global float* fitness,
+                                                     ulong rand_seed,
+                                                     uint generation,
+                                                     global uchar* dirty,
                                                      float prob_mutate,
                                                      int improve FITNESS_ARGS)
 {
@@ -134,129 +183,127 @@ __kernel void shuffler_chromosome_single_gene_mutate(global int* cs,
     return;
   }
   // prepare random number for current thread
-  uint ra[1];
-  init_rand(input_rand[idx], ra);
+  rand_state ra[1];
+  init_rand(ra, rand_seed, generation, idx, RAND_KERNEL_MUTATE);
   // generate a probability for mutation
   float prob_m =  rand_prob(ra);
-  if (prob_m > prob_mutate) {
+  if (prob_m > ISLAND_PROB_MUTATION(idx, prob_mutate)) {
     // no need to mutate
-    input_rand[idx] = ra[0];
     return;
   }
-  global __ShufflerChromosome* chromosomes = (global __ShufflerChromosome*) cs;
+  global __ShufflerChromosome* chromosome = (global __ShufflerChromosome*) CHROMOSOME_AT(cs, idx);
   // choose a position for mutation randomly.
   uint i = rand_range(ra, SHUFFLER_CHROMOSOME_GENE_SIZE);
   uint j;
   if (improve == 1) {
-    // we only gives global int* type to IMPROVED_FITNESS_FUNC instead of
+    // we only gives global GENE_TYPE* type to IMPROVED_FITNESS_FUNC instead of
     // __ShufflerChromosome
-    j = IMPROVED_FITNESS_FUNC((global int*)(chromosomes + idx), i,
+    j = IMPROVED_FITNESS_FUNC((global GENE_TYPE*) chromosome, i,
                               SHUFFLER_CHROMOSOME_GENE_SIZE FITNESS_ARGV);
-    if (i != j) {
-      shuffler_chromosome_swap(chromosomes + idx, i, j);
-    }
   } else {
     j = rand_range_exclude(ra, SHUFFLER_CHROMOSOME_GENE_SIZE, i);
-    shuffler_chromosome_swap(chromosomes + idx, i, j);
   }
-  input_rand[idx] = ra[0];
-  shuffler_chromosome_check_dup(chromosomes + idx);
+  if (i != j) {
+#if SHUFFLER_CHROMOSOME_DELTA_FITNESS
+    // the delta is calculated before swapping.
+    if (!dirty[idx]) {
+      fitness[idx] += DELTA_FITNESS_FUNC((global GENE_TYPE*) chromosome, i, j,
+                                         SHUFFLER_CHROMOSOME_GENE_SIZE FITNESS_ARGV);
+    }
+#else
+    dirty[idx] = 1;
+#endif
+    shuffler_chromosome_swap(chromosome, i, j);
+  }
+  shuffler_chromosome_check_dup(chromosome);
 }
 /* ============== end of mutation functions ============== */
 
 /* ============== crossover functions ============== */
 /**
- * shuffler_chromosome_calc_ratio uses utils_calc_ratio to find the best, worst,
- * avg fitnesses among all chromosomes the probability for each chromosomes
- * based on their fitness value.
+ * shuffler_chromosome_calc_ratio uses utils_calc_cumulative_ratio to calculate
+ * the cumulative probability for each chromosomes based on their fitness value.
+ * It should be run in a work group for each island, and the probability is
+ * cumulated in an island.
  * Note: this is a kernel function and will be called by python.
  * @param *fitness (global) the fitness value array of all chromosomes
- * @param *ratio (global, out) the probability array of each chromosomes
- * @seealso ::utils_calc_ratio
+ * @param *ratio (global, out) the cumulative probability array of each
+ *               chromosomes
+ * @param *l_values (local) a float for each work item.
+ * @seealso ::utils_calc_cumulative_ratio
  */
 __kernel void shuffler_chromosome_calc_ratio(global float* fitness,
-                                             global float* ratio)
+                                             global float* ratio,
+                                             local float* l_values)
 {
-  int idx = get_global_id(0);
-  // we use the first kernel to calculate the ratio
-  if (idx > 0) {
-    return;
-  }
-  utils_calc_ratio(fitness, ratio, POPULATION_SIZE);
+  // each work group handles an island.
+  int base = get_group_id(0) * ISLAND_SIZE;
+  utils_calc_cumulative_ratio(fitness + base, ratio + base, l_values, ISLAND_SIZE);
 }
 
 /**
  * shuffler_chromosome_get_the_elites get the elites which meet the
- * best_fitness
+ * best_fitness. It is run with a 2D range. Each work item copies a
+ * gene(dimension 0) of an elite(dimension 1).
  * Note: this is a kernel function and will be called by python.
- * @param top (global) the number of chromosomes in the indices.
  * @param *best_indices (global) the index list of top N best fitness chromosomes.
  * @param *cs (global) all chromosomes.
  * @param *elites (global) elite chromosomes.
+ * @param top the number of chromosomes in the indices.
  */
 __kernel void shuffler_chromosome_get_the_elites(global int* best_indices,
-                                                 global int* cs,
-                                                 global int* elites,
+                                                 global GENE_TYPE* cs,
+                                                 global GENE_TYPE* elites,
                                                  int top)
 {
-  int idx = get_global_id(0);
-  // we use the first kernel to get the best chromosome for now.
-  if (idx > 0) {
+  int gene = get_global_id(0);
+  int i = get_global_id(1);
+  // out of bound kernel task for padding
+  if (gene >= SHUFFLER_CHROMOSOME_GENE_SIZE || i >= top) {
     return;
   }
-  int i;
-  int j;
-  int index;
-  global __ShufflerChromosome* chromosomes = (global __ShufflerChromosome*) cs;
   global __ShufflerChromosome* elites_chromosome = (global __ShufflerChromosome*) elites;
-  for (i = 0; i < top; i++) {
-    index = best_indices[i];
-    for (j = 0; j < SHUFFLER_CHROMOSOME_GENE_SIZE; j++) {
-      elites_chromosome[i].genes[j] = chromosomes[index].genes[j];
-    }
-  }
+  elites_chromosome[i].genes[gene] = CHROMOSOME_GENE(CHROMOSOME_AT(cs, best_indices[i]), gene);
 }
 
 /**
  * shuffler_chromosome_update_the_elites update sorted elites into
- * chromosomes.
+ * chromosomes. It is run with a 2D range. Each work item copies a
+ * gene(dimension 0) of an elite(dimension 1), and the work item of the first
+ * gene updates the fitness.
  * Note: this is a kernel function and will be called by python.
- * @param top (local) the number of chromosomes in the indices.
+ * @param top the number of chromosomes in the indices.
  * @param *worst_indices (global) the index list of bottom N worst fitness chromosomes.
  * @param *cs (global) all chromosomes.
- * @param *fitnesses (global) fitnesses of all chromosomes
  * @param *elites (global) elite chromosomes.
+ * @param *fitnesses (global) fitnesses of all chromosomes
  * @param *elite_fitnesses (global) fitnesses of all elite chromosomes.
  */
 __kernel void shuffler_chromosome_update_the_elites(int top,
                                                     global int* worst_indices,
-                                                    global int* cs,
-                                                    global int* elites,
+                                                    global GENE_TYPE* cs,
+                                                    global GENE_TYPE* elites,
                                                     global float* fitnesses,
                                                     global float* elite_fitnesses)
 {
-  int idx = get_global_id(0);
-  // we use the first kernel to update all elites and their fitnesses.
-  if (idx > 0) {
+  int gene = get_global_id(0);
+  int i = get_global_id(1);
+  // out of bound kernel task for padding
+  if (gene >= SHUFFLER_CHROMOSOME_GENE_SIZE || i >= top) {
     return;
   }
-  int i;
-  int j;
-  int index;
-  global __ShufflerChromosome* chromosomes = (global __ShufflerChromosome*) cs;
+  int index = worst_indices[i];
   global __ShufflerChromosome* elites_chromosome = (global __ShufflerChromosome*) elites;
-  for (i = 0 ; i < top; i++) {
-    index = worst_indices[i];
-    for (j = 0; j < SHUFFLER_CHROMOSOME_GENE_SIZE; j++) {
-      chromosomes[index].genes[j] = elites_chromosome[i].genes[j];
-    }
+  CHROMOSOME_GENE(CHROMOSOME_AT(cs, index), gene) = elites_chromosome[i].genes[gene];
+  if (gene == 0) {
     fitnesses[index] = elite_fitnesses[i];
   }
 }
 
 /**
- * shuffler_chromosome_pick_chromosomes picks a chromosome randomly based on the
- * ratio of each chromosome and copy all genes to p_other for crossover. The
+ * shuffler_chromosome_pick_chromosomes picks a chromosome randomly with the
+ * selection method (see utils_select_chromosome) in the island of current one
+ * and copy all genes to p_other for crossover. The
  * reason copy to p_other is that OpenCLGA runs crossover at multi-thread mode.
  * The picked chromosomes may also be modified at the same time while crossing
  * over. If we don't copy them, we may have duplicated genes in a chromosome.
@@ -265,31 +312,36 @@ __kernel void shuffler_chromosome_update_the_elites(int top,
  * @param *fitness (global) all fitness of chromosomes
  * @param *p_other (global) a spared space for storing another chromosome for
  *                          crossover.
- * @param *input_rand (global) all random seeds.
+ * @param *ratio (global) the cumulative ratio of all chromosomes. It is only
+ *               used by roulette wheel selection.
+ * @param rand_seed the random seed of the run.
+ * @param generation the index of current generation.
  */
-__kernel void shuffler_chromosome_pick_chromosomes(global int* cs,
+__kernel void shuffler_chromosome_pick_chromosomes(global GENE_TYPE* cs,
                                                    global float* fitness,
-                                                   global int* p_other,
+                                                   global GENE_TYPE* p_other,
                                                    global float* ratio,
-                                                   global uint* input_rand)
+                                                   ulong rand_seed,
+                                                   uint generation)
 {
   int idx = get_global_id(0);
   // out of bound kernel task for padding
   if (idx >= POPULATION_SIZE) {
     return;
   }
-  uint ra[1];
-  init_rand(input_rand[idx], ra);
-  global __ShufflerChromosome* chromosomes = (global __ShufflerChromosome*) cs;
-  global __ShufflerChromosome* parent_other = (global __ShufflerChromosome*) p_other;
+  rand_state ra[1];
+  init_rand(ra, rand_seed, generation, idx, RAND_KERNEL_PICK);
   int i;
   // pick another chromosome randomly
-  int cross_idx = random_choose_by_ratio(ratio, ra, POPULATION_SIZE);
+  int base = ISLAND_BASE(idx);
+  int cross_idx = base + utils_select_chromosome(fitness + base, ratio + base, ra,
+                                                 ISLAND_SIZE);
+  global GENE_TYPE* chromosome = CHROMOSOME_AT(cs, cross_idx);
+  global GENE_TYPE* parent_other = CHROMOSOME_AT(p_other, idx);
   // copy the chromosome to local memory for crossover
   for (i = 0; i < SHUFFLER_CHROMOSOME_GENE_SIZE; i++) {
-    parent_other[idx].genes[i] = chromosomes[cross_idx].genes[i];
+    CHROMOSOME_GENE(parent_other, i) = CHROMOSOME_GENE(chromosome, i);
   }
-  input_rand[idx] = ra[0];
 }
 
 /**
@@ -301,16 +353,25 @@ __kernel void shuffler_chromosome_pick_chromosomes(global int* cs,
  *                          crossover.
  * @param *c_map (global) a temp int array for marking if a gene is already in
  *                        the chromosome.
- * @param *input_rand (global) all random seeds.
- * @param best_index the index of best fitness of all chromosomes.
+ * @param rand_seed the random seed of the run.
+ * @param generation the index of current generation.
+ * @param *dirty (global, out) the dirty flag of each chromosome.
+ * @param *best_fitnesses (global) the top N best fitnesses of all chromosomes,
+ *                        or the best fitness of each independent island.
+ * @param *worst_fitnesses (global) the bottom N worst fitnesses of all
+ *                         chromosomes, or the worst fitness of each
+ *                         independent island.
  * @param prob_crossover the threshold of crossover.
  */
-__kernel void shuffler_chromosome_do_crossover(global int* cs,
+__kernel void shuffler_chromosome_do_crossover(global GENE_TYPE* cs,
                                                global float* fitness,
-                                               global int* p_other,
-                                               global int* c_map,
-                                               global uint* input_rand,
-                                               float best_fitness,
+                                               global GENE_TYPE* p_other,
+                                               global GENE_TYPE* c_map,
+                                               ulong rand_seed,
+                                               uint generation,
+                                               global uchar* dirty,
+                                               global float* best_fitnesses,
+                                               global float* worst_fitnesses,
                                                float prob_crossover)
 {
   int idx = get_global_id(0);
@@ -318,30 +379,32 @@ __kernel void shuffler_chromosome_do_crossover(global int* cs,
   if (idx >= POPULATION_SIZE) {
     return;
   }
-  uint ra[1];
-  init_rand(input_rand[idx], ra);
+  rand_state ra[1];
+  init_rand(ra, rand_seed, generation, idx, RAND_KERNEL_CROSSOVER);
 
   // keep the shortest path, we have to return here to prevent async barrier if someone is returned.
-  if (fabs(fitness[idx] - best_fitness) < 0.000001) {
-    input_rand[idx] = ra[0];
+  // all chromosomes are almost the same, we don't do crossover to prevent the
+  // best one being changed.
+  float best = ISLAND_FITNESS(best_fitnesses, idx);
+  float worst = ISLAND_FITNESS(worst_fitnesses, idx);
+  if (fabs(best - worst) < 0.00001 || fabs(fitness[idx] - best) < 0.000001) {
     return;
-  } else if (rand_prob(ra) >= prob_crossover) {
-    input_rand[idx] = ra[0];
+  } else if (rand_prob(ra) >= ISLAND_PROB_CROSSOVER(idx, prob_crossover)) {
     return;
   }
-  global __ShufflerChromosome* chromosomes = (global __ShufflerChromosome*) cs;
-  global __ShufflerChromosome* parent_other = (global __ShufflerChromosome*) p_other;
+  global GENE_TYPE* chromosome = CHROMOSOME_AT(cs, idx);
+  global GENE_TYPE* parent_other = CHROMOSOME_AT(p_other, idx);
   // we use chromosome as a map object for checking the existence of Nth item.
-  global __ShufflerChromosome* cross_map = (global __ShufflerChromosome*) c_map;
+  global GENE_TYPE* cross_map = CHROMOSOME_AT(c_map, idx);
   __ShufflerChromosome self;
   int i;
   int cross_point;
 
   for (i = 0; i < SHUFFLER_CHROMOSOME_GENE_SIZE; i++) {
     // copy self chromosome to local memory for cross over
-    self.genes[i] = chromosomes[idx].genes[i];
+    self.genes[i] = CHROMOSOME_GENE(chromosome, i);
     // reset the cross_map to 0
-    cross_map[idx].genes[i] = 0;
+    CHROMOSOME_GENE(cross_map, i) = 0;
   }
 
   // we must be cross over at least one element and must not cross over all of the element.
@@ -349,17 +412,17 @@ __kernel void shuffler_chromosome_do_crossover(global int* cs,
 
   // copy the first part from other chromosome
   for (i = 0; i < cross_point; i++) {
-    chromosomes[idx].genes[i] = parent_other[idx].genes[i];
-    cross_map[idx].genes[parent_other[idx].genes[i]] = 1;
+    CHROMOSOME_GENE(chromosome, i) = CHROMOSOME_GENE(parent_other, i);
+    CHROMOSOME_GENE(cross_map, CHROMOSOME_GENE(parent_other, i)) = 1;
   }
   // sort the second part at self chromosome
   for (i = 0; i < SHUFFLER_CHROMOSOME_GENE_SIZE; i++) {
-    if (cross_map[idx].genes[self.genes[i]] == 0) {
-        chromosomes[idx].genes[cross_point++] = self.genes[i];
+    if (CHROMOSOME_GENE(cross_map, self.genes[i]) == 0) {
+        CHROMOSOME_GENE(chromosome, cross_point++) = self.genes[i];
     }
   }
-  shuffler_chromosome_check_dup(chromosomes + idx);
-  input_rand[idx] = ra[0];
+  shuffler_chromosome_check_dup((global __ShufflerChromosome*) chromosome);
+  dirty[idx] = 1;
 }
 /* ============== end of crossover functions ============== */
 
@@ -4,7 +4,7 @@
 #include "ga_utils.cl"
 
 typedef struct {
-  int genes[SIMPLE_CHROMOSOME_GENE_SIZE];
+  GENE_TYPE genes[SIMPLE_CHROMOSOME_GENE_SIZE];
 } __SimpleChromosome;
 
 /* ============== populate functions ============== */
@@ -12,15 +12,15 @@ typedef struct {
  * simple_chromosome_do_populate populates a chromosome randomly. Unlike shuffler chromosome, it
  * chooses a gene randomly based on gene's element.
  * @param *chromosome (global, out) the target chromosome.
- * @param *rand_holder the random seed holder.
+ * @param *rand_holder the random state of current work item.
  */
 void simple_chromosome_do_populate(global __SimpleChromosome* chromosome,
-                                   uint* rand_holder)
+                                   rand_state* rand_holder)
 {
   uint gene_elements_size[] = SIMPLE_CHROMOSOME_GENE_ELEMENTS_SIZE;
   for (int i = 0; i < SIMPLE_CHROMOSOME_GENE_SIZE; i++) {
     // choose an element randomly based on each gene's element size.
-    chromosome->genes[i] = rand_range(rand_holder, gene_elements_size[i]);
+    CHROMOSOME_GENE(chromosome, i) = rand_range(rand_holder, gene_elements_size[i]);
   }
 }
 
@@ -28,10 +28,14 @@ void simple_chromosome_do_populate(global __SimpleChromosome* chromosome,
  * simple_chromosome_populate populates all chromosomes randomly.
  * Note: this is a kernel function and will be called by python.
  * @param *cs (global, out) all chromosomes where population to be stored.
- * @param *input_rand (global) random seeds.
+ * @param rand_seed the random seed of the run.
+ * @param generation the index of current generation.
+ * @param *dirty (global, out) the dirty flag of each chromosome.
  */
-__kernel void simple_chromosome_populate(global int* cs,
-                                         global uint* input_rand)
+__kernel void simple_chromosome_populate(global GENE_TYPE* cs,
+                                         ulong rand_seed,
+                                         uint generation,
+                                         global uchar* dirty)
 {
   int idx = get_global_id(0);
   // out of bound kernel task for padding
@@ -39,11 +43,11 @@ __kernel void simple_chromosome_populate(global int* cs,
     return;
   }
   // create a private variable for each kernel to hold randome number.
-  uint ra[1];
-  init_rand(input_rand[idx], ra);
-  simple_chromosome_do_populate(((global __SimpleChromosome*) cs) + idx,
+  rand_state ra[1];
+  init_rand(ra, rand_seed, generation, idx, RAND_KERNEL_POPULATE);
+  simple_chromosome_do_populate((global __SimpleChromosome*) CHROMOSOME_AT(cs, idx),
                                 ra);
-  input_rand[idx] = ra[0];
+  dirty[idx] = 1;
 }
 /* ============== end of populating functions ============== */
 
@@ -51,27 +55,31 @@ __kernel void simple_chromosome_populate(global int* cs,
 /**
  * mutate a single gene of a chromosome.
  * @param *chromosome (global) the chromosome for mutation.
- * @param *ra random seed holder.
+ * @param *ra the random state of current work item.
  */
 void simple_chromosome_do_mutate(global __SimpleChromosome* chromosome,
-                                 uint* ra)
+                                 rand_state* ra)
 {
   // create element size list
   uint elements_size[] = SIMPLE_CHROMOSOME_GENE_ELEMENTS_SIZE;
   uint gene_idx = rand_range(ra, SIMPLE_CHROMOSOME_GENE_SIZE);
   // use gene's mutate function to mutate it.
-  SIMPLE_CHROMOSOME_GENE_MUTATE_FUNC(chromosome->genes + gene_idx,
+  SIMPLE_CHROMOSOME_GENE_MUTATE_FUNC(&CHROMOSOME_GENE(chromosome, gene_idx),
                                      elements_size[gene_idx], ra);
 }
 /**
  * mutate a single gene of all chromosomes based on the prob_mutate. If a
  * chromosome pass the probability, a single gene of it will be mutated.
  * @param *chromosome (global) the chromosome for mutation.
- * @param *ra (global) random seed holder.
+ * @param rand_seed the random seed of the run.
+ * @param generation the index of current generation.
+ * @param *dirty (global, out) the dirty flag of each chromosome.
  * @param prob_mutate the probability of mutation.
  */
-__kernel void simple_chromosome_mutate(global int* cs,
-                                       global uint* input_rand,
+__kernel void simple_chromosome_mutate(global GENE_TYPE* cs,
+                                       ulong rand_seed,
+                                       uint generation,
+                                       global uchar* dirty,
                                        float prob_mutate)
 {
   int idx = get_global_id(0);
@@ -80,26 +88,30 @@ __kernel void simple_chromosome_mutate(global int* cs,
     return;
   }
 
-  uint ra[1];
-  init_rand(input_rand[idx], ra);
+  rand_state ra[1];
+  init_rand(ra, rand_seed, generation, idx, RAND_KERNEL_MUTATE);
   float prob_m = rand_prob(ra);
-  if (prob_m > prob_mutate) {
-    input_rand[idx] = ra[0];
+  if (prob_m > ISLAND_PROB_MUTATION(idx, prob_mutate)) {
     return;
   }
 
-  simple_chromosome_do_mutate((global __SimpleChromosome*) cs, ra);
+  simple_chromosome_do_mutate((global __SimpleChromosome*) CHROMOSOME_AT(cs, idx), ra);
+  dirty[idx] = 1;
 }
 
 /**
  * mutate all genes of all chromosomes based on the prob_mutate. Once a
  * chromosome passes the probability, all genes of it will be mutated.
  * @param *chromosome (global) the chromosome for mutation.
- * @param *ra (global) random seed holder.
+ * @param rand_seed the random seed of the run.
+ * @param generation the index of current generation.
+ * @param *dirty (global, out) the dirty flag of each chromosome.
  * @param prob_mutate the probability of mutation.
  */
-__kernel void simple_chromosome_mutate_all(global int* cs,
-                                           global uint* input_rand,
+__kernel void simple_chromosome_mutate_all(global GENE_TYPE* cs,
+                                           ulong rand_seed,
+                                           uint generation,
+                                           global uchar* dirty,
                                            float prob_mutate)
 {
   int idx = get_global_id(0);
@@ -108,44 +120,47 @@ __kernel void simple_chromosome_mutate_all(global int* cs,
     return;
   }
   uint elements_size[] = SIMPLE_CHROMOSOME_GENE_ELEMENTS_SIZE;
+  global GENE_TYPE* chromosome = CHROMOSOME_AT(cs, idx);
   int i;
-  uint ra[1];
-  init_rand(input_rand[idx], ra);
+  rand_state ra[1];
+  init_rand(ra, rand_seed, generation, idx, RAND_KERNEL_MUTATE);
   for (i = 0; i < SIMPLE_CHROMOSOME_GENE_SIZE; i++) {
-    if (rand_prob(ra) > prob_mutate) {
+    if (rand_prob(ra) > ISLAND_PROB_MUTATION(idx, prob_mutate)) {
       continue;
     }
-    SIMPLE_CHROMOSOME_GENE_MUTATE_FUNC(cs + i, elements_size[i], ra);
+    SIMPLE_CHROMOSOME_GENE_MUTATE_FUNC(&CHROMOSOME_GENE(chromosome, i),
+                                       elements_size[i], ra);
+    dirty[idx] = 1;
   }
-
-  input_rand[idx] = ra[0];
 }
 /* ============== end of mutation functions ============== */
 
 /* ============== crossover functions ============== */
 /**
- * simple_chromosome_calc_ratio uses utils_calc_ratio to find the best, worst,
- * avg fitnesses among all chromosomes the probability for each chromosomes
- * based on their fitness value.
+ * simple_chromosome_calc_ratio uses utils_calc_cumulative_ratio to calculate
+ * the cumulative probability for each chromosomes based on their fitness value.
+ * It should be run in a work group for each island, and the probability is
+ * cumulated in an island.
  * Note: this is a kernel function and will be called by python.
  * @param *fitness (global) the fitness value array of all chromosomes
- * @param *ratio (global, out) the probability array of each chromosomes
- * @seealso ::utils_calc_ratio
+ * @param *ratio (global, out) the cumulative probability array of each
+ *               chromosomes
+ * @param *l_values (local) a float for each work item.
+ * @seealso ::utils_calc_cumulative_ratio
  */
 __kernel void simple_chromosome_calc_ratio(global float* fitness,
-                                           global float* ratio)
+                                           global float* ratio,
+                                           local float* l_values)
 {
-  int idx = get_global_id(0);
-  // we use the first kernel to calculate the ratio
-  if (idx > 0) {
-    return;
-  }
-  utils_calc_ratio(fitness, ratio, POPULATION_SIZE);
+  // each work group handles an island.
+  int base = get_group_id(0) * ISLAND_SIZE;
+  utils_calc_cumulative_ratio(fitness + base, ratio + base, l_values, ISLAND_SIZE);
 }
 
 /**
- * simple_chromosome_pick_chromosomes picks a chromosome randomly based on the
- * ratio of each chromosome and copy all genes to p_other for crossover. The
+ * simple_chromosome_pick_chromosomes picks a chromosome randomly with the
+ * selection method (see utils_select_chromosome) in the island of current one
+ * and copy all genes to p_other for crossover. The
  * reason copy to p_other is that OpenCLGA runs crossover at multi-thread mode.
  * The picked chromosomes may also be modified at the same time while crossing
  * over. If we don't copy them, we may have duplicated genes in a chromosome.
@@ -154,32 +169,36 @@ __kernel void simple_chromosome_calc_ratio(global float* fitness,
  * @param *fitness (global) all fitness of chromosomes
  * @param *p_other (global) a spared space for storing another chromosome for
  *                          crossover.
- * @param *ratio (global) the ratio of all chromosomes.
- * @param *input_rand (global) all random seeds.
+ * @param *ratio (global) the cumulative ratio of all chromosomes. It is only
+ *               used by roulette wheel selection.
+ * @param rand_seed the random seed of the run.
+ * @param generation the index of current generation.
  */
-__kernel void simple_chromosome_pick_chromosomes(global int* cs,
+__kernel void simple_chromosome_pick_chromosomes(global GENE_TYPE* cs,
                                                  global float* fitness,
-                                                 global int* p_other,
+                                                 global GENE_TYPE* p_other,
                                                  global float* ratio,
-                                                 global uint* input_rand)
+                                                 ulong rand_seed,
+                                                 uint generation)
 {
   int idx = get_global_id(0);
   // out of bound kernel task for padding
   if (idx >= POPULATION_SIZE) {
     return;
   }
-  uint ra[1];
-  init_rand(input_rand[idx], ra);
-  global __SimpleChromosome* chromosomes = (global __SimpleChromosome*) cs;
-  global __SimpleChromosome* other = (global __SimpleChromosome*) p_other;
+  rand_state ra[1];
+  init_rand(ra, rand_seed, generation, idx, RAND_KERNEL_PICK);
   int i;
   // Pick another chromosome as parent_other.
-  int cross_idx = random_choose_by_ratio(ratio, ra, POPULATION_SIZE);
+  int base = ISLAND_BASE(idx);
+  int cross_idx = base + utils_select_chromosome(fitness + base, ratio + base, ra,
+                                                 ISLAND_SIZE);
+  global GENE_TYPE* chromosome = CHROMOSOME_AT(cs, cross_idx);
+  global GENE_TYPE* other = CHROMOSOME_AT(p_other, idx);
   // copy the chromosome to local memory for cross over
   for (i = 0; i < SIMPLE_CHROMOSOME_GENE_SIZE; i++) {
-    other[idx].genes[i] = chromosomes[cross_idx].genes[i];
+    CHROMOSOME_GENE(other, i) = CHROMOSOME_GENE(chromosome, i);
   }
-  input_rand[idx] = ra[0];
 }
 
 /**
@@ -192,12 +211,16 @@ __kernel void simple_chromosome_pick_chromosomes(global int* cs,
  *        |start (copy from parent 2)  |end
  *        |^^^^^^^^^^^^^^^^^^^^^^^^^^^^|
  * CS2 |----------------------------------|
+ * The chromosome is marked dirty if any gene is copied.
  */
-__kernel void simple_chromosome_do_crossover(global int* cs,
+__kernel void simple_chromosome_do_crossover(global GENE_TYPE* cs,
                                              global float* fitness,
-                                             global int* p_other,
-                                             global uint* input_rand,
-                                             float best_fitness,
+                                             global GENE_TYPE* p_other,
+                                             ulong rand_seed,
+                                             uint generation,
+                                             global uchar* dirty,
+                                             global float* best_fitnesses,
+                                             global float* worst_fitnesses,
                                              float prob_crossover)
 {
   int idx = get_global_id(0);
@@ -205,97 +228,91 @@ __kernel void simple_chromosome_do_crossover(global int* cs,
   if (idx >= POPULATION_SIZE) {
     return;
   }
-  uint ra[1];
-  init_rand(input_rand[idx], ra);
+  rand_state ra[1];
+  init_rand(ra, rand_seed, generation, idx, RAND_KERNEL_CROSSOVER);
 
   // keep the shortest path, we have to return here to prevent async barrier
   // if someone is returned.
-  if (fabs(fitness[idx] - best_fitness) < 0.000001) {
-    input_rand[idx] = ra[0];
+  // all chromosomes are almost the same, we don't do crossover to prevent the
+  // best one being changed.
+  float best = ISLAND_FITNESS(best_fitnesses, idx);
+  float worst = ISLAND_FITNESS(worst_fitnesses, idx);
+  if (fabs(best - worst) < 0.00001 || fabs(fitness[idx] - best) < 0.000001) {
     return;
-  } else if (rand_prob(ra) >= prob_crossover) {
-    input_rand[idx] = ra[0];
+  } else if (rand_prob(ra) >= ISLAND_PROB_CROSSOVER(idx, prob_crossover)) {
     return;
   }
-  global __SimpleChromosome* chromosomes = (global __SimpleChromosome*) cs;
-  global __SimpleChromosome* other = (global __SimpleChromosome*) p_other;
+  global GENE_TYPE* chromosome = CHROMOSOME_AT(cs, idx);
+  global GENE_TYPE* other = CHROMOSOME_AT(p_other, idx);
   int i;
   // keep at least one for .
   int start = rand_range(ra, SIMPLE_CHROMOSOME_GENE_SIZE - 1);
   int end = start + rand_range(ra, SIMPLE_CHROMOSOME_GENE_SIZE - start);
   // copy partial genes from other chromosome
   for (i = start; i < end; i++) {
-    chromosomes[idx].genes[i] = other[idx].genes[i];
+    CHROMOSOME_GENE(chromosome, i) = CHROMOSOME_GENE(other, i);
+  }
+  if (end > start) {
+    dirty[idx] = 1;
   }
-
-  input_rand[idx] = ra[0];
 }
 /* ============== end of crossover functions ============== */
 /* ============== elitism ================================= */
 /**
  * simple_chromosome_get_the_elites get the elites which meet the best_fitness
+ * It is run with a 2D range. Each work item copies a gene(dimension 0) of an
+ * elite(dimension 1).
  * Note: this is a kernel function and will be called by python.
- * @param top (global) the number of chromosomes in the indices.
  * @param *best_indices (global) the index list of top N best fitness chromosomes.
  * @param *cs (global) all chromosomes.
  * @param *elites (global) elite chromosomes.
+ * @param top the number of chromosomes in the indices.
  */
-__kernel void simple_chromosome_get_the_elites(global float* best_indices,
-                                               global int* cs,
-                                               global int* elites,
+__kernel void simple_chromosome_get_the_elites(global int* best_indices,
+                                               global GENE_TYPE* cs,
+                                               global GENE_TYPE* elites,
                                                int top)
 {
-  int idx = get_global_id(0);
-  // we use the first kernel to get the best chromosome for now.
-  if (idx > 0) {
+  int gene = get_global_id(0);
+  int i = get_global_id(1);
+  // out of bound kernel task for padding
+  if (gene >= SIMPLE_CHROMOSOME_GENE_SIZE || i >= top) {
     return;
   }
-  int i;
-  int j;
-  int index;
-  global __SimpleChromosome* chromosomes = (global __SimpleChromosome*) cs;
   global __SimpleChromosome* elites_chromosome = (global __SimpleChromosome*) elites;
-  for (i = 0; i < top; i++) {
-    index = best_indices[i];
-    for (j = 0; j < SIMPLE_CHROMOSOME_GENE_SIZE; j++) {
-      elites_chromosome[i].genes[j] = chromosomes[index].genes[j];
-    }
-  }
+  elites_chromosome[i].genes[gene] = CHROMOSOME_GENE(CHROMOSOME_AT(cs, best_indices[i]), gene);
 }
 
 /**
  * simple_chromosome_update_the_elites update sorted elites into chromosomes.
+ * It is run with a 2D range. Each work item copies a gene(dimension 0) of an
+ * elite(dimension 1), and the work item of the first gene updates the fitness.
  * Note: this is a kernel function and will be called by python.
- * @param top (local) the number of chromosomes in the indices.
+ * @param top the number of chromosomes in the indices.
  * @param *worst_indices (global) the index list of bottom N worst fitness chromosomes.
  * @param *cs (global) all chromosomes.
- * @param *fitnesses (global) fitnesses of all chromosomes
  * @param *elites (global) elite chromosomes.
+ * @param *fitnesses (global) fitnesses of all chromosomes
  * @param *elite_fitnesses (global) fitnesses of all elite chromosomes.
  */
 __kernel void simple_chromosome_update_the_elites(int top,
                                                   global int* worst_indices,
-                                                  global int* cs,
-                                                  global int* elites,
+                                                  global GENE_TYPE* cs,
+                                                  global GENE_TYPE* elites,
                                                   global float* fitnesses,
                                                   global float* elite_fitnesses)
 {
-  int idx = get_global_id(0);
-  // we use the first kernel to update all elites and their fitnesses.
-  if (idx > 0) {
+  int gene = get_global_id(0);
+  int i = get_global_id(1);
+  // out of bound kernel task for padding
+  if (gene >= SIMPLE_CHROMOSOME_GENE_SIZE || i >= top) {
     return;
   }
-  int i;
-  int j;
-  int index;
-  global __SimpleChromosome* chromosomes = (global __SimpleChromosome*) cs;
+  int index = worst_indices[i];
   global __SimpleChromosome* elites_chromosome = (global __SimpleChromosome*) elites;
-  for (i = 0 ; i < top; i++) {
-    index = worst_indices[i];
-    for (j = 0; j < SIMPLE_CHROMOSOME_GENE_SIZE; j++) {
-      chromosomes[index].genes[j] = elites_chromosome[i].genes[j];
-    }
-    fitnesses[index] = elite_fitnesses[index];
+  CHROMOSOME_GENE(CHROMOSOME_AT(cs, index), gene) = elites_chromosome[i].genes[gene];
+  if (gene == 0) {
+    fitnesses[index] = elite_fitnesses[i];
   }
 }
 /* ============== end of elitism functions ============== */
@@ -8,9 +8,9 @@
  * the index, we random select another index as the value of the gene.
  * @param *gene (global) the gene we need to mutate
  * @param max the size of elements.
- * @param *ra the random number holder.
+ * @param *ra the random state of current work item.
  */
-void simple_gene_mutate(global int* gene, uint max, uint* ra) {
+void simple_gene_mutate(global GENE_TYPE* gene, uint max, rand_state* ra) {
   *gene = rand_range_exclude(ra, max, *gene);
 }
 
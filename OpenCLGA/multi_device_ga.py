@@ -0,0 +1,336 @@
+#!/usr/bin/python3
+import os
+import copy
+import time
+import pickle
+import threading
+import pyopencl as cl
+from . import utils
+from .ocl_ga import OpenCLGA, StateMachine, EnterExit
+from .statistics import Statistics
+from .profiler import Profiler
+from .callback_dispatcher import CallbackDispatcher
+from .elite_frame import decode_elites
+from .utilities.generaltaskthread import Logger
+
+## Run one GA over several OpenCL devices in a single process.
+#  The population is split into shares, one per device, and each share is
+#  evolved by an OpenCLGA with its own context and command queue. The elites
+#  of all shares are read back into host memory (see elitism_mode), sorted,
+#  and the top N of them are written back to every device, so the shares
+#  evolve as one population without the server/client stack.
+#  The options are the same as OpenCLGA's with the following extras.
+#  'devices' : The list of pyopencl devices. The devices of 'cl_context' are
+#              used if it is given, otherwise all devices of all platforms.
+#  'device_weights' : The relative throughput of each device. The population
+#                     is split by these weights. By default, it is the number
+#                     of compute units times the max clock frequency.
+#  If 'elitism_mode' is not given, the best one of each device is exchanged
+#  whenever all devices report their elites. A round of exchanging elites
+#  needs 'every' reports and the latest elites of every running device, so a
+#  fast device can't complete a round alone.
+#  @var __devices The list of devices.
+#  @var __populations The population share of each device.
+#  @var __gas The OpenCLGA of each device.
+#  @var __finished The indices of devices whose OpenCLGA is stopped.
+#  @var __pending A dictionary of generation index to the results of devices
+#                 which are not combined yet.
+#  @var __statistics The statistics of the whole population.
+#  @var __elites The top N elites of the previous rounds.
+#  @var __round_elites A dictionary of device index to its latest elites in
+#                      current round.
+#  @var __elitism_round The number of elite reports received in current round.
+class MultiDeviceOpenCLGA(Logger):
+    def __init__(self, options, action_callbacks = {}):
+        Logger.__init__(self)
+        if action_callbacks is not None:
+            for action, cb in action_callbacks.items():
+                assert callable(cb)
+        self.action_callbacks = action_callbacks
+        self.state_machine = StateMachine(self, 'waiting')
+        self.__init_members(options)
+        self.__create_gas(options)
+
+    @property
+    def paused(self):
+        return self._paused
+
+    @property
+    def elapsed_time(self):
+        return max([ga.elapsed_time for ga in self.__gas])
+
+    @property
+    def devices(self):
+        return self.__devices
+
+    @property
+    def populations(self):
+        return self.__populations
+
+    def __init_members(self, options):
+        cl_context = options.get('cl_context', None)
+        if 'devices' in options:
+            self.__devices = list(options['devices'])
+        elif cl_context is not None:
+            self.__devices = list(cl_context.devices)
+        else:
+            self.__devices = [device for platform in cl.get_platforms()
+                                     for device in platform.get_devices()]
+        assert len(self.__devices) > 0
+
+        weights = options.get('device_weights', None)
+        if weights is None:
+            weights = [device.max_compute_units * max(device.max_clock_frequency, 1)
+                       for device in self.__devices]
+        assert len(weights) == len(self.__devices)
+        self.__populations = self.__split_population(options['population'], weights)
+
+        self.__opt_for_max = options.get('opt_for_max', 'max')
+        elitism_info = options.get('elitism_mode', { 'top' : 1,
+                                                     'every' : len(self.__devices) })
+        self.__elitism_top = elitism_info.get('top', 1)
+        self.__elitism_every = elitism_info.get('every', 0)
+        self.__is_elitism_mode = all([self.__elitism_top, self.__elitism_every])
+        assert self.__elitism_top <= min(self.__populations)
+        self.__elites = []
+        self.__round_elites = {}
+        self.__elitism_round = 0
+        self.__elite_lock = threading.Lock()
+
+        statistics_info = options.get('statistics', {})
+        self.__statistics = Statistics(statistics_info.get('capacity', None),
+                                       statistics_info.get('retention', 'ring'),
+                                       statistics_info.get('path', None))
+        self.__pending = {}
+        self.__finished = set()
+        self.__result_lock = threading.Lock()
+
+        self.__generation_callback = options.get('generation_callback', None)
+        queue_info = options.get('callback_queue', {})
+        self.__callback_dispatcher = None
+        if self.__generation_callback is not None and queue_info is not False:
+            self.__callback_dispatcher = CallbackDispatcher(self.__generation_callback,
+                                                            queue_info.get('size', 64),
+                                                            queue_info.get('policy', 'coalesce'))
+        self.__saved_filename = options.get('saved_filename', None)
+        self._paused = False
+        self._stopped = False
+
+    ## Split the population by weights. Each device gets at least one
+    #  chromosome and the rest are given to the devices with largest weights.
+    def __split_population(self, population, weights):
+        assert population >= len(weights)
+        total = float(sum(weights))
+        shares = [max(1, int(population * w / total)) for w in weights]
+        order = sorted(range(len(weights)), key=lambda i: weights[i], reverse=True)
+        i = 0
+        while sum(shares) != population:
+            idx = order[i % len(order)]
+            if sum(shares) < population:
+                shares[idx] += 1
+            elif shares[idx] > 1:
+                shares[idx] -= 1
+            i += 1
+        return shares
+
+    def __create_gas(self, options):
+        self.__gas = []
+        for idx, device in enumerate(self.__devices):
+            ga_options = dict(options)
+            for key in ['devices', 'device_weights', 'cl_context', 'saved_filename',
+                        'statistics', 'callback_queue']:
+                ga_options.pop(key, None)
+            ga_options['cl_context'] = cl.Context(devices=[device])
+            # The chromosome keeps the device memory of a context, so each
+            # device has its own one.
+            ga_options['sample_chromosome'] = copy.deepcopy(options['sample_chromosome'])
+            ga_options['population'] = self.__populations[idx]
+            if options.get('seed', None) is not None:
+                # Each device evolves with its own random numbers.
+                ga_options['seed'] = utils.derive_seed(options['seed'], 'device-{}'.format(idx))
+            # Results are staged synchronously, the user callback is called by
+            # our own dispatcher.
+            ga_options['callback_queue'] = False
+            ga_options['generation_callback'] = lambda index, result, idx=idx:\
+                                                    self.__on_generation(idx, index, result)
+            if self.__is_elitism_mode:
+                elitism_info = dict(options.get('elitism_mode', {}))
+                elitism_info['top'] = self.__elitism_top
+                elitism_info['every'] = self.__elitism_every
+                ga_options['elitism_mode'] = elitism_info
+            if 'checkpoint' in options:
+                checkpoint_info = dict(options['checkpoint'])
+                checkpoint_info['path'] = os.path.join(checkpoint_info['path'],
+                                                       'device-{}'.format(idx))
+                ga_options['checkpoint'] = checkpoint_info
+            ga = OpenCLGA(ga_options,
+                          action_callbacks={ 'state' : lambda state, idx=idx:\
+                                                           self.__on_state_changed(idx, state) })
+            self.info('Device [{}] {} : population {}'.format(idx, device.name,
+                                                             self.__populations[idx]))
+            self.__gas.append(ga)
+
+    ## Called by the OpenCLGA of a device at the end of each generation.
+    def __on_generation(self, idx, index, result):
+        if self.__is_elitism_mode and result['best_result']:
+            self.__stage_elites(idx, decode_elites(result['best_result']))
+        with self.__result_lock:
+            self.__pending.setdefault(index, {})[idx] = result
+            self.__combine_pending_results()
+
+    ## Keep the elites of a device in host memory. When all running devices
+    #  reported in current round, the top N of them are written to all
+    #  devices.
+    def __stage_elites(self, idx, best_result):
+        elites = best_result['elites']
+        dna_size = best_result['dna_size']
+        with self.__elite_lock:
+            # Only the latest elites of a device are kept in a round.
+            self.__round_elites[idx] = [(fitness, elites[i*dna_size:(i+1)*dna_size], idx)
+                                        for i, fitness in enumerate(best_result['fitnesses'])]
+            self.__elitism_round += 1
+            running = [ga_idx for ga_idx in range(len(self.__gas))
+                              if ga_idx not in self.__finished]
+            if self.__elitism_round < self.__elitism_every or\
+               not all([ga_idx in self.__round_elites for ga_idx in running]):
+                return
+            for device_elites in self.__round_elites.values():
+                self.__elites.extend(device_elites)
+            self.__elites.sort(key=lambda item : item[0],
+                               reverse=self.__opt_for_max == 'max')
+            self.__elites = self.__elites[:self.__elitism_top]
+            top_elites = list(self.__elites)
+            self.__round_elites = {}
+            self.__elitism_round = 0
+        # Elites are only staged by update_elites and written to the device
+        # by its own GA thread at the next batch.
+        for ga_idx, ga in enumerate(self.__gas):
+            if ga_idx not in self.__finished:
+                ga.update_elites(top_elites)
+
+    ## Combine the results of a generation once all running devices reported
+    #  it. The best, worst are picked from all devices and the avg is weighted
+    #  by the population share of devices.
+    def __combine_pending_results(self):
+        running = [idx for idx in range(len(self.__gas)) if idx not in self.__finished]
+        for index in sorted(self.__pending.keys()):
+            results = self.__pending[index]
+            if not all([idx in results for idx in running]):
+                break
+            del self.__pending[index]
+            pick = max if self.__opt_for_max == 'max' else min
+            best_idx = pick(results, key=lambda idx: results[idx]['best'])
+            worst_idx = pick(results, key=lambda idx: -results[idx]['worst'])
+            total = sum([self.__populations[idx] for idx in results])
+            avg = sum([results[idx]['avg'] * self.__populations[idx] for idx in results]) / total
+            profile = None
+            for idx in results:
+                profile = Profiler.merge_times(profile, results[idx]['profile'])
+            combined = { 'best' : results[best_idx]['best'],
+                         'worst' : results[worst_idx]['worst'],
+                         'avg' : avg,
+                         'best_result' : results[best_idx]['best_result'],
+                         'profile' : profile }
+            self.__statistics.record(index, combined['best'], combined['worst'],
+                                     combined['avg'], time.time())
+            if self.__callback_dispatcher is not None:
+                self.__callback_dispatcher.notify(index, combined)
+            elif self.__generation_callback is not None:
+                self.__generation_callback(index, combined)
+
+    def __on_state_changed(self, idx, state):
+        if state != 'stopped':
+            return
+        with self.__result_lock:
+            self.__finished.add(idx)
+            self.__combine_pending_results()
+            all_finished = len(self.__finished) == len(self.__gas)
+        if all_finished and not self._stopped:
+            t = threading.Thread(target=self.stop)
+            t.daemon = True
+            t.start()
+
+    # public methods
+    @EnterExit()
+    def prepare(self):
+        for ga in self.__gas:
+            ga.prepare()
+
+    @EnterExit()
+    def run(self, arg_prob_mutate = 0, arg_prob_crossover = 0):
+        self._paused = False
+        for ga in self.__gas:
+            ga.run(arg_prob_mutate, arg_prob_crossover)
+
+    @EnterExit()
+    def pause(self):
+        self._paused = True
+        for idx, ga in enumerate(self.__gas):
+            if idx not in self.__finished:
+                ga.pause()
+
+    @EnterExit()
+    def stop(self):
+        self._stopped = True
+        for idx, ga in enumerate(self.__gas):
+            if idx not in self.__finished:
+                ga.stop()
+        if self.__callback_dispatcher is not None:
+            self.__callback_dispatcher.stop()
+
+    ## Save the statistics of the whole population to filename and the state of
+    #  each device to filename.N.
+    @EnterExit()
+    def save(self, filename = None):
+        assert self._paused, 'save is only availabled while paused'
+        fname = self.__saved_filename if self.__saved_filename else filename
+        for idx, ga in enumerate(self.__gas):
+            ga.save('{}.{}'.format(fname, idx))
+        with open(fname, 'wb') as f:
+            pickle.dump({ 'populations' : self.__populations,
+                          'statistics' : self.__statistics.get_state() }, f)
+
+    ## Restore from a file saved by save, or a checkpoint folder which has a
+    #  'device-N' folder for each device. The statistics of the whole
+    #  population are not included in checkpoints.
+    @EnterExit()
+    def restore(self, filename = None):
+        fname = self.__saved_filename if self.__saved_filename else filename
+        if os.path.isdir(fname):
+            for idx, ga in enumerate(self.__gas):
+                ga.restore(os.path.join(fname, 'device-{}'.format(idx)))
+            return
+        with open(fname, 'rb') as f:
+            data = pickle.load(f)
+        assert data['populations'] == self.__populations,\
+               'The population shares {} differ from saved ones {}'.format(self.__populations,
+                                                                        data['populations'])
+        self.__statistics.set_state(data['statistics'])
+        for idx, ga in enumerate(self.__gas):
+            ga.restore('{}.{}'.format(fname, idx))
+
+    ## Return the statistics of the whole population in the old format. See
+    #  OpenCLGA.get_statistics.
+    def get_statistics(self):
+        result = self.__statistics.to_dict()
+        result['avg_time_per_gen'] = max([ga.get_statistics()['avg_time_per_gen']
+                                          for ga in self.__gas])
+        return result
+
+    def get_statistics_store(self):
+        return self.__statistics
+
+    def get_callback_metrics(self):
+        if self.__callback_dispatcher is None:
+            return None
+        return self.__callback_dispatcher.metrics
+
+    ## Return the profiled times of each device. See OpenCLGA.get_profile.
+    def get_profile(self):
+        return [ga.get_profile() for ga in self.__gas]
+
+    ## Return the best one of all devices. See OpenCLGA.get_the_best.
+    def get_the_best(self):
+        results = [ga.get_the_best() for ga in self.__gas]
+        pick = max if self.__opt_for_max == 'max' else min
+        return pick(results, key=lambda result: result[1])
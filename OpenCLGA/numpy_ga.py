@@ -0,0 +1,431 @@
+#!/usr/bin/python3
+import time
+import numpy
+import pickle
+import threading
+from .ocl_ga import StateMachine, EnterExit, GARun
+from .statistics import Statistics
+from .callback_dispatcher import CallbackDispatcher
+from .shuffler_chromosome import ShufflerChromosome
+from .simple_chromosome import SimpleChromosome
+from .utilities.generaltaskthread import TaskThread, Logger
+
+## Implementation of the flow of GA with NumPy on CPU.
+#  It takes the same options and has the same lifecycle as OpenCLGA, but needs
+#  no OpenCL device. Selection, crossover and mutation are done as vectorized
+#  NumPy operations over the whole population, and the results follow the
+#  kernels of SimpleChromosome and ShufflerChromosome. It could also be used as
+#  the baseline to measure the speedup of devices.
+#  The differences of options from OpenCLGA are:
+#  'fitness_func' : A python callable instead of the name of a kernel
+#                   function. It is called with a 2D numpy array of chromosomes
+#                   to be evaluated, one row of gene indices for a chromosome,
+#                   followed by the numpy array of each item of 'fitness_args'
+#                   ('placement' and 'host_ptr' are ignored), and returns the
+#                   fitnesses of these chromosomes.
+#  'fitness_kernel_str' is not needed. The options of devices and kernels are
+#  ignored. Elitism mode, islands, batch and improving only mutation change
+#  the algorithm and are not supported, so these options fail the assertions
+#  instead of running a different algorithm quietly.
+#  @var __chromosomes The 2D numpy array of gene indices of all chromosomes.
+#  @var __fitnesses The fitness of each chromosome.
+#  @var __fitness_args_values The numpy array of each item of fitness_args.
+#  @var __elements_size The number of elements of each gene.
+#  @var __random The numpy random generator, it is seeded by the 'seed' option
+#                for a reproducible run.
+#  @var __statistics The statistics of the whole population.
+class NumpyGA(Logger):
+    def __init__(self, options, action_callbacks = {}):
+        Logger.__init__(self)
+        if action_callbacks is not None:
+            for action, cb in action_callbacks.items():
+                assert callable(cb)
+        self.action_callbacks = action_callbacks
+        self.state_machine = StateMachine(self, 'waiting')
+        self.__init_members(options)
+
+    @property
+    def paused(self):
+        return self._paused
+
+    @property
+    def elapsed_time(self):
+        return self._elapsed_time
+
+    def __init_members(self, options):
+        assert options['sample_chromosome'].improving_func is None,\
+               'Improving only mutation is not supported by NumpyGA'
+        elitism_info = options.get('elitism_mode', {})
+        assert not all([elitism_info.get('top', 1), elitism_info.get('every', 0)]),\
+               'Elitism mode is not supported by NumpyGA'
+        assert options.get('islands', {}).get('count', 1) == 1,\
+               'Islands are not supported by NumpyGA'
+        assert options.get('batch', None) is None, 'Batch is not supported by NumpyGA'
+
+        self.thread = TaskThread(name='GARun')
+        self.thread.daemon = True
+        self.thread.start()
+
+        self.__sample_chromosome = options['sample_chromosome']
+        assert isinstance(self.__sample_chromosome, (SimpleChromosome, ShufflerChromosome))
+        self.__is_shuffler = isinstance(self.__sample_chromosome, ShufflerChromosome)
+        self.__termination = options['termination']
+        self.__population = options['population']
+        self.__opt_for_max = options.get('opt_for_max', 'max')
+        assert self.__opt_for_max in ['max', 'min']
+        self.__fitness_function = options['fitness_func']
+        assert callable(self.__fitness_function)
+        self.__fitness_args_values = [numpy.asarray(arg['v'],
+                                                    dtype=numpy.float32 if arg['t'] == 'float'
+                                                                        else numpy.int32)
+                                      for arg in options.get('fitness_args', None) or []]
+        self.__elements_size = numpy.array([gene.elements_length
+                                            for gene in self.__sample_chromosome.genes])
+        self.__gene_elements = numpy.array(self.__sample_chromosome.gene_elements_in_kernel)
+
+        self.__selection = options.get('selection', { 'type' : 'roulette' })
+        assert self.__selection['type'] in ['roulette', 'tournament', 'rank']
+        assert 1 <= self.__selection.get('size', 2) <= self.__population
+        assert 1 <= self.__selection.get('pressure', 1.5) <= 2
+        self.__extinction = options.get('extinction', None)
+
+        self.__saved_filename = options.get('saved_filename', None)
+        self.__prob_mutation = options.get('prob_mutation', 0)
+        self.__prob_crossover = options.get('prob_crossover', 0)
+        statistics_info = options.get('statistics', {})
+        self.__statistics = Statistics(statistics_info.get('capacity', None),
+                                       statistics_info.get('retention', 'ring'),
+                                       statistics_info.get('path', None))
+        self.__generation_callback = options.get('generation_callback', None)
+        queue_info = options.get('callback_queue', {})
+        self.__callback_dispatcher = None
+        if self.__generation_callback is not None and queue_info is not False:
+            self.__callback_dispatcher = CallbackDispatcher(self.__generation_callback,
+                                                            queue_info.get('size', 64),
+                                                            queue_info.get('policy', 'coalesce'))
+
+        self.__random = numpy.random.default_rng(options.get('seed', None))
+        self.__chromosomes = None
+        self.__fitnesses = None
+        self._elapsed_time = 0
+        self._populated = False
+        self._pausing_evt = threading.Event()
+        self._paused = False
+        self._forceStop = False
+        self.__generation_index = 0
+        self.__generation_time_diff = 0
+
+    def __is_better(self, a, b):
+        return a > b if self.__opt_for_max == 'max' else a < b
+
+    ## Generate chromosomes randomly like the populate kernels.
+    #  @param count The number of chromosomes.
+    def __populate(self, count):
+        num_of_genes = self.__sample_chromosome.num_of_genes
+        if self.__is_shuffler:
+            # A random permutation of elements for each chromosome.
+            order = numpy.argsort(self.__random.random((count, num_of_genes)), axis=1)
+            return self.__gene_elements[order]
+        return (self.__random.random((count, num_of_genes)) * self.__elements_size).astype(numpy.int32)
+
+    ## Calculate the fitnesses of the given chromosomes.
+    #  @param indices The indices of chromosomes, all of them if it is None.
+    def __calculate_fitness(self, indices = None):
+        if indices is None:
+            indices = numpy.arange(self.__population)
+        if len(indices) == 0:
+            return
+        fitnesses = self.__fitness_function(self.__chromosomes[indices],
+                                            *self.__fitness_args_values)
+        self.__fitnesses[indices] = numpy.asarray(fitnesses, dtype=numpy.float32)
+
+    ## Choose a parent for each chromosome with the selection method, see
+    #  utils_select_chromosome.
+    def __select(self):
+        fitnesses = self.__fitnesses
+        population = self.__population
+        selection_type = self.__selection['type']
+        if selection_type == 'tournament':
+            candidates = self.__random.integers(0, population,
+                                                (population, self.__selection.get('size', 2)))
+            values = fitnesses[candidates]
+            picks = values.argmax(axis=1) if self.__opt_for_max == 'max' else values.argmin(axis=1)
+            return candidates[numpy.arange(population), picks]
+        if selection_type == 'rank':
+            a = self.__random.integers(0, population, population)
+            b = self.__random.integers(0, population, population)
+            better = numpy.where(self.__is_better(fitnesses[b], fitnesses[a]), b, a)
+            worse = numpy.where(better == a, b, a)
+            pressure = self.__selection.get('pressure', 1.5)
+            return numpy.where(self.__random.random(population) < pressure / 2, better, worse)
+        # The probability is the square of the difference from the worst one.
+        worst = fitnesses.min() if self.__opt_for_max == 'max' else fitnesses.max()
+        ratio = numpy.cumsum((worst - fitnesses.astype(numpy.float64)) ** 2)
+        if ratio[-1] <= 0:
+            return self.__random.integers(0, population, population)
+        ratio /= ratio[-1]
+        picks = numpy.searchsorted(ratio, self.__random.random(population), side='right')
+        return numpy.minimum(picks, population - 1)
+
+    ## Do crossover for all chromosomes like the crossover kernels.
+    #  @return The mask of changed chromosomes.
+    def __crossover(self, prob_crossover):
+        population = self.__population
+        num_of_genes = self.__sample_chromosome.num_of_genes
+        fitnesses = self.__fitnesses
+        best = fitnesses.max() if self.__opt_for_max == 'max' else fitnesses.min()
+        worst = fitnesses.min() if self.__opt_for_max == 'max' else fitnesses.max()
+        others = self.__chromosomes[self.__select()]
+        # The best ones are kept, and all are kept if they are almost the same.
+        crossed = (numpy.abs(fitnesses - best) >= 0.000001) &\
+                  (self.__random.random(population) < prob_crossover)
+        if abs(best - worst) < 0.00001:
+            crossed[:] = False
+        positions = numpy.arange(num_of_genes)
+        if not self.__is_shuffler:
+            # Copy a range of genes from the other parent.
+            start = self.__random.integers(0, max(num_of_genes - 1, 1), population)
+            end = start + self.__random.integers(0, num_of_genes - start)
+            mask = (positions >= start[:, None]) & (positions < end[:, None]) & crossed[:, None]
+            self.__chromosomes = numpy.where(mask, others, self.__chromosomes)
+            return crossed & (end > start)
+
+        # Take the genes before the cross point from the other parent, and the
+        # rest genes in the order of this chromosome.
+        rows = numpy.arange(population)[:, None]
+        cross_point = self.__random.integers(1, max(num_of_genes, 2), population)
+        position_in_other = numpy.empty((population, len(self.__gene_elements)), dtype=numpy.int64)
+        position_in_other[rows, others] = positions
+        kept = position_in_other[rows, self.__chromosomes] >= cross_point[:, None]
+        # A stable sort moves the kept genes to the front without changing
+        # their order.
+        rest = numpy.take_along_axis(self.__chromosomes,
+                                     numpy.argsort(~kept, axis=1, kind='stable'), axis=1)
+        rest = numpy.take_along_axis(rest, numpy.maximum(positions - cross_point[:, None], 0),
+                                     axis=1)
+        children = numpy.where(positions < cross_point[:, None], others, rest)
+        self.__chromosomes = numpy.where(crossed[:, None], children, self.__chromosomes)
+        return crossed
+
+    ## Mutate all chromosomes like the mutation kernels.
+    #  @return The mask of changed chromosomes.
+    def __mutate(self, prob_mutate):
+        population = self.__population
+        num_of_genes = self.__sample_chromosome.num_of_genes
+        if self.__is_shuffler:
+            # Swap 2 genes of a chromosome.
+            mutated = self.__random.random(population) < prob_mutate
+            rows = numpy.nonzero(mutated)[0]
+            i = self.__random.integers(0, num_of_genes, len(rows))
+            j = (i + self.__random.integers(1, max(num_of_genes, 2), len(rows))) % num_of_genes
+            genes_i = self.__chromosomes[rows, i]
+            self.__chromosomes[rows, i] = self.__chromosomes[rows, j]
+            self.__chromosomes[rows, j] = genes_i
+            return mutated & (num_of_genes > 1)
+
+        # Each gene is replaced by another element with the probability.
+        mask = (self.__random.random((population, num_of_genes)) <= prob_mutate) &\
+               (self.__elements_size > 1)
+        offsets = self.__random.integers(1, numpy.maximum(self.__elements_size, 2),
+                                         (population, num_of_genes))
+        mutated_genes = (self.__chromosomes + offsets) % self.__elements_size
+        self.__chromosomes = numpy.where(mask, mutated_genes, self.__chromosomes)
+        return mask.any(axis=1)
+
+    def __is_extinction_matched(self, best, avg, worst):
+        if self.__extinction is None:
+            return False
+        if self.__extinction['type'] == 'best_worst':
+            return abs(best - worst) < self.__extinction['diff']
+        elif self.__extinction['type'] == 'best_avg':
+            return abs(best - avg) < self.__extinction['diff']
+        return False
+
+    ## Populate the first generation.
+    def _generate_population_if_needed(self, prob_mutate, prob_crossover):
+        if self._populated:
+            return
+        self._populated = True
+        self.__chromosomes = self.__populate(self.__population)
+        self.__calculate_fitness()
+
+    def __execute_single_generation(self, index, prob_mutate, prob_crossover):
+        last_result = self.__statistics.last()
+        if index > 0 and last_result is not None and\
+           self.__is_extinction_matched(last_result['best'],
+                                        last_result['avg'],
+                                        last_result['worst']):
+            # To add 1 for preventing 0 if the population size is too small.
+            size = min(int(self.__population * self.__extinction['ratio']) + 1,
+                       self.__population)
+            self.__chromosomes[:size] = self.__populate(size)
+            self.__calculate_fitness(numpy.arange(size))
+
+        dirty = self.__crossover(prob_crossover)
+        dirty |= self.__mutate(prob_mutate)
+        # Only the changed chromosomes are evaluated again.
+        self.__calculate_fitness(numpy.nonzero(dirty)[0])
+
+        fitnesses = self.__fitnesses
+        best = fitnesses.max() if self.__opt_for_max == 'max' else fitnesses.min()
+        worst = fitnesses.min() if self.__opt_for_max == 'max' else fitnesses.max()
+        avg = fitnesses.mean(dtype=numpy.float64)
+        self.__statistics.record(index, best, worst, avg, time.time())
+
+        if self.__generation_callback is None:
+            return
+        result = { 'best' : best, 'worst' : worst, 'avg' : avg, 'best_result' : None,
+                   'profile' : None }
+        if self.__callback_dispatcher is not None:
+            self.__callback_dispatcher.notify(index, result)
+        else:
+            self.__generation_callback(index, result)
+
+    @property
+    def __early_terminated(self):
+        last_result = self.__statistics.last()
+        return self.__sample_chromosome.early_terminated(last_result['best'],
+                                                         last_result['worst'])
+
+    def __evolve_by_count(self, count, prob_mutate, prob_crossover):
+        start_time = time.time()
+        i = self.__generation_index
+        while i < count:
+            self.__execute_single_generation(i, prob_mutate, prob_crossover)
+            i += 1
+            if self.__early_terminated:
+                break
+            if self._paused:
+                self.__generation_index = i
+                self.__generation_time_diff = time.time() - start_time
+                break
+            if self._forceStop:
+                break
+
+    def __evolve_by_time(self, max_time, prob_mutate, prob_crossover):
+        start_time = time.time()
+        while True:
+            self.__execute_single_generation(self.__generation_index, prob_mutate, prob_crossover)
+            elapsed_time = time.time() - start_time + self.__generation_time_diff
+            self.__generation_index += 1
+            if self.__early_terminated or elapsed_time > max_time:
+                break
+            if self._paused:
+                self.__generation_time_diff = time.time() - start_time
+                break
+            if self._forceStop:
+                break
+
+    def _start_evolution(self, prob_mutate, prob_crossover):
+        generation_start = time.time()
+        if self.__termination['type'] == 'time':
+            self.__evolve_by_time(self.__termination['time'], prob_mutate, prob_crossover)
+        elif self.__termination['type'] == 'count':
+            self.__evolve_by_count(self.__termination['count'], prob_mutate, prob_crossover)
+
+        if self._paused:
+            return
+
+        total_time_consumption = time.time() - generation_start + self.__generation_time_diff
+        avg_time_per_gen = total_time_consumption / float(max(self.__statistics.total, 1))
+        self.__statistics.avg_time_per_gen = avg_time_per_gen
+
+    # public methods
+    @EnterExit()
+    def prepare(self):
+        self.__fitnesses = numpy.zeros(self.__population, dtype=numpy.float32)
+
+    def __end_of_run(self):
+        if self._paused:
+            self._pausing_evt.set()
+        else:
+            t = threading.Thread(target=self.stop)
+            t.daemon = True
+            t.start()
+
+    @EnterExit()
+    def run(self, arg_prob_mutate = 0, arg_prob_crossover = 0):
+        prob_mutate = arg_prob_mutate if arg_prob_mutate else self.__prob_mutation
+        prob_crossover = arg_prob_crossover if arg_prob_crossover else self.__prob_crossover
+        assert 0 < prob_mutate < 1, 'Make sure you have set it in options or passed when calling run.'
+        assert 0 < prob_crossover < 1, 'Make sure you have set it in options or passed when calling run.'
+        assert self.thread != None
+
+        self._forceStop = False
+        self._paused = False
+        task = GARun(self, prob_mutate, prob_crossover, self.__end_of_run)
+        self.thread.addtask(task)
+
+    @EnterExit()
+    def stop(self):
+        self._forceStop = True
+        if self.thread:
+            self.thread.stop()
+        self.thread = None
+        if self.__callback_dispatcher is not None:
+            self.__callback_dispatcher.stop()
+
+    @EnterExit()
+    def pause(self):
+        self._paused = True
+        self._pausing_evt.wait()
+        self._pausing_evt.clear()
+
+    @EnterExit()
+    def save(self, filename = None):
+        assert self._paused, 'save is only availabled while paused'
+        data = { 'generation_idx' : self.__generation_index,
+                 'statistics' : self.__statistics.get_state(),
+                 'generation_time_diff' : self.__generation_time_diff,
+                 'population' : self.__population,
+                 'prob_mutation' : self.__prob_mutation,
+                 'prob_crossover' : self.__prob_crossover,
+                 'fitnesses' : self.__fitnesses,
+                 'chromosomes' : self.__chromosomes.reshape(-1),
+                 'random_state' : self.__random.bit_generator.state }
+        fname = self.__saved_filename if self.__saved_filename else filename
+        with open(fname, 'wb') as f:
+            pickle.dump(data, f)
+
+    @EnterExit()
+    def restore(self, filename = None):
+        fname = self.__saved_filename if self.__saved_filename else filename
+        with open(fname, 'rb') as f:
+            data = pickle.load(f)
+        self.__prob_mutation = data['prob_mutation']
+        self.__prob_crossover = data['prob_crossover']
+        self.__generation_index = data['generation_idx']
+        self.__statistics.set_state(data['statistics'])
+        self.__generation_time_diff = data['generation_time_diff']
+        self.__population = data['population']
+        self.__fitnesses = numpy.asarray(data['fitnesses'], dtype=numpy.float32)
+        self.__chromosomes = numpy.asarray(data['chromosomes']).reshape(self.__population, -1)
+        if 'random_state' in data:
+            self.__random.bit_generator.state = data['random_state']
+        self._populated = True
+        self._paused = True
+
+    ## Return the statistics in the old format, see OpenCLGA.get_statistics.
+    def get_statistics(self):
+        return self.__statistics.to_dict()
+
+    def get_statistics_store(self):
+        return self.__statistics
+
+    ## There are no OpenCL commands to be profiled.
+    def get_profile(self):
+        return None
+
+    def get_callback_metrics(self):
+        if self.__callback_dispatcher is None:
+            return None
+        return self.__callback_dispatcher.metrics
+
+    ## Return the best chromosome, its fitness and the value from chromosome.
+    def get_the_best(self):
+        if self.__opt_for_max == 'max':
+            best_index = int(numpy.argmax(self.__fitnesses))
+        else:
+            best_index = int(numpy.argmin(self.__fitnesses))
+        best = self.__chromosomes[best_index].tolist()
+        return best, self.__fitnesses[best_index], self.__sample_chromosome.from_kernel_value(best)
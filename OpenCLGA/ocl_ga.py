@@ -1,14 +1,19 @@
 #!/usr/bin/python3
 import os
 import sys
-import zlib
 import time
-import random
 import numpy
 import pickle
 import pyopencl as cl
 import threading
 from . import utils
+from .program_cache import ProgramCache
+from .autotuner import Autotuner
+from .statistics import Statistics
+from .callback_dispatcher import CallbackDispatcher
+from .elite_frame import encode_elites, DEFAULT_COMPRESS_THRESHOLD
+from .checkpoint import Checkpointer, load_checkpoint
+from .profiler import Profiler
 from .utilities.generaltaskthread import TaskThread, Task, Logger
 
 ## A decorator class to notify state change before/after the action.
@@ -120,18 +125,39 @@ class OpenCLGA():
     @property
     def __args_codes(self):
         opt_for_max = 0 if self.__opt_for_max == 'min' else 1
-        return '#define OPTIMIZATION_FOR_MAX ' + str(opt_for_max) + '\n'
+        return '#define OPTIMIZATION_FOR_MAX ' + str(opt_for_max) + '\n' +\
+               '#define SELECTION_TYPE SELECTION_' + self.__selection['type'].upper() + '\n' +\
+               '#define SELECTION_TOURNAMENT_SIZE ' + str(self.__selection.get('size', 2)) + '\n' +\
+               '#define SELECTION_RANK_PRESSURE ' + str(float(self.__selection.get('pressure', 1.5))) + 'f\n'
 
     @property
     def __populate_codes(self):
         return '#define POPULATION_SIZE ' + str(self.__population) + '\n' +\
-               '#define CHROMOSOME_TYPE ' +  self.__sample_chromosome.struct_name + '\n'
+               '#define CHROMOSOME_TYPE ' +  self.__sample_chromosome.struct_name + '\n' +\
+               '#define STATISTICS_TOP_SIZE ' + str(len(self.__best_fitnesses)) + '\n' +\
+               '#define CHROMOSOME_INTERLEAVED ' + str(1 if self.__interleaved else 0) + '\n' +\
+               '#define ISLAND_COUNT ' + str(self.__island_count) + '\n' +\
+               '#define ISLAND_TOPOLOGY ISLAND_TOPOLOGY_' + self.__island_topology.upper() + '\n' +\
+               '#define ISLAND_NEIGHBORS ' + str(self.__island_neighbors) + '\n' +\
+               '#define ISLAND_MIGRANTS ' + str(self.__island_migrants) + '\n' +\
+               '#define ISLAND_TORUS_COLUMNS ' + str(self.__island_torus_columns) + '\n' +\
+               self.__batch_codes
+
+    @property
+    def __batch_codes(self):
+        if self.__batch is None:
+            return '#define ISLAND_INDEPENDENT 0\n'
+        to_list = lambda key: '{' + ', '.join([str(float(run[key])) + 'f' for run in self.__batch]) + '}'
+        return '#define ISLAND_INDEPENDENT 1\n' +\
+               '#define ISLAND_PROB_MUTATION_LIST ' + to_list('prob_mutation') + '\n' +\
+               '#define ISLAND_PROB_CROSSOVER_LIST ' + to_list('prob_crossover') + '\n'
 
     @property
     def __evaluate_code(self):
         chromosome = self.__sample_chromosome
         if self.__fitness_args is not None:
-            fit_args = ', '.join(['global ' + v['t'] + '* _f_' + v['n'] for v in self.__fitness_args])
+            fit_args = ', '.join([self.__fitness_arg_qualifier(v) + v['t'] + '* _f_' + v['n']
+                                  for v in self.__fitness_args])
             fit_argv = ', '.join(['_f_' + v['n'] for v in self.__fitness_args])
             if len(fit_args) > 0:
                 fit_args = ', ' + fit_args
@@ -143,7 +169,8 @@ class OpenCLGA():
         return '#define CHROMOSOME_SIZE ' + chromosome.chromosome_size_define + '\n' +\
                '#define CALCULATE_FITNESS ' + self.__fitness_function + '\n' +\
                '#define FITNESS_ARGS ' + fit_args + '\n'+\
-               '#define FITNESS_ARGV ' + fit_argv + '\n'
+               '#define FITNESS_ARGV ' + fit_argv + '\n' +\
+               '#define FITNESS_DIRTY_ONLY ' + str(1 if self.__fitness_dirty_only else 0) + '\n'
 
     @property
     def __include_code(self):
@@ -153,10 +180,11 @@ class OpenCLGA():
                '#include "' + self.__sample_chromosome.kernel_file + '"\n\n'
 
     ## private methods
-    #  @var __dictStatistics A dictionary. e.g. { gen : { 'best':  best_fitness,
-    #                                                     'worst': worst_fitness,
-    #                                                     'avg':   avg_fitness },
-    #                                            'avg_time_per_gen': avg. elapsed time per generation }
+    #  @var __statistics The columnar store of best, worst, avg fitness and
+    #                     the timestamp of each generation. The 'statistics'
+    #                     option is a dictionary with 'capacity', 'retention'
+    #                     ('ring' or 'downsample') and 'path' to spill the
+    #                     columns to memory-mapped files. See Statistics.
     #  @var thread The thread runs the actual algorithm.
     #  @var __population The number of population
     #  @var __termination A dictionary to identify the termination condition.
@@ -176,13 +204,110 @@ class OpenCLGA():
     #                      that newly sorted elites are coming
     # @var __elitism_interval The interval to get current elites since last time.
     # @var __elitism_last_retrieval The timestamp of last time when retrieving elites.
+    # @var __elitism_compressed The zlib level to compress elite frames. True
+    #                           means 9, False or 0 means no compression.
+    # @var __elitism_compress_threshold Elite frames smaller than this size in
+    #                                   bytes are not compressed.
     # @var __elites_updated Indicating that newly sorted elites are received.
-    #                       These elites are going to be updated into dev memory.
+    #                       These elites are going to be updated into dev memory
+    #                       by the GA thread at the next batch.
     # @var __best_fitnesses The list of top N best fitnesses
-    # @var __worst_fitnesses The list of bottom N worst fitnesses
-    # @var __best_indices The list of indices of top N best fitnesses
-    # @var __worst_indices The list of indices of bottom N worst fitnesses
+    # @var __worst_fitnesses The list of bottom N worst fitnesses, the worst one
+    #                        is the first.
     # @var __avg The average of all fitnesses
+    # @var __statistics_wg_size The work group size for calculating statistics.
+    #                           The indices of top N & bottom N fitnesses are
+    #                           kept in device memory only.
+    # @var __generations_per_sync The number of generations to be run on device
+    #                             without going back to host. The statistics
+    #                             of these generations are read back at once.
+    #                             Extinction, termination, elites and callbacks
+    #                             are evaluated for each batch.
+    # @var __generation_statistics The best, worst and avg fitness of each
+    #                              generation in current batch.
+    # @var __selection A dictionary to identify the selection method for
+    #                  crossover.
+    #                  If type is 'roulette', a chromosome is chosen with the
+    #                  probability based on its fitness. It is the default one.
+    #                  If type is 'tournament', the best one of 'size'(default: 2)
+    #                  randomly chosen chromosomes is chosen.
+    #                  If type is 'rank', a chromosome is chosen with the
+    #                  probability linear to its rank. 'pressure'(default: 1.5,
+    #                  between 1 and 2) is the expected times of the best one is
+    #                  chosen.
+    # @var __interleaved The layout of chromosomes in device memory. If it is
+    #                    False(default), genes of a chromosome are contiguous.
+    #                    If it is True, gene i of all chromosomes are contiguous
+    #                    which makes the memory access of neighbouring work items
+    #                    coalesced. Kernels should access genes through the
+    #                    CHROMOSOME_AT and CHROMOSOME_GENE macros.
+    # @var __fitness_dirty_only If it is True(default), only the chromosomes
+    #                           changed by populating, crossover or mutation
+    #                           are evaluated again. They are marked dirty by
+    #                           kernels and compacted into a dense list before
+    #                           the fitness calculation. Set it to False if the
+    #                           fitness function doesn't give the same value
+    #                           for the same chromosome.
+    # @var __fitness_args The extra arguments of the fitness function. Each of
+    #                      them is a dictionary with 't' of the type, 'n' of the
+    #                      name and 'v' of the value which could be a list, a
+    #                      numpy array or a memoryview. Optionally, 'placement'
+    #                      is 'global'(default), 'read_only' (global const) or
+    #                      'constant' memory, and the fitness function should
+    #                      declare the same qualifier. 'host_ptr' is
+    #                      'copy'(default), 'use' or 'alloc' to create the
+    #                      buffer with USE_HOST_PTR or ALLOC_HOST_PTR at CPU
+    #                      devices, it is ignored by other devices.
+    # @var __fitness_args_values The contiguous numpy arrays of fitness
+    #                            arguments. They are kept because buffers with
+    #                            USE_HOST_PTR are backed by them.
+    # @var __seed The 'seed' option of a reproducible run. If it is given,
+    #             the same options give the same evolution. Otherwise, the seed
+    #             of kernels is taken from os.urandom.
+    # @var __rand_seed The 64 bits seed of the counter-based random number
+    #                  generator of kernels. Random numbers are derived from it,
+    #                  the generation, the work item and the kernel, so there
+    #                  is no per chromosome seed kept at device. Populating,
+    #                  extinction, crossover and mutation all draw from it. It
+    #                  is saved and restored, so a restored run continues the
+    #                  same stream even if 'seed' is different.
+    # @var __island_count The number of islands. The population is split into
+    #                     islands of the same size which are evolved
+    #                     separately, parents for crossover are chosen in the
+    #                     same island. The 'islands' option is a dictionary
+    #                     with 'count'(default: 1 for no islands), 'interval'
+    #                     (default: 10) generations between migrations,
+    #                     'migrants'(default: 1) which is the number of
+    #                     chromosomes sent to each neighbor, and 'topology'.
+    # @var __island_topology The neighbors of an island. If it is 'ring'
+    #                        (default), island i sends migrants to island i+1.
+    #                        If it is 'torus', islands are placed in a grid and
+    #                        send migrants to 4 adjacent islands. If it is
+    #                        'full', islands send migrants to all others.
+    #                        The best ones of an island replace the worst ones
+    #                        of its neighbors at device.
+    # @var __batch A list of independent runs which are evolved together in
+    #              one set of device memory. Each run is a dictionary with
+    #              'prob_mutation' and 'prob_crossover'. The runs are packed as
+    #              independent islands without migrations, so 'population'
+    #              is the one of a run. It is None without the 'batch' option.
+    # @var __run_statistics The statistics store of each run in batch.
+    # @var __callback_dispatcher It delivers the generation results to
+    #                           generation_callback on its own thread through a
+    #                           bounded queue, so that the evolution never waits
+    #                           for callbacks. The 'callback_queue' option is a
+    #                           dictionary with 'size'(default: 64) and
+    #                           'policy'('drop_new', 'drop_old' or 'coalesce'
+    #                           (default)). It is None if there's no callback or
+    #                           the option is False, then the callback is called
+    #                           synchronously.
+    # @var __checkpointer It takes snapshots periodically while running
+    #                     without stalling the evolution. The 'checkpoint'
+    #                     option is a dictionary with 'path' of the folder,
+    #                     'interval'(default: 300 sec.) and 'keep'(default: 2)
+    #                     snapshots. A snapshot folder could be restored by
+    #                     restore. It is None without the option.
+    # @var __evolution_start_time The timestamp when current run is started.
     # @var __extinction A dictionary to identify if a extinction is needed.
     #                   If type is 'best_worst', an exticntion will be triggered
     #                   when the difference between best fitness and worst fitness is
@@ -190,6 +315,25 @@ class OpenCLGA():
     #                   If type is 'best_avg', the operation will be triggered
     #                   when the difference between best fitness and avg fitness
     #                   is smaller than expected value.
+    # @var __program_cache The on-disk cache of built program binaries. It is
+    #                      None unless the 'program_cache' option is True or a
+    #                      dictionary with 'path' of the folder and
+    #                      'max_size'(bytes) of the size limit.
+    # @var __autotuner It benchmarks the kernels which are run over the
+    #                  population with candidate local sizes and keeps the
+    #                  winners in a profile for later runs. It is None unless the
+    #                  'autotune' option is True or a dictionary with 'path' of
+    #                  the profile and 'repeat' of benchmarking.
+    # @var __program_key The hash of the final source and build options of the
+    #                    program, which is a part of the keys of autotuner.
+    # @var __profiler It records the queued, submit, start and end time of
+    #                 kernels and transfers by phases, see get_profile. It is
+    #                 None unless the 'profiling' option is True, because the
+    #                 queue is created with PROFILING_ENABLE only for it.
+    # @var __kernels A dictionary of kernel name to the cl.Kernel of the built
+    #                program. Kernels are created once and reused by launches.
+    # @var __work_group_sizes A dictionary of kernel name to local size for the
+    #                         kernels launched by OpenCLGA itself.
     # @var _pausing_evt Wait when entering pausing state, it will be set right after
     #                   that particular iteration ends.
     def __init_members(self, options):
@@ -200,11 +344,24 @@ class OpenCLGA():
         self.__sample_chromosome = options['sample_chromosome']
         self.__termination = options['termination']
         self.__population = options['population']
+        self.__batch = options.get('batch', None)
+        if self.__batch is not None:
+            assert len(self.__batch) > 0
+            for run in self.__batch:
+                assert 0 < run['prob_mutation'] < 1 and 0 < run['prob_crossover'] < 1
+            self.__population *= len(self.__batch)
         self.__opt_for_max = options.get('opt_for_max', 'max')
         self.__np_chromosomes = None
+        self.__interleaved = options.get('interleaved', False)
         self.__fitness_function = options['fitness_func']
         self.__fitness_kernel_str = options['fitness_kernel_str']
         self.__fitness_args = options.get('fitness_args', None)
+        for arg in self.__fitness_args or []:
+            assert arg.get('placement', 'global') in ['global', 'read_only', 'constant']
+            assert arg.get('host_ptr', 'copy') in ['copy', 'use', 'alloc']
+        self.__fitness_args_values = None
+        self.__fitness_dirty_only = options.get('fitness_dirty_only', True)
+        self.__seed = options.get('seed', None)
 
         # For elitism_mode
         elitism_info = options.get('elitism_mode', {})
@@ -214,21 +371,39 @@ class OpenCLGA():
         self.__elites_updated = False
         self.__elitism_interval = elitism_info.get('interval', 0)
         self.__elitism_last_retrieval = time.time()
-        self.__elitism_compressed = elitism_info.get('compress', False)
+        compress = elitism_info.get('compress', False)
+        self.__elitism_compressed = 9 if compress is True else int(compress)
+        self.__elitism_compress_threshold = elitism_info.get('compress_threshold',
+                                                             DEFAULT_COMPRESS_THRESHOLD)
         self.__elite_lock = threading.Lock()
 
         # List of fitness and index.
         size_of_indices = self.__elitism_top if self.__is_elitism_mode else 1
+        assert size_of_indices <= self.__population
         self.__best_fitnesses = numpy.zeros(size_of_indices, dtype=numpy.float32)
         self.__worst_fitnesses = numpy.zeros(size_of_indices, dtype=numpy.float32)
-        self.__best_indices = numpy.zeros(size_of_indices, dtype=numpy.int32)
-        self.__worst_indices = numpy.zeros(size_of_indices, dtype=numpy.int32)
-        self.__avg = 0
+        self.__avg = numpy.zeros(1, dtype=numpy.float32)
+        self.__statistics_wg_size = 1
+        self.__generations_per_sync = options.get('generations_per_sync', 1)
+        assert self.__generations_per_sync > 0
+        # best, worst and avg fitness of each generation in a batch.
+        self.__generation_statistics = numpy.zeros(self.__generations_per_sync * 3,
+                                                   dtype=numpy.float32)
 
         self.__saved_filename = options.get('saved_filename', None)
         self.__prob_mutation = options.get('prob_mutation', 0)
         self.__prob_crossover = options.get('prob_crossover', 0)
-        self.__dictStatistics = {}
+        statistics_info = options.get('statistics', {})
+        self.__statistics = Statistics(statistics_info.get('capacity', None),
+                                       statistics_info.get('retention', 'ring'),
+                                       statistics_info.get('path', None))
+        self.__run_statistics = []
+        for run_idx in range(len(self.__batch) if self.__batch else 0):
+            path = statistics_info.get('path', None)
+            self.__run_statistics.append(Statistics(statistics_info.get('capacity', None),
+                                                    statistics_info.get('retention', 'ring'),
+                                                    os.path.join(path, 'run-{}'.format(run_idx))\
+                                                        if path else None))
 
         # Generally in GA, it depends on the problem to treat the maximal fitness
         # value as the best or to treat the minimal fitness value as the best.
@@ -241,12 +416,66 @@ class OpenCLGA():
         self.__generation_index = 0
         self.__generation_time_diff = 0
         self.__debug_mode = 'debug' in options
+        autotune_info = options.get('autotune', False)
+        autotune_info = {} if autotune_info is True else autotune_info
+        self.__autotuner = None if autotune_info is False else\
+                               Autotuner(autotune_info.get('path', None),
+                                         autotune_info.get('repeat', 3))
+        self.__profiler = Profiler() if options.get('profiling', False) else None
+        self.__work_group_sizes = {}
+        cache_info = options.get('program_cache', False)
+        cache_info = {} if cache_info is True else cache_info
+        self.__program_cache = None if cache_info is False else\
+                                   ProgramCache(cache_info.get('path', None),
+                                                cache_info.get('max_size', None))
         self.__generation_callback = options['generation_callback']\
                                         if 'generation_callback' in options else None
+        queue_info = options.get('callback_queue', {})
+        self.__callback_dispatcher = None
+        if self.__generation_callback is not None and queue_info is not False:
+            self.__callback_dispatcher = CallbackDispatcher(self.__generation_callback,
+                                                            queue_info.get('size', 64),
+                                                            queue_info.get('policy', 'coalesce'),
+                                                            self.__merge_generation_results)
+
+        checkpoint_info = options.get('checkpoint', None)
+        self.__checkpointer = None if checkpoint_info is None else\
+                                  Checkpointer(checkpoint_info['path'],
+                                               checkpoint_info.get('interval', 300),
+                                               checkpoint_info.get('keep', 2))
+        self.__evolution_start_time = time.time()
 
         self.__extinction = options['extinction']\
                                 if 'extinction' in options else None
 
+        island_info = options.get('islands', {})
+        if self.__batch is not None:
+            assert 'islands' not in options and not self.__is_elitism_mode,\
+                   'Islands and elitism mode are not supported in batch'
+            island_info = { 'count' : len(self.__batch) }
+        self.__island_count = island_info.get('count', 1)
+        self.__island_interval = island_info.get('interval', 10)
+        self.__island_migrants = island_info.get('migrants', 1)
+        self.__island_topology = island_info.get('topology', 'ring')
+        assert self.__island_count > 0 and self.__population % self.__island_count == 0,\
+               'The population should be divisible by the number of islands'
+        assert self.__island_interval > 0 and self.__island_migrants > 0
+        assert self.__island_topology in ['ring', 'torus', 'full']
+        self.__island_neighbors = { 'ring' : 1,
+                                    'torus' : 4,
+                                    'full' : max(self.__island_count - 1, 1) }[self.__island_topology]
+        # The grid of torus is as square as possible.
+        self.__island_torus_columns = max([c for c in range(1, int(self.__island_count ** 0.5) + 1)
+                                           if self.__island_count % c == 0])
+        assert self.__island_migrants * (self.__island_neighbors + 1) <=\
+               self.__population // self.__island_count,\
+               'Islands are too small for {} migrants'.format(self.__island_migrants)
+
+        self.__selection = options.get('selection', { 'type' : 'roulette' })
+        assert self.__selection['type'] in ['roulette', 'tournament', 'rank']
+        assert 1 <= self.__selection.get('size', 2) <= self.__population
+        assert 1 <= self.__selection.get('pressure', 1.5) <= 2
+
     def __init_cl(self, cl_context, extra_include_path):
         # create OpenCL context, queue, and memory
         # NOTE: Please set PYOPENCL_CTX=N (N is the device number you want to use)
@@ -254,8 +483,10 @@ class OpenCLGA():
         #       will be thrown, since it's not in interactive mode.
         # TODO: Select a reliable device during runtime by default.
         self.__ctx = cl_context if cl_context is not None else cl.create_some_context()
-        self.__queue = cl.CommandQueue(self.__ctx)
+        properties = cl.command_queue_properties.PROFILING_ENABLE if self.__profiler else 0
+        self.__queue = cl.CommandQueue(self.__ctx, properties=properties)
         self.__include_path = []
+        self.__include_dirs = []
         kernel_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kernel')
         paths = extra_include_path + [kernel_path]
         for path in paths:
@@ -265,6 +496,7 @@ class OpenCLGA():
             # '-I' and folder path should be sepearetd. And ' should not included in string path.
             self.__include_path.append('-I')
             self.__include_path.append(os.path.join(os.getcwd(), escapedPath))
+            self.__include_dirs.append(os.path.join(os.getcwd(), path))
 
     def __create_program(self):
         codes = self.__args_codes + '\n' +\
@@ -281,7 +513,29 @@ class OpenCLGA():
             fdbg.write(codes + fstr)
             fdbg.close()
 
-        self.__prg = cl.Program(self.__ctx, codes + fstr).build(self.__include_path);
+        # Tuned local sizes are only valid for the same program.
+        self.__program_key = None if self.__autotuner is None else\
+                                 ProgramCache.calculate_key(self.__ctx, codes + fstr,
+                                                            self.__include_path,
+                                                            self.__include_dirs)
+        if self.__program_cache is None:
+            self.__prg = cl.Program(self.__ctx, codes + fstr).build(self.__include_path);
+        else:
+            self.__prg = self.__program_cache.build(self.__ctx, codes + fstr,
+                                                    self.__include_path,
+                                                    self.__include_dirs)
+        self.__kernels = utils.create_kernels(self.__prg)
+
+    ## Find the largest power of 2 work group size for calculating statistics.
+    #  It is limited by the device, the kernel, and the local memory which is
+    #  used to store the ranked lists of each work item.
+    def __calc_statistics_wg_size(self):
+        # 2 lists of (float, int) pairs and 1 float sum for each work item.
+        local_mem_per_item = len(self.__best_fitnesses) * 16 + 4
+        self.__statistics_wg_size = utils.calculate_power_of_2_work_group_size(self.__prg,
+                                                                               self.__ctx.devices[0],
+                                                                               'ocl_ga_calculate_statistics',
+                                                                               local_mem_per_item)
 
     def __type_to_numpy_type(self, t):
         if t == 'float':
@@ -315,64 +569,227 @@ class OpenCLGA():
 
         return False
 
-    def __prepare_fitness_args(self):
+    def __fitness_ndrange(self):
+        local_size = self.__work_group_sizes.get('ocl_ga_calculate_fitness', 1)
+        global_size = (self.__population + local_size - 1) // local_size * local_size
+        return (global_size,), (local_size,)
+
+    ## Return the address space qualifier of a fitness argument in kernels.
+    def __fitness_arg_qualifier(self, arg):
+        placement = arg.get('placement', 'global')
+        if placement == 'constant':
+            return 'constant '
+        elif placement == 'read_only':
+            return 'global const '
+        return 'global '
+
+    ## Return the memory flags of the buffer of a fitness argument.
+    def __fitness_arg_flags(self, arg):
         mf = cl.mem_flags
-        self.__fitness_args_list = [self.__dev_chromosomes, self.__dev_fitnesses]
+        flags = mf.READ_WRITE if arg.get('placement', 'global') == 'global' else mf.READ_ONLY
+        host_ptr = arg.get('host_ptr', 'copy')
+        # Host pointers are only hints for CPU devices which share the host
+        # memory. Other devices get a copy as usual.
+        if host_ptr == 'copy' or not all(device.type & cl.device_type.CPU
+                                         for device in self.__ctx.devices):
+            return flags | mf.COPY_HOST_PTR
+        elif host_ptr == 'use':
+            return flags | mf.USE_HOST_PTR
+        return flags | mf.ALLOC_HOST_PTR | mf.COPY_HOST_PTR
+
+    ## Return the value of a fitness argument as a contiguous numpy array.
+    #  Numpy arrays and memoryviews of the same type are used without a copy.
+    #  A writable array is required for USE_HOST_PTR.
+    def __fitness_arg_values(self, arg):
+        values = numpy.asarray(arg['v'], dtype=self.__type_to_numpy_type(arg['t']))
+        requirements = ['C', 'W'] if arg.get('host_ptr', 'copy') == 'use' else ['C']
+        return numpy.require(values, requirements=requirements)
+
+    def __prepare_fitness_args(self):
+        self.__fitness_args_list = [self.__dev_chromosomes,
+                                    self.__dev_fitnesses,
+                                    self.__dev_dirty,
+                                    self.__dev_dirty_indices,
+                                    self.__dev_dirty_count]
 
         self.__extra_fitness_args_list = []
 
         if self.__fitness_args is not None:
+            if self.__fitness_args_values is None:
+                self.__fitness_args_values = [self.__fitness_arg_values(arg)
+                                              for arg in self.__fitness_args]
+            constant_sizes = [values.nbytes for arg, values in zip(self.__fitness_args,
+                                                                   self.__fitness_args_values)
+                              if arg.get('placement', 'global') == 'constant']
+            for device in self.__ctx.devices:
+                assert len(constant_sizes) <= device.max_constant_args,\
+                       'too many constant fitness arguments for ' + device.name
+                assert sum(constant_sizes) <= device.max_constant_buffer_size,\
+                       'constant fitness arguments exceed the constant memory of ' + device.name
             ## create buffers for fitness arguments
-            for arg in self.__fitness_args:
-                cl_buffer = cl.Buffer(self.__ctx,
-                                mf.READ_WRITE | mf.COPY_HOST_PTR,
-                                hostbuf=numpy.array(arg['v'],
-                                dtype=self.__type_to_numpy_type(arg['t'])))
+            for arg, values in zip(self.__fitness_args, self.__fitness_args_values):
+                cl_buffer = cl.Buffer(self.__ctx, self.__fitness_arg_flags(arg), hostbuf=values)
                 self.__extra_fitness_args_list.append(cl_buffer)
         # concatenate two fitness args list
         self.__fitness_args_list = self.__fitness_args_list + self.__extra_fitness_args_list
 
+    ## Prepare device memory for the dirty flags of chromosomes and the list
+    #  of dirty ones.
+    #  @param dirty The initial value of dirty flags.
+    def __prepare_dirty_buffers(self, dirty):
+        mf = cl.mem_flags
+        self.__dev_dirty = cl.Buffer(self.__ctx, mf.READ_WRITE | mf.COPY_HOST_PTR,
+                                     hostbuf=numpy.full(self.__population, dirty,
+                                                        dtype=numpy.uint8))
+        self.__dev_dirty_indices = cl.Buffer(self.__ctx, mf.READ_WRITE, self.__population * 4)
+        self.__dev_dirty_count = cl.Buffer(self.__ctx, mf.READ_WRITE, 4)
+        self.__compact_dirty_wg_size = utils.calculate_power_of_2_work_group_size(self.__prg,
+                                                                                  self.__ctx.devices[0],
+                                                                                  'ocl_ga_compact_dirty',
+                                                                                  0)
+
+    ## Record the events of a phase if profiling is enabled.
+    #  @return The given list of events.
+    def __profile(self, phase, evts):
+        if self.__profiler is not None:
+            self.__profiler.record(phase, evts)
+        return evts
+
+    ## Read the fitnesses and chromosomes back to system memory and wait.
+    def __read_population(self):
+        evts = [cl.enqueue_copy(self.__queue, self.__fitnesses, self.__dev_fitnesses,
+                                is_blocking=False),
+                cl.enqueue_copy(self.__queue, self.__np_chromosomes, self.__dev_chromosomes,
+                                is_blocking=False)]
+        cl.wait_for_events(self.__profile('read_population', evts))
+        if self.__profiler is not None:
+            self.__profiler.collect()
+
+    ## Calculate the fitnesses of dirty chromosomes, or all of them if
+    #  fitness_dirty_only is False.
+    #  @param evaluate_all Mark all chromosomes dirty before calculating.
+    #  @param wait_for The list of events to wait before calculating.
+    #  @return The list of events of enqueued kernels.
+    def __calculate_fitness(self, evaluate_all = False, wait_for=None):
+        evts = wait_for
+        if evaluate_all:
+            evts = self.__profile('compact_dirty',
+                                  [cl.enqueue_fill_buffer(self.__queue, self.__dev_dirty,
+                                                          numpy.uint8(1), 0, self.__population,
+                                                          wait_for=evts)])
+        if self.__fitness_dirty_only:
+            evts = self.__profile('compact_dirty',
+                                  [cl.enqueue_fill_buffer(self.__queue, self.__dev_dirty_count,
+                                                          numpy.int32(0), 0, 4, wait_for=evts)])
+            wg_size = self.__compact_dirty_wg_size
+            global_size = (self.__population + wg_size - 1) // wg_size * wg_size
+            evts = self.__profile('compact_dirty',
+                                  [self.__kernels['ocl_ga_compact_dirty'](self.__queue,
+                                                                          (global_size,),
+                                                                          (wg_size,),
+                                                                          self.__dev_dirty,
+                                                                          self.__dev_dirty_indices,
+                                                                          self.__dev_dirty_count,
+                                                                          wait_for=evts)])
+        return self.__profile('fitness',
+                              [self.__kernels['ocl_ga_calculate_fitness'](self.__queue,
+                                                                          *self.__fitness_ndrange(),
+                                                                          *self.__fitness_args_list,
+                                                                          wait_for=evts)])
+
+    ## Prepare system and device memory to exchange elites in elitism mode.
+    def __prepare_elitism_buffers(self):
+        if not self.__is_elitism_mode:
+            return
+        mf = cl.mem_flags
+        self.__elites_updated = False
+        self.__current_elites = numpy.zeros(self.__sample_chromosome.dna_total_length * self.__elitism_top,
+                                            dtype=self.__sample_chromosome.gene_dtype)
+        self.__dev_current_elites = cl.Buffer(self.__ctx, mf.READ_WRITE | mf.COPY_HOST_PTR,
+                                              hostbuf=self.__current_elites)
+        self.__updated_elites = numpy.zeros(self.__sample_chromosome.dna_total_length * self.__elitism_top,
+                                            dtype=self.__sample_chromosome.gene_dtype)
+        self.__dev_updated_elites = cl.Buffer(self.__ctx, mf.READ_WRITE | mf.COPY_HOST_PTR,
+                                              hostbuf=self.__updated_elites)
+        self.__updated_elite_fitnesses = numpy.zeros(self.__elitism_top,
+                                                    dtype=numpy.float32)
+        self.__dev_updated_elite_fitnesses = cl.Buffer(self.__ctx, mf.READ_WRITE | mf.COPY_HOST_PTR,
+                                                       hostbuf=self.__updated_elite_fitnesses)
+
+    ## Prepare device memory for the indices of the best and the worst
+    #  chromosomes of each island for migrations.
+    def __prepare_island_buffers(self):
+        if self.__island_count == 1:
+            return
+        mf = cl.mem_flags
+        size = self.__island_count * self.__island_migrants
+        self.__dev_island_best = cl.Buffer(self.__ctx, mf.READ_WRITE, size * 4)
+        self.__dev_island_worst = cl.Buffer(self.__ctx, mf.READ_WRITE,
+                                            size * self.__island_neighbors * 4)
+
+    ## Prepare system and device memory for the best, worst and avg fitness of
+    #  each run in batch.
+    def __prepare_batch_buffers(self):
+        if self.__batch is None:
+            return
+        mf = cl.mem_flags
+        runs = len(self.__batch)
+        self.__dev_run_best_fitnesses = cl.Buffer(self.__ctx, mf.READ_WRITE, runs * 4)
+        self.__dev_run_worst_fitnesses = cl.Buffer(self.__ctx, mf.READ_WRITE, runs * 4)
+        self.__run_history = numpy.zeros(self.__generations_per_sync * runs * 3,
+                                         dtype=numpy.float32)
+        self.__dev_run_history = cl.Buffer(self.__ctx, mf.READ_WRITE, self.__run_history.nbytes)
+        # 3 floats of local memory for each work item.
+        self.__run_statistics_wg_size = utils.calculate_power_of_2_work_group_size(self.__prg,
+                                                                                   self.__ctx.devices[0],
+                                                                                   'ocl_ga_calculate_island_statistics',
+                                                                                   12)
+
+    ## Return the device memory of the best and worst fitnesses for the guard
+    #  of crossover. They are the ones of each run in batch.
+    def __crossover_fitnesses(self):
+        if self.__batch is None:
+            return self.__dev_best_fitnesses, self.__dev_worst_fitnesses
+        return self.__dev_run_best_fitnesses, self.__dev_run_worst_fitnesses
+
+    ## Prepare device memory for the top N & bottom N fitnesses, indices and the
+    #  average fitness which are calculated at device.
+    def __prepare_statistics_buffers(self):
+        mf = cl.mem_flags
+        size_of_indices = len(self.__best_fitnesses)
+        self.__dev_best_indices = cl.Buffer(self.__ctx, mf.READ_WRITE, size_of_indices * 4)
+        self.__dev_worst_indices = cl.Buffer(self.__ctx, mf.READ_WRITE, size_of_indices * 4)
+        self.__dev_best_fitnesses = cl.Buffer(self.__ctx, mf.READ_WRITE, size_of_indices * 4)
+        self.__dev_worst_fitnesses = cl.Buffer(self.__ctx, mf.READ_WRITE, size_of_indices * 4)
+        self.__dev_avg = cl.Buffer(self.__ctx, mf.READ_WRITE, 4)
+        self.__dev_generation_statistics = cl.Buffer(self.__ctx, mf.READ_WRITE,
+                                                     self.__generation_statistics.nbytes)
+        self.__calc_statistics_wg_size()
+
     def __preexecute_kernels(self):
         total_dna_size = self.__population * self.__sample_chromosome.dna_total_length
 
         self.__fitnesses = numpy.zeros(self.__population, dtype=numpy.float32)
-        self.__np_chromosomes = numpy.zeros(total_dna_size, dtype=numpy.int32)
+        self.__np_chromosomes = numpy.zeros(total_dna_size, dtype=self.__sample_chromosome.gene_dtype)
 
         mf = cl.mem_flags
 
-        # Random number should be given by Host program because OpenCL doesn't have a random number
-        # generator. We just include one, Noise.cl.
-        rnum = [random.randint(0, 4294967295) for i in range(self.__population)]
-        ## note: numpy.random.rand() gives us a list float32 and we cast it to uint32 at the calling
-        ##       of kernel function. It just views the original byte order as uint32.
-        self.__dev_rnum = cl.Buffer(self.__ctx, mf.READ_WRITE | mf.COPY_HOST_PTR,
-                             hostbuf=numpy.array(rnum, dtype=numpy.uint32))
+        # The seed of random numbers should be given by Host program because
+        # OpenCL doesn't have a random number generator. The global random
+        # module is not used, since forked worker processes share its state.
+        self.__rand_seed = utils.derive_seed(self.__seed, 'kernel') if self.__seed is not None\
+                               else int.from_bytes(os.urandom(8), 'little')
 
         self.__dev_chromosomes = cl.Buffer(self.__ctx, mf.READ_WRITE | mf.COPY_HOST_PTR,
                                     hostbuf=self.__np_chromosomes)
         self.__dev_fitnesses = cl.Buffer(self.__ctx, mf.WRITE_ONLY, self.__fitnesses.nbytes)
+        self.__prepare_dirty_buffers(1)
         self.__prepare_fitness_args()
 
-        if self.__is_elitism_mode:
-            self.__elites_updated = False
-            self.__current_elites = numpy.zeros(self.__sample_chromosome.dna_total_length * self.__elitism_top,
-                                                dtype=numpy.int32)
-            self.__dev_current_elites = cl.Buffer(self.__ctx, mf.READ_WRITE | mf.COPY_HOST_PTR,
-                                                  hostbuf=self.__current_elites)
-            self.__updated_elites = numpy.zeros(self.__sample_chromosome.dna_total_length * self.__elitism_top,
-                                                dtype=numpy.int32)
-            self.__dev_updated_elites = cl.Buffer(self.__ctx, mf.READ_WRITE | mf.COPY_HOST_PTR,
-                                                  hostbuf=self.__updated_elites)
-            self.__updated_elite_fitnesses = numpy.zeros(self.__elitism_top,
-                                                        dtype=numpy.float32)
-            self.__dev_updated_elite_fitnesses = cl.Buffer(self.__ctx, mf.READ_WRITE | mf.COPY_HOST_PTR,
-                                                           hostbuf=self.__updated_elite_fitnesses)
-
-        # For statistics
-        self.__dev_best_indices = cl.Buffer(self.__ctx, mf.READ_WRITE | mf.COPY_HOST_PTR,
-                                            hostbuf=self.__best_indices)
-        self.__dev_worst_indices = cl.Buffer(self.__ctx, mf.READ_WRITE | mf.COPY_HOST_PTR,
-                                             hostbuf=self.__worst_indices)
+        self.__prepare_elitism_buffers()
+        self.__prepare_island_buffers()
+        self.__prepare_batch_buffers()
+        self.__prepare_statistics_buffers()
 
         cl.enqueue_copy(self.__queue, self.__dev_fitnesses, self.__fitnesses)
 
@@ -382,200 +799,465 @@ class OpenCLGA():
         ## dump information on kernel resources usage
         self.__dump_kernel_info(self.__prg, self.__ctx, self.__sample_chromosome)
 
+        self.__autotune()
+
+    ## Find the best local sizes of the kernels which are run over the
+    #  population. Kernels are benchmarked only if they are not in the profile.
+    #  It runs before the first population is generated, so the chromosomes
+    #  and fitnesses it touches will be populated again. Since random numbers
+    #  don't have states at device, the evolution isn't affected by it.
+    def __autotune(self):
+        if self.__autotuner is None:
+            return
+        chromosome = self.__sample_chromosome
+        populate_name = chromosome.get_populate_kernel_names()[0]
+        pick_name, crossover_name = chromosome.get_crossover_kernel_names()[1:]
+        mutate_name = chromosome.get_mutation_kernel_names()[0]
+        prob_crossover = self.__prob_crossover if self.__prob_crossover else 0.5
+        prob_mutate = self.__prob_mutation if self.__prob_mutation else 0.5
+
+        def run_populate(size):
+            chromosome.set_work_group_sizes({ populate_name : size })
+            return chromosome.execute_populate(self.__prg,
+                                               self.__queue,
+                                               self.__population,
+                                               0,
+                                               self.__dev_chromosomes,
+                                               self.__rand_seed,
+                                               self.__dev_dirty)
+
+        def run_fitness(size):
+            self.__work_group_sizes['ocl_ga_calculate_fitness'] = size
+            return self.__calculate_fitness(evaluate_all=True)
+
+        # Both of pick and crossover kernels are run. Only the local size of
+        # the tuned one is changed.
+        def run_crossover(name):
+            def run(size):
+                chromosome.set_work_group_sizes({ name : size })
+                return chromosome.execute_crossover(self.__prg,
+                                                    self.__queue,
+                                                    self.__population,
+                                                    0,
+                                                    prob_crossover,
+                                                    self.__dev_chromosomes,
+                                                    self.__dev_fitnesses,
+                                                    self.__rand_seed,
+                                                    self.__dev_dirty,
+                                                    *self.__crossover_fitnesses())
+            return run
+
+        def run_mutate(size):
+            chromosome.set_work_group_sizes({ mutate_name : size })
+            return chromosome.execute_mutation(self.__prg,
+                                               self.__queue,
+                                               self.__population,
+                                               0,
+                                               prob_mutate,
+                                               self.__dev_chromosomes,
+                                               self.__dev_fitnesses,
+                                               self.__rand_seed,
+                                               self.__dev_dirty,
+                                               self.__extra_fitness_args_list)
+
+        tuner = self.__autotuner
+        tuner.tune(self.__queue, self.__prg, self.__program_key, populate_name,
+                   self.__population, run_populate)
+        tuner.tune(self.__queue, self.__prg, self.__program_key, 'ocl_ga_calculate_fitness',
+                   self.__population, run_fitness)
+        # Pick and crossover need valid statistics and ratios.
+        evts = self.__calculate_statistics(0)
+        cl.wait_for_events(chromosome.selection_preparation(self.__prg,
+                                                            self.__queue,
+                                                            self.__dev_fitnesses,
+                                                            self.__island_count,
+                                                            wait_for=evts))
+        tuner.tune(self.__queue, self.__prg, self.__program_key, pick_name,
+                   self.__population, run_crossover(pick_name))
+        tuner.tune(self.__queue, self.__prg, self.__program_key, crossover_name,
+                   self.__population, run_crossover(crossover_name))
+        tuner.tune(self.__queue, self.__prg, self.__program_key, mutate_name,
+                   self.__population, run_mutate)
+
+        self.__apply_tuned_work_group_sizes()
+        # Benchmarking runs are not counted in the profile.
+        if self.__profiler is not None:
+            self.__profiler.clear()
+
+    ## Apply the local sizes in the profile of autotuner.
+    def __apply_tuned_work_group_sizes(self):
+        if self.__autotuner is None:
+            return
+        device = self.__queue.device
+        chromosome = self.__sample_chromosome
+        names = chromosome.get_populate_kernel_names() +\
+                chromosome.get_crossover_kernel_names()[1:] +\
+                chromosome.get_mutation_kernel_names()
+        sizes = {}
+        for name in names + ['ocl_ga_calculate_fitness']:
+            size = self.__autotuner.lookup(self.__prg, device, self.__program_key, name,
+                                           self.__population)
+            if size is not None:
+                sizes[name] = size
+        self.__work_group_sizes = sizes
+        chromosome.set_work_group_sizes(sizes)
+
     ## Populate the first generation.
     def _generate_population_if_needed(self, prob_mutate, prob_crossover):
         if self._populated:
             return
         self._populated = True
-        self.__sample_chromosome.execute_populate(self.__prg,
-                                                  self.__queue,
-                                                  self.__population,
-                                                  self.__dev_chromosomes,
-                                                  self.__dev_rnum)
-
-        self.__prg.ocl_ga_calculate_fitness(self.__queue,
-                                            (self.__population,),
-                                            (1,),
-                                            *self.__fitness_args_list).wait()
-
+        evts = self.__sample_chromosome.execute_populate(self.__prg,
+                                                         self.__queue,
+                                                         self.__population,
+                                                         0,
+                                                         self.__dev_chromosomes,
+                                                         self.__rand_seed,
+                                                         self.__dev_dirty)
+        evts = self.__profile('populate', evts)
+
+        evts = self.__calculate_fitness(wait_for=evts)
+        # The best and worst fitnesses at device are needed by crossover of the
+        # first generation.
+        cl.wait_for_events(self.__read_statistics(self.__calculate_statistics(0, evts)))
+        if self.__profiler is not None:
+            self.__profiler.collect()
+
+    ## Re-populate a part of chromosomes if the extinction condition matches.
+    #  @return The list of events of enqueued kernels.
     def __examine_single_generation(self, index):
         # we cannot extinct the first generation
         if index == 0:
-            return
+            return []
 
-        last_result = self.__dictStatistics[index - 1]
+        last_result = self.__statistics.last()
 
         should_extinct = self.__is_extinction_matched(last_result['best'],
                                                       last_result['avg'],
                                                       last_result['worst'])
 
         if should_extinct == False:
-            return
+            return []
 
         assert('ratio' in self.__extinction)
         # To add 1 for preventing 0 if the population size is too small.
         size = int(self.__population * self.__extinction['ratio']) + 1
-        self.__sample_chromosome.execute_populate(self.__prg,
-                                                  self.__queue,
-                                                  size,
-                                                  self.__dev_chromosomes,
-                                                  self.__dev_rnum)
-
-    def __execute_single_generation(self, index, prob_mutate, prob_crossover):
-        self.__examine_single_generation(index)
+        return self.__profile('populate',
+                              self.__sample_chromosome.execute_populate(self.__prg,
+                                                                        self.__queue,
+                                                                        size,
+                                                                        index,
+                                                                        self.__dev_chromosomes,
+                                                                        self.__rand_seed,
+                                                                        self.__dev_dirty))
+
+    ## Enqueue kernels of a generation. All kernels are enqueued back-to-back
+    #  and chained by events without waiting for them.
+    #  @param slot The index of this generation in current batch. The best,
+    #              worst and avg fitness are recorded in the slot of the
+    #              statistics history at device.
+    #  @param wait_for The list of events to wait before this generation.
+    #  @return The list of events of enqueued kernels.
+    def __enqueue_single_generation(self, index, slot, prob_mutate, prob_crossover, wait_for):
+        evts = wait_for
+        # Only roulette wheel selection needs the global normalization.
+        if self.__selection['type'] == 'roulette':
+            evts = self.__sample_chromosome.selection_preparation(self.__prg,
+                                                                  self.__queue,
+                                                                  self.__dev_fitnesses,
+                                                                  self.__island_count,
+                                                                  wait_for=evts)
+            evts = self.__profile('calc_ratio', evts)
+
+        # The crossover kernel skips itself if the best one and the worst one
+        # are almost the same to prevent the best one being changed.
+        evts = self.__sample_chromosome.execute_crossover(self.__prg,
+                                                          self.__queue,
+                                                          self.__population,
+                                                          index,
+                                                          prob_crossover,
+                                                          self.__dev_chromosomes,
+                                                          self.__dev_fitnesses,
+                                                          self.__rand_seed,
+                                                          self.__dev_dirty,
+                                                          *self.__crossover_fitnesses(),
+                                                          wait_for=evts)
+        # Chromosomes return the event of picking parents before the one of
+        # crossover.
+        self.__profile('pick', evts[:-1])
+        self.__profile('crossover', evts[-1:])
+
+        evts = self.__sample_chromosome.execute_mutation(self.__prg,
+                                                         self.__queue,
+                                                         self.__population,
+                                                         index,
+                                                         prob_mutate,
+                                                         self.__dev_chromosomes,
+                                                         self.__dev_fitnesses,
+                                                         self.__rand_seed,
+                                                         self.__dev_dirty,
+                                                         self.__extra_fitness_args_list,
+                                                         wait_for=evts)
+        evts = self.__profile('mutate', evts)
+
+        evts = self.__calculate_fitness(wait_for=evts)
+
+        if self.__island_count > 1 and self.__batch is None and\
+           (index + 1) % self.__island_interval == 0:
+            evts = self.__migrate(evts)
+
+        return self.__calculate_statistics(slot, evts)
+
+    ## Replace the worst ones of each island by the best ones of its neighbors.
+    #  @param wait_for The list of events to wait before migrating.
+    #  @return The list of events of enqueued kernels.
+    def __migrate(self, wait_for):
+        evt = self.__kernels['ocl_ga_rank_islands'](self.__queue,
+                                                    (self.__island_count,),
+                                                    None,
+                                                    self.__dev_fitnesses,
+                                                    self.__dev_island_best,
+                                                    self.__dev_island_worst,
+                                                    wait_for=wait_for)
+        num_of_migrants = self.__island_count * self.__island_neighbors * self.__island_migrants
+        evt = self.__kernels['ocl_ga_migrate'](self.__queue,
+                                               (num_of_migrants,),
+                                               None,
+                                               self.__dev_chromosomes,
+                                               self.__dev_fitnesses,
+                                               self.__dev_island_best,
+                                               self.__dev_island_worst,
+                                               wait_for=[evt])
+        return self.__profile('migrate', [evt])
+
+    ## Run a batch of generations fully on the device. The host only waits once
+    #  at the end of the batch for reading statistics (and elites) back.
+    #  Extinction, elites updating, early termination and generation callbacks
+    #  are evaluated per batch.
+    #  @param index The index of the first generation of this batch.
+    #  @param count The number of generations of this batch.
+    def __execute_generations(self, index, count, prob_mutate, prob_crossover):
+        assert 0 < count <= self.__generations_per_sync
+        evts = self.__examine_single_generation(index)
 
         if self.__is_elitism_mode:
             with self.__elite_lock:
                 if self.__elites_updated:
-                    # Update current N elites to device memory.
-                    self.__sample_chromosome.execute_update_current_elites(self.__prg,
-                                                                           self.__queue,
-                                                                           self.__elitism_top,
-                                                                           self.__dev_worst_indices,
-                                                                           self.__dev_chromosomes,
-                                                                           self.__dev_updated_elites,
-                                                                           self.__dev_fitnesses,
-                                                                           self.__dev_updated_elite_fitnesses)
-                    self.__update_fitness_index_pair()
+                    # Transfer the received elites into device memory, then
+                    # update current N elites with them.
+                    cl.enqueue_copy(self.__queue, self.__dev_updated_elites, self.__updated_elites)
+                    cl.enqueue_copy(self.__queue, self.__dev_updated_elite_fitnesses,
+                                    self.__updated_elite_fitnesses)
+                    evts = self.__sample_chromosome.execute_update_current_elites(self.__prg,
+                                                                                  self.__queue,
+                                                                                  self.__elitism_top,
+                                                                                  self.__dev_worst_indices,
+                                                                                  self.__dev_chromosomes,
+                                                                                  self.__dev_updated_elites,
+                                                                                  self.__dev_fitnesses,
+                                                                                  self.__dev_updated_elite_fitnesses,
+                                                                                  wait_for=evts)
+                    evts = self.__profile('elites', evts)
+                    # The best and worst fitnesses are changed by elites.
+                    evts = self.__calculate_statistics(0, evts)
                     self.__elites_updated = False
 
-        best_fitness = self.__best_fitnesses[0]
-        self.__sample_chromosome.selection_preparation(self.__prg,
-                                                       self.__queue,
-                                                       self.__dev_fitnesses)
-
-        # We want to prevent the best one being changed.
-        if abs(self.__best_fitnesses[0] - self.__worst_fitnesses[0]) >= 0.00001:
-            self.__sample_chromosome.execute_crossover(self.__prg,
-                                                       self.__queue,
-                                                       self.__population,
-                                                       index,
-                                                       prob_crossover,
-                                                       self.__dev_chromosomes,
-                                                       self.__dev_fitnesses,
-                                                       self.__dev_rnum,
-                                                       best_fitness)
-
-        self.__sample_chromosome.execute_mutation(self.__prg,
-                                                  self.__queue,
-                                                  self.__population,
-                                                  index,
-                                                  prob_mutate,
-                                                  self.__dev_chromosomes,
-                                                  self.__dev_fitnesses,
-                                                  self.__dev_rnum,
-                                                  self.__extra_fitness_args_list)
-
-        self.__prg.ocl_ga_calculate_fitness(self.__queue,
-                                            (self.__population,),
-                                            (1,),
-                                            *self.__fitness_args_list).wait()
-
-        self.__update_fitness_index_pair()
+        for slot in range(count):
+            evts = self.__enqueue_single_generation(index + slot, slot,
+                                                    prob_mutate, prob_crossover, evts)
 
         best_result = None
-        elites_info = {}
-        if self.__is_elitism_mode and\
-           time.time() - self.__elitism_last_retrieval >= self.__elitism_interval:
-
+        fetch_elites = self.__is_elitism_mode and\
+                       time.time() - self.__elitism_last_retrieval >= self.__elitism_interval
+        if fetch_elites:
             # Find current N elites and their corresponding indices, then read
             # it back from device memory to system memory.
-            self.__sample_chromosome.execute_get_current_elites(self.__prg,
-                                                                self.__queue,
-                                                                self.__elitism_top,
-                                                                self.__dev_chromosomes,
-                                                                self.__dev_current_elites,
-                                                                self.__dev_best_indices)
-            cl.enqueue_copy(self.__queue, self.__current_elites, self.__dev_current_elites)
-            elites_info = self.__get_current_elites_info()
+            elites_evts = self.__sample_chromosome.execute_get_current_elites(self.__prg,
+                                                                              self.__queue,
+                                                                              self.__elitism_top,
+                                                                              self.__dev_chromosomes,
+                                                                              self.__dev_current_elites,
+                                                                              self.__dev_best_indices,
+                                                                              wait_for=evts)
+            elites_evts = self.__profile('elites', elites_evts)
+            evts = evts + self.__profile('read_elites',
+                                         [cl.enqueue_copy(self.__queue, self.__current_elites,
+                                                          self.__dev_current_elites,
+                                                          is_blocking=False, wait_for=elites_evts)])
+
+        # This is the only synchronization point of a batch.
+        cl.wait_for_events(self.__read_statistics(evts))
+        profile = self.__profiler.collect() if self.__profiler is not None else None
+
+        if fetch_elites:
+            if self.__generation_callback is not None:
+                best_result = self.__encode_current_elites()
             self.__elitism_last_retrieval = time.time()
 
-        best_result = pickle.dumps(elites_info)
-
-        if best_result and self.__elitism_compressed:
-            # Compress data with the highest level.
-            best_result = zlib.compress(best_result, 9)
-
-        self.__dictStatistics[index] = {}
-        self.__dictStatistics[index]['best'] = self.__best_fitnesses[0]
-        self.__dictStatistics[index]['worst'] = self.__worst_fitnesses[0]
-        self.__dictStatistics[index]['avg'] = self.__avg
-        self.__dictStatistics[index]['best_result'] = best_result
-
-        if self.__generation_callback is not None:
-            self.__generation_callback(index, self.__dictStatistics[index])
+        timestamp = time.time()
+        history = self.__generation_statistics.reshape(-1, 3)
+        for slot in range(count):
+            self.__statistics.record(index + slot, history[slot][0], history[slot][1],
+                                     history[slot][2], timestamp)
+        if self.__batch is not None:
+            run_history = self.__run_history.reshape(-1, len(self.__batch), 3)
+            for slot in range(count):
+                for run_idx, statistics in enumerate(self.__run_statistics):
+                    best, worst, avg = run_history[slot][run_idx]
+                    statistics.record(index + slot, best, worst, avg, timestamp)
+
+        if self.__checkpointer is not None and self.__checkpointer.is_due():
+            self.__take_checkpoint(index + count)
+
+        if self.__generation_callback is None:
+            return
+        for slot in range(count):
+            # Elites are only retrieved at the end of a batch.
+            result = { 'best' : history[slot][0],
+                       'worst' : history[slot][1],
+                       'avg' : history[slot][2],
+                       'best_result' : best_result if slot == count - 1 else None,
+                       'profile' : profile if slot == count - 1 else None }
+            if self.__callback_dispatcher is not None:
+                self.__callback_dispatcher.notify(index + slot, result)
+            else:
+                self.__generation_callback(index + slot, result)
+
+    ## Merge a generation result into a pending one which is not delivered yet.
+    #  The statistics are replaced by the incoming one, but the elites of the
+    #  pending one are kept if the incoming one doesn't carry any. The profiled
+    #  times of both are summed up.
+    def __merge_generation_results(self, pending, incoming):
+        index, result = incoming
+        if result['best_result'] is None:
+            result['best_result'] = pending[1]['best_result']
+        result['profile'] = Profiler.merge_times(pending[1]['profile'], result['profile'])
+        return (index, result)
 
     ## This is called at the end of each generation.
     #  It helps to update current top N & bottom N fitnesses and indices of
     #  all chromosomes and then calculate the avg fitness.
-    #  We calculate best / worst / avg fitness in system memory for
-    #  better efficiency & code simplicity.
-    def __update_fitness_index_pair(self):
-        cl.enqueue_copy(self.__queue, self.__fitnesses, self.__dev_fitnesses)
-
-        ori = []
-        fitness_sum = 0.0
-        for idx, fitness in enumerate(self.__fitnesses):
-            ori.append((idx, fitness))
-            fitness_sum += fitness
-        self.__avg = fitness_sum / len(self.__fitnesses)
-
-        assert len(self.__best_indices) == len(self.__best_fitnesses)
-        assert len(self.__worst_indices) == len(self.__worst_fitnesses)
-        size_of_indices = len(self.__best_indices)
-
-        ori.sort(key=lambda item : item[1], reverse=self.__opt_for_max=='max')
-        tops = ori[:size_of_indices]
-        bottoms = ori[len(ori)-size_of_indices:]
-        for idx in range(size_of_indices):
-            self.__best_indices[idx] = tops[idx][0]
-            self.__best_fitnesses[idx] = tops[idx][1]
-            self.__worst_indices[idx] = bottoms[idx][0]
-            self.__worst_fitnesses[idx] = bottoms[idx][1]
-
-        cl.enqueue_copy(self.__queue, self.__dev_best_indices, self.__best_indices)
-        cl.enqueue_copy(self.__queue, self.__dev_worst_indices, self.__worst_indices)
+    #  All of them are calculated at device with a parallel reduction. The
+    #  indices are kept in device memory for elitism kernels. The best, worst
+    #  and avg fitness are also recorded into the statistics history at device.
+    #  @param slot The slot of the statistics history.
+    #  @param wait_for The list of events to wait before calculating.
+    #  @return The list of events of enqueued kernels.
+    def __calculate_statistics(self, slot, wait_for=None):
+        wg_size = self.__statistics_wg_size
+        size_of_indices = len(self.__best_fitnesses)
+        evt = self.__kernels['ocl_ga_calculate_statistics'](self.__queue,
+                                                            (wg_size,),
+                                                            (wg_size,),
+                                                            self.__dev_fitnesses,
+                                                            self.__dev_best_indices,
+                                                            self.__dev_best_fitnesses,
+                                                            self.__dev_worst_indices,
+                                                            self.__dev_worst_fitnesses,
+                                                            self.__dev_avg,
+                                                            self.__dev_generation_statistics,
+                                                            numpy.int32(slot),
+                                                            cl.LocalMemory(wg_size * size_of_indices * 4),
+                                                            cl.LocalMemory(wg_size * size_of_indices * 4),
+                                                            cl.LocalMemory(wg_size * size_of_indices * 4),
+                                                            cl.LocalMemory(wg_size * size_of_indices * 4),
+                                                            cl.LocalMemory(wg_size * 4),
+                                                            wait_for=wait_for)
+        if self.__batch is None:
+            return self.__profile('statistics', [evt])
+
+        # The statistics of each run are calculated by a work group.
+        wg_size = self.__run_statistics_wg_size
+        run_evt = self.__kernels['ocl_ga_calculate_island_statistics'](self.__queue,
+                                                                       (wg_size * len(self.__batch),),
+                                                                       (wg_size,),
+                                                                       self.__dev_fitnesses,
+                                                                       self.__dev_run_best_fitnesses,
+                                                                       self.__dev_run_worst_fitnesses,
+                                                                       self.__dev_run_history,
+                                                                       numpy.int32(slot),
+                                                                       cl.LocalMemory(wg_size * 4),
+                                                                       cl.LocalMemory(wg_size * 4),
+                                                                       cl.LocalMemory(wg_size * 4),
+                                                                       wait_for=wait_for)
+        return self.__profile('statistics', [evt, run_evt])
+
+    ## Read the top N & bottom N fitnesses, the avg fitness and the statistics
+    #  history of current batch back to system memory without blocking.
+    #  @param wait_for The list of events to wait before reading.
+    #  @return The list of events of reading back. The values in system memory
+    #          are valid after these events are completed.
+    def __read_statistics(self, wait_for=None):
+        buffers = [(self.__best_fitnesses, self.__dev_best_fitnesses),
+                   (self.__worst_fitnesses, self.__dev_worst_fitnesses),
+                   (self.__avg, self.__dev_avg),
+                   (self.__generation_statistics, self.__dev_generation_statistics)]
+        if self.__batch is not None:
+            buffers.append((self.__run_history, self.__dev_run_history))
+        return self.__profile('read_statistics',
+                              [cl.enqueue_copy(self.__queue, host, dev, is_blocking=False,
+                                               wait_for=wait_for)
+                               for host, dev in buffers])
 
     def __evolve_by_count(self, count, prob_mutate, prob_crossover):
         start_time = time.time()
-        for i in range(self.__generation_index, count):
-            self.__execute_single_generation(i, prob_mutate, prob_crossover)
+        i = self.__generation_index
+        while i < count:
+            batch = min(self.__generations_per_sync, count - i)
+            self.__execute_generations(i, batch, prob_mutate, prob_crossover)
+            i += batch
             if self.__early_terminated:
                 break
 
             if self._paused:
-                self.__generation_index = i + 1
+                self.__generation_index = i
                 self.__generation_time_diff = time.time() - start_time
-                cl.enqueue_read_buffer(self.__queue, self.__dev_fitnesses, self.__fitnesses)
-                cl.enqueue_read_buffer(self.__queue, self.__dev_chromosomes, self.__np_chromosomes).wait()
+                self.__read_population()
                 break
             if self._forceStop:
-                cl.enqueue_read_buffer(self.__queue, self.__dev_fitnesses, self.__fitnesses)
-                cl.enqueue_read_buffer(self.__queue, self.__dev_chromosomes, self.__np_chromosomes).wait()
+                self.__read_population()
                 break
 
     def __evolve_by_time(self, max_time, prob_mutate, prob_crossover):
         start_time = time.time()
         while True:
-            self.__execute_single_generation(self.__generation_index, prob_mutate, prob_crossover)
+            batch = self.__generations_per_sync
+            self.__execute_generations(self.__generation_index, batch, prob_mutate, prob_crossover)
             # calculate elapsed time
             elapsed_time = time.time() - start_time + self.__generation_time_diff
-            self.__generation_index = self.__generation_index + 1
+            self.__generation_index = self.__generation_index + batch
             if self.__early_terminated or elapsed_time > max_time:
                 break
 
             if self._paused:
                 self.__generation_time_diff = time.time() - start_time
-                cl.enqueue_read_buffer(self.__queue, self.__dev_fitnesses, self.__fitnesses)
-                cl.enqueue_read_buffer(self.__queue, self.__dev_chromosomes, self.__np_chromosomes).wait()
+                self.__read_population()
                 break
             if self._forceStop:
-                cl.enqueue_read_buffer(self.__queue, self.__dev_fitnesses, self.__fitnesses)
-                cl.enqueue_read_buffer(self.__queue, self.__dev_chromosomes, self.__np_chromosomes).wait()
+                self.__read_population()
                 break
 
+    ## Read device memory back without blocking and write a snapshot on the
+    #  background thread. The readback is enqueued right after a batch, so the
+    #  snapshot is consistent with the generations before generation_idx.
+    #  @param generation_idx The index of the next generation to run.
+    def __take_checkpoint(self, generation_idx):
+        meta = {}
+        self.__save_state_info(meta)
+        meta['generation_idx'] = generation_idx
+        meta['generation_time_diff'] = self.__generation_time_diff +\
+                                           time.time() - self.__evolution_start_time
+        meta['best'] = self.__best_fitnesses[0]
+        meta['worst'] = self.__worst_fitnesses[0]
+        meta['avg'] = self.__avg[0]
+        buffers = { 'fitnesses' : (self.__dev_fitnesses, self.__fitnesses.shape, numpy.float32),
+                    'chromosomes' : (self.__dev_chromosomes, self.__np_chromosomes.shape,
+                                     self.__np_chromosomes.dtype) }
+        self.__checkpointer.capture(self.__queue, buffers, meta)
+
     def _start_evolution(self, prob_mutate, prob_crossover):
         generation_start = time.time()
+        self.__evolution_start_time = generation_start
         ## start the evolution
         if self.__termination['type'] == 'time':
             self.__evolve_by_time(self.__termination['time'], prob_mutate, prob_crossover)
@@ -585,37 +1267,41 @@ class OpenCLGA():
         if self._paused:
             return
 
-        cl.enqueue_read_buffer(self.__queue, self.__dev_fitnesses, self.__fitnesses)
-        cl.enqueue_read_buffer(self.__queue, self.__dev_chromosomes, self.__np_chromosomes).wait()
+        self.__read_population()
 
         total_time_consumption = time.time() - generation_start + self.__generation_time_diff
-        avg_time_per_gen = total_time_consumption / float(len(self.__dictStatistics))
-        self.__dictStatistics['avg_time_per_gen'] = avg_time_per_gen
+        avg_time_per_gen = total_time_consumption / float(max(self.__statistics.total, 1))
+        self.__statistics.avg_time_per_gen = avg_time_per_gen
 
-    def __save_state(self, data):
+    ## Save the information kept in system memory.
+    def __save_state_info(self, data):
         # save data from intenal struct
         data['generation_idx'] = self.__generation_index
-        data['statistics'] = self.__dictStatistics
+        data['statistics'] = self.__statistics.get_state()
+        if self.__batch is not None:
+            data['run_statistics'] = [statistics.get_state() for statistics in self.__run_statistics]
         data['generation_time_diff'] = self.__generation_time_diff
         data['population'] = self.__population
+        data['rand_seed'] = self.__rand_seed
+        data['interleaved'] = self.__interleaved
+
+        # save algorithm information
+        data['prob_mutation'] = self.__prob_mutation
+        data['prob_crossover'] = self.__prob_crossover
+
+    def __save_state(self, data):
+        self.__save_state_info(data)
 
         # read data from kernel
-        rnum = numpy.zeros(self.__population, dtype=numpy.uint32)
-        cl.enqueue_copy(self.__queue, rnum, self.__dev_rnum)
         cl.enqueue_copy(self.__queue, self.__fitnesses, self.__dev_fitnesses)
         cl.enqueue_copy(self.__queue, self.__np_chromosomes, self.__dev_chromosomes)
 
         # save kernel memory to data
-        data['rnum'] = rnum
         data['fitnesses'] = self.__fitnesses
         data['chromosomes'] = self.__np_chromosomes
         data['best'] = self.__best_fitnesses[0]
         data['worst'] = self.__worst_fitnesses[0]
-        data['avg'] = self.__avg
-
-        # save algorithm information
-        data['prob_mutation'] = self.__prob_mutation
-        data['prob_crossover'] = self.__prob_crossover
+        data['avg'] = self.__avg[0]
 
         self.__sample_chromosome.save(data, self.__ctx, self.__queue, self.__population)
 
@@ -625,28 +1311,44 @@ class OpenCLGA():
         self.__prob_crossover = data['prob_crossover']
 
         self.__generation_index = data['generation_idx']
-        self.__dictStatistics = data['statistics']
+        self.__statistics.set_state(data['statistics'])
+        for statistics, state in zip(self.__run_statistics, data.get('run_statistics', [])):
+            statistics.set_state(state)
         self.__generation_time_diff = data['generation_time_diff']
         self.__population = data['population']
 
-        rnum = data['rnum']
+        self.__rand_seed = data['rand_seed']
         self.__fitnesses = data['fitnesses']
-        self.__np_chromosomes = data['chromosomes']
-        self.__best_fitnesses = data['best']
-        self.__worst_fitnesses = data['worst']
-        self.__avg = data['avg']
+        self.__np_chromosomes = numpy.asarray(data['chromosomes'],
+                                              dtype=self.__sample_chromosome.gene_dtype)
+        # The layout of saved chromosomes may differ from the current one.
+        if data.get('interleaved', False) != self.__interleaved:
+            num_of_genes = self.__sample_chromosome.num_of_genes
+            shape = (num_of_genes, self.__population) if data.get('interleaved', False)\
+                                                       else (self.__population, num_of_genes)
+            self.__np_chromosomes = numpy.ascontiguousarray(
+                self.__np_chromosomes.reshape(shape).transpose()).reshape(-1)
 
         # build CL memory from restored memory
         mf = cl.mem_flags
-        self.__dev_rnum = cl.Buffer(self.__ctx, mf.READ_WRITE | mf.COPY_HOST_PTR,
-                             hostbuf=numpy.array(rnum, dtype=numpy.uint32))
         self.__dev_chromosomes = cl.Buffer(self.__ctx, mf.READ_WRITE | mf.COPY_HOST_PTR,
                                     hostbuf=self.__np_chromosomes)
         self.__dev_fitnesses = cl.Buffer(self.__ctx, mf.WRITE_ONLY | mf.COPY_HOST_PTR,
                                          hostbuf=self.__fitnesses)
+        # The restored fitnesses are up to date.
+        self.__prepare_dirty_buffers(0)
         self.__prepare_fitness_args()
+        self.__prepare_elitism_buffers()
+        self.__prepare_island_buffers()
+        self.__prepare_batch_buffers()
+        self.__prepare_statistics_buffers()
 
         self.__sample_chromosome.restore(data, self.__ctx, self.__queue, self.__population)
+        self.__apply_tuned_work_group_sizes()
+        # top N & bottom N fitnesses and indices are calculated from restored fitnesses.
+        cl.wait_for_events(self.__read_statistics(self.__calculate_statistics(0)))
+        # The restored chromosomes should not be populated again when running.
+        self._populated = True
         self._paused = True
 
     # public methods
@@ -667,8 +1369,10 @@ class OpenCLGA():
         # This function is not supposed to be overriden
         prob_mutate = arg_prob_mutate if arg_prob_mutate else self.__prob_mutation
         prob_crossover = arg_prob_crossover if arg_prob_crossover else self.__prob_crossover
-        assert 0 < prob_mutate < 1, 'Make sure you have set it in options or passed when calling run.'
-        assert 0 < prob_crossover < 1, 'Make sure you have set it in options or passed when calling run.'
+        # The probabilities of each run in batch mode are built in the program.
+        if self.__batch is None:
+            assert 0 < prob_mutate < 1, 'Make sure you have set it in options or passed when calling run.'
+            assert 0 < prob_crossover < 1, 'Make sure you have set it in options or passed when calling run.'
         assert self.thread != None
 
         self._forceStop = False
@@ -682,6 +1386,19 @@ class OpenCLGA():
         if self.thread:
             self.thread.stop()
         self.thread = None
+        if self.__callback_dispatcher is not None:
+            # Deliver pending generation results before stopped.
+            self.__callback_dispatcher.stop()
+        if self.__checkpointer is not None:
+            # Finish writing pending checkpoints.
+            self.__checkpointer.stop()
+
+    ## Return the counters of delivered, dropped, merged and pending generation
+    #  results of the callback dispatcher. It is None if there's no dispatcher.
+    def get_callback_metrics(self):
+        if self.__callback_dispatcher is None:
+            return None
+        return self.__callback_dispatcher.metrics
 
     @EnterExit()
     def pause(self):
@@ -699,49 +1416,91 @@ class OpenCLGA():
         pickle.dump(data, f)
         f.close()
 
+    ## Restore from a file saved by save, or a snapshot folder written by
+    #  checkpoints. If it is the folder of snapshots, the latest one is used.
     @EnterExit()
     def restore(self, filename = None):
         fname = self.__saved_filename if self.__saved_filename else filename
+        if os.path.isdir(fname):
+            data = load_checkpoint(fname)
+            self.__restore_state(data)
+            return
         # TODO : Should check file existence ?
         f = open(fname, 'rb')
         data = pickle.load(f)
         f.close()
         self.__restore_state(data)
 
+    ## Return the statistics in the old format, a dictionary. e.g.
+    #  { gen : { 'best':  best_fitness, 'worst': worst_fitness, 'avg': avg_fitness },
+    #    'avg_time_per_gen': avg. elapsed time per generation }
+    #  Only the generations retained by the statistics store are included.
     def get_statistics(self):
-        return self.__dictStatistics
+        return self.__statistics.to_dict()
+
+    ## Return the columnar statistics store for slicing and querying.
+    def get_statistics_store(self):
+        return self.__statistics
 
-    ## Return a dictionary containers current elites and their fitnesses
-    #  correspondingly. e.g.
+    ## Return the profiled times of each phase, see Profiler.get_profile.
+    #  It is None unless the 'profiling' option is True.
+    def get_profile(self):
+        return self.__profiler.get_profile() if self.__profiler is not None else None
+
+    ## Return a binary frame (see elite_frame) of current elites and their
+    #  fitnesses correspondingly. e.g.
     #  elites : abcdedabcdefdeeacbadeadebcda
     #  fitnesses : 4, 5.5, 3.7, 7.1
     #  dna_size : 7
     #  The total lenght of elites is 28. With dna_size being 7, you could
     #  divided elites into 4 seperate array. Each standands for a chromosome
     #  with corresponding fitnesses orderly.
-    def __get_current_elites_info(self):
-        elites_info = {}
-        if self.__is_elitism_mode:
-            elites_info = { 'elites' : self.__current_elites,
-                            'fitnesses' : self.__best_fitnesses,
-                            'dna_size' : self.__sample_chromosome.dna_total_length }
-        return elites_info
-
-    def get_the_best(self):
+    def __encode_current_elites(self):
+        return encode_elites(self.__current_elites,
+                             self.__best_fitnesses,
+                             self.__sample_chromosome.dna_total_length,
+                             self.__elitism_compressed,
+                             self.__elitism_compress_threshold)
+
+    ## Return the statistics of each run in batch mode in the same format as
+    #  get_statistics.
+    def get_batch_statistics(self):
+        assert self.__batch is not None, 'Batch mode is not enabled'
+        return [statistics.to_dict() for statistics in self.__run_statistics]
+
+    ## Return the best chromosome, its fitness and the value from chromosome.
+    #  @param run The index of a run in batch mode, or None for the best one
+    #             of the whole population.
+    def get_the_best(self, run = None):
         assert self.__opt_for_max in ['max', 'min']
 
-        best_fitness = eval(self.__opt_for_max)(value for value in self.__fitnesses)
-        best_index = list(self.__fitnesses).index(best_fitness)
-
-        # We had convert chromosome to a cyclic gene. So, the num_of_genes in CL is more than python
-        # by one.
-        startGeneId = best_index * (self.__sample_chromosome.num_of_genes)
-        endGeneId = (best_index + 1) * (self.__sample_chromosome.num_of_genes)
-        best = [v for v in self.__np_chromosomes[startGeneId:endGeneId]]
+        start = 0
+        fitnesses = list(self.__fitnesses)
+        if run is not None:
+            assert self.__batch is not None and 0 <= run < len(self.__batch)
+            # Runs are stored as islands, one after another.
+            run_size = self.__population // len(self.__batch)
+            start = run * run_size
+            fitnesses = fitnesses[start:start + run_size]
+        best_fitness = eval(self.__opt_for_max)(value for value in fitnesses)
+        best_index = start + fitnesses.index(best_fitness)
+
+        num_of_genes = self.__sample_chromosome.num_of_genes
+        if self.__interleaved:
+            # gene i of all chromosomes are stored contiguously.
+            best = [v for v in self.__np_chromosomes[best_index::self.__population]]
+        else:
+            # We had convert chromosome to a cyclic gene. So, the num_of_genes in CL is more than python
+            # by one.
+            startGeneId = best_index * num_of_genes
+            endGeneId = (best_index + 1) * num_of_genes
+            best = [v for v in self.__np_chromosomes[startGeneId:endGeneId]]
         return best, best_fitness, self.__sample_chromosome.from_kernel_value(best)
 
     ## Update the top N(sorted) elites of all elites provided from all workers
-    #  to chromosomes device memory.
+    #  to chromosomes device memory. They are kept in system memory here, and
+    #  written to device memory by the GA thread at the next batch, so it could
+    #  be called from any thread.
     def update_elites(self, elites):
         assert self.__is_elitism_mode, 'Elitism Mode is {}'.format(self.__is_elitism_mode)
         assert len(elites) == self.__elitism_top
@@ -754,17 +1513,13 @@ class OpenCLGA():
             # layout.
             for idx, elite_info in enumerate(elites):
                 fitness, elite_dna, worker_id = elite_info
-                if idx == 0:
+                if idx == 0 and self.__debug_mode:
                     print('updating {}/{} elites ... fitness = {} from worker {}'.format(idx+1, len(elites), fitness, worker_id))
                 elites_dna_data.extend(elite_dna)
                 elites_fitnesses.append(fitness)
 
             # Convert the continuous memory to a device compatible memory layout.
-            self.__updated_elites = numpy.asarray(elites_dna_data, dtype=numpy.int32)
+            self.__updated_elites = numpy.asarray(elites_dna_data,
+                                                  dtype=self.__sample_chromosome.gene_dtype)
             self.__updated_elite_fitnesses = numpy.asarray(elites_fitnesses, dtype=numpy.float32)
-
-            # Transfer it into device meory.
-            cl.enqueue_copy(self.__queue, self.__dev_updated_elites, self.__updated_elites)
-            cl.enqueue_copy(self.__queue, self.__dev_updated_elite_fitnesses, self.__updated_elite_fitnesses)
-
             self.__elites_updated = True
@@ -4,12 +4,13 @@ import argparse
 import pickle
 import pyopencl as cl
 from pyopencl import device_info as di
-import random
+import socket
 import tempfile
 import time
 import uuid
 from multiprocessing import Process, Pipe, Value, Event
 
+from . import utils
 from .ocl_ga import OpenCLGA
 from .utilities.generaltaskthread import Logger
 from .utilities.socketserverclient import Client, OP_MSG_BEGIN, OP_MSG_END
@@ -70,7 +71,6 @@ class OpenCLGAWorker(Process, Logger):
     #  Third, create a socket client as the communication channel to server.
     def run(self):
         self.running.value = 1
-        random.seed()
         try:
             self.__create_context()
             self.info('Worker created for context {}'.format(self.device.name))
@@ -118,7 +118,8 @@ class OpenCLGAWorker(Process, Logger):
                                 'result' : { 'best_fitness' : data['best'],
                                              'avg_fitness'  : data['avg'],
                                              'worst_fitness': data['worst'],
-                                             'best_result'  : data['best_result'] }}})
+                                             'best_result'  : data['best_result'],
+                                             'profile'      : data['profile'] }}})
 
     ## The callback funciton for OpenCLGA to notify state change.
     def _state_changed(self, state):
@@ -130,6 +131,14 @@ class OpenCLGAWorker(Process, Logger):
     #  @param options Algorithm setup information
     def __create_ocl_ga(self, options):
         options['cl_context'] = self.context
+        if options.get('seed', None) is not None:
+            # All workers receive the same options. A distinct seed is derived
+            # for each worker from its host and device, so a worker evolves
+            # the same way whenever the run is repeated.
+            options['seed'] = utils.derive_seed(options['seed'],
+                                                '{}-{}-{}'.format(socket.gethostname(),
+                                                                  self.platform_index,
+                                                                  self.device_index))
         options['generation_callback'] = self.__send_and_dump_info
         self.ocl_ga = OpenCLGA(options,
                                action_callbacks={ 'state' : self._state_changed })
@@ -1,6 +1,5 @@
 #!/usr/bin/python3
 import json
-import zlib
 import os
 import pickle
 import queue
@@ -9,6 +8,7 @@ import sys
 import time
 import traceback
 from .utils import get_local_IP
+from .elite_frame import decode_elites
 from .utilities.generaltaskthread import Logger, Task, TaskThread
 from .utilities.socketserverclient import Server, OP_MSG_BEGIN, OP_MSG_END
 from .ocl_ga_wsserver import OclGAWSServer
@@ -165,7 +165,6 @@ class OpenCLGAServer(Logger):
     def __update_elitism_members(self, elitism_info):
         self.elitism_top = elitism_info.get('top', 1)
         self.elitism_every = elitism_info.get('every', 0)
-        self.elitism_compressed = elitism_info.get('compress', False)
         self.is_elitism_mode = all([self.elitism_top, self.elitism_every])
         self.info('Elitism mode is {}, top({})/every({})'.format(self.is_elitism_mode,
                                                                  self.elitism_top,
@@ -318,10 +317,9 @@ class OpenCLGAServer(Logger):
                 serialized_best_result = dict_msg['data']['result'].pop('best_result', None)
                 worker_id = dict_msg['data']['worker']
                 best_fitness = dict_msg['data']['result'].get('best_fitness', 0.0)
-                if self.is_elitism_mode:
-                    if self.elitism_compressed:
-                        serialized_best_result = zlib.decompress(serialized_best_result)
-                    best_result = pickle.loads(serialized_best_result)
+                # Workers only send elites when they were fetched.
+                if self.is_elitism_mode and serialized_best_result:
+                    best_result = decode_elites(serialized_best_result)
                     self.__update_elite_list(best_result, worker_id)
 
             self.__send_message_to_WSs(dict_msg)
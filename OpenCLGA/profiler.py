@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+import math
+import threading
+
+## A profiler of OpenCL commands, grouped by phases such as populate,
+#  calc_ratio, pick, crossover, mutate, fitness, elites and readbacks.
+#  The events of commands are recorded with their phase when they are
+#  enqueued, and the timestamps (queued, submit, start and end) are read after
+#  the events are completed. The queue must be created with PROFILING_ENABLE.
+#  The execution time (end - start) of each phase is aggregated into a
+#  histogram of power of 2 buckets in microseconds, e.g. the bucket 64 counts
+#  the commands taking 32us ~ 64us.
+#  @var __pending A list of (phase, event) which are not collected yet.
+#  @var __phases A dictionary of phase to its aggregated times.
+class Profiler(object):
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__pending = []
+        self.__phases = {}
+
+    ## Record the events of a phase.
+    #  @param phase The name of the phase.
+    #  @param evts The list of events of enqueued commands.
+    def record(self, phase, evts):
+        with self.__lock:
+            self.__pending.extend([(phase, evt) for evt in evts])
+
+    ## Read the timestamps of recorded events and aggregate them. It should be
+    #  called after all recorded events are completed.
+    #  @return A dictionary of phase to the total execution time in seconds of
+    #          the collected events.
+    def collect(self):
+        with self.__lock:
+            pending = self.__pending
+            self.__pending = []
+        times = {}
+        for phase, evt in pending:
+            # Timestamps are in nanoseconds.
+            queued = evt.profile.queued
+            submit = evt.profile.submit
+            start = evt.profile.start
+            end = evt.profile.end
+            self.__aggregate(phase, (submit - queued) * 1e-9, (start - submit) * 1e-9,
+                             (end - start) * 1e-9)
+            times[phase] = times.get(phase, 0) + (end - start) * 1e-9
+        return times
+
+    def __aggregate(self, phase, queued_time, submit_time, exec_time):
+        with self.__lock:
+            if phase not in self.__phases:
+                self.__phases[phase] = { 'count' : 0,
+                                         'queued_time' : 0,
+                                         'submit_time' : 0,
+                                         'total_time' : 0,
+                                         'min_time' : exec_time,
+                                         'max_time' : exec_time,
+                                         'histogram' : {} }
+            info = self.__phases[phase]
+            info['count'] += 1
+            info['queued_time'] += queued_time
+            info['submit_time'] += submit_time
+            info['total_time'] += exec_time
+            info['min_time'] = min(info['min_time'], exec_time)
+            info['max_time'] = max(info['max_time'], exec_time)
+            bucket = 2 ** max(0, math.ceil(math.log2(max(exec_time * 1e6, 1))))
+            info['histogram'][bucket] = info['histogram'].get(bucket, 0) + 1
+
+    ## Return a dictionary of phase to its aggregated times in seconds, e.g.
+    #  { 'fitness' : { 'count' : 100, 'total_time' : 0.5, 'avg_time' : 0.005,
+    #                  'min_time' : 0.004, 'max_time' : 0.008,
+    #                  'queued_time' : 0.01, 'submit_time' : 0.02,
+    #                  'histogram' : { 4096 : 40, 8192 : 60 } } }
+    #  queued_time is the total time from queued to submitted, and submit_time
+    #  is the total time from submitted to started.
+    def get_profile(self):
+        with self.__lock:
+            profile = {}
+            for phase, info in self.__phases.items():
+                profile[phase] = dict(info)
+                profile[phase]['avg_time'] = info['total_time'] / info['count']
+                profile[phase]['histogram'] = dict(info['histogram'])
+            return profile
+
+    ## Remove all recorded and aggregated times.
+    def clear(self):
+        with self.__lock:
+            self.__pending = []
+            self.__phases = {}
+
+    ## Merge 2 dictionaries of phase times returned by collect.
+    @staticmethod
+    def merge_times(times, other):
+        if times is None or other is None:
+            return times if other is None else other
+        merged = dict(times)
+        for phase, time in other.items():
+            merged[phase] = merged.get(phase, 0) + time
+        return merged
@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+import os
+import re
+import hashlib
+import pyopencl as cl
+from .utilities.generaltaskthread import Logger
+
+## A on-disk cache of built OpenCL program binaries.
+#  The key of a program is the hash of its final source, build options, the
+#  contents of all included files and the identity of devices/drivers. A warm
+#  start loads the binaries and skips the compilation. The binary of each
+#  device is stored as raw bytes in its own file, named by the key and the
+#  index of device. The binaries of the least recently used programs are
+#  evicted when the total size exceeds the limit.
+#  @var __cache_dir The folder to store binaries.
+#  @var __max_size The max total size of binaries in bytes.
+class ProgramCache(Logger):
+    DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'OpenCLGA', 'programs')
+    DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+    INCLUDE_PATTERN = re.compile(r'^\s*#\s*include\s*[<"]([^>"]+)[>"]', re.MULTILINE)
+
+    def __init__(self, cache_dir = None, max_size = None):
+        Logger.__init__(self)
+        self.__cache_dir = cache_dir if cache_dir else ProgramCache.DEFAULT_CACHE_DIR
+        self.__max_size = max_size if max_size else ProgramCache.DEFAULT_MAX_SIZE
+
+    @property
+    def cache_dir(self):
+        return self.__cache_dir
+
+    ## Collect the contents of all files included by source recursively.
+    #  Files which cannot be found in include paths are skipped, e.g. system
+    #  headers of the OpenCL compiler.
+    @classmethod
+    def __collect_includes(cls, source, include_dirs, visited):
+        contents = []
+        for name in ProgramCache.INCLUDE_PATTERN.findall(source):
+            for folder in include_dirs:
+                path = os.path.normpath(os.path.join(folder, name))
+                if not os.path.isfile(path):
+                    continue
+                if path not in visited:
+                    visited.add(path)
+                    with open(path, 'r') as f:
+                        content = f.read()
+                    contents.append(path + '\n' + content)
+                    contents.extend(cls.__collect_includes(content, include_dirs, visited))
+                break
+        return contents
+
+    @staticmethod
+    def __device_identity(device):
+        platform = device.platform
+        return '|'.join([platform.name, platform.vendor, platform.version,
+                         device.name, device.vendor, device.version,
+                         device.driver_version])
+
+    ## Calculate the key of a program. It could be called without a cache,
+    #  e.g. to identify the program in the profile of autotuner.
+    #  @param ctx The OpenCL context which the program is built for.
+    #  @param source The final source of the program.
+    #  @param options The list of build options.
+    #  @param include_dirs The folders to look for included files.
+    @classmethod
+    def calculate_key(cls, ctx, source, options, include_dirs):
+        sha = hashlib.sha256()
+        sha.update(source.encode('utf-8'))
+        sha.update('\0'.join(options).encode('utf-8'))
+        for content in cls.__collect_includes(source, include_dirs, set()):
+            sha.update(content.encode('utf-8'))
+        for device in ctx.devices:
+            sha.update(cls.__device_identity(device).encode('utf-8'))
+        return sha.hexdigest()
+
+    def __path_of(self, key, index):
+        return os.path.join(self.__cache_dir, '{}.{}.bin'.format(key, index))
+
+    def __load(self, ctx, key, options):
+        paths = [self.__path_of(key, index) for index in range(len(ctx.devices))]
+        if not all(os.path.isfile(path) for path in paths):
+            return None
+        try:
+            binaries = []
+            for path in paths:
+                with open(path, 'rb') as f:
+                    binaries.append(f.read())
+            prg = cl.Program(ctx, ctx.devices, binaries).build(options)
+            # Mark it as recently used.
+            for path in paths:
+                os.utime(path, None)
+            return prg
+        except Exception as e:
+            self.warning('Failed to load cached program {} : {}'.format(key, e))
+            return None
+
+    def __store(self, key, prg):
+        try:
+            os.makedirs(self.__cache_dir, exist_ok=True)
+            for index, binary in enumerate(prg.get_info(cl.program_info.BINARIES)):
+                path = self.__path_of(key, index)
+                # Write to a temporary file at first to prevent other processes
+                # from reading an incomplete file.
+                temp_path = '{}.{}.tmp'.format(path, os.getpid())
+                with open(temp_path, 'wb') as f:
+                    f.write(binary)
+                os.replace(temp_path, path)
+            self.__evict(key)
+        except Exception as e:
+            self.warning('Failed to cache program {} : {}'.format(key, e))
+
+    ## Remove the binaries of the least recently used programs until the total
+    #  size is smaller than the limit.
+    #  @param keep The key of program which is just stored and won't be removed.
+    def __evict(self, keep):
+        # key to [last used time, total size, paths of binaries]
+        entries = {}
+        for name in os.listdir(self.__cache_dir):
+            if not name.endswith('.bin'):
+                continue
+            path = os.path.join(self.__cache_dir, name)
+            stat = os.stat(path)
+            entry = entries.setdefault(name.split('.')[0], [0, 0, []])
+            entry[0] = max(entry[0], stat.st_mtime)
+            entry[1] += stat.st_size
+            entry[2].append(path)
+        total_size = sum([entry[1] for entry in entries.values()])
+        for key, (mtime, size, paths) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if total_size <= self.__max_size:
+                break
+            if key == keep:
+                continue
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total_size -= size
+
+    ## Build a program with cached binaries if possible. Otherwise, build it
+    #  from source and cache its binaries.
+    #  @param ctx The OpenCL context.
+    #  @param source The final source of the program.
+    #  @param options The list of build options.
+    #  @param include_dirs The folders to look for included files.
+    #  @return The built program.
+    def build(self, ctx, source, options, include_dirs):
+        key = self.calculate_key(ctx, source, options, include_dirs)
+        prg = self.__load(ctx, key, options)
+        if prg is not None:
+            return prg
+        prg = cl.Program(ctx, source).build(options)
+        self.__store(key, prg)
+        return prg
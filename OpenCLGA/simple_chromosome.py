@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 import numpy
 import pyopencl as cl
+from . import utils
 from .simple_gene import SimpleGene
 
 class SimpleChromosome:
@@ -8,6 +9,11 @@ class SimpleChromosome:
     # __genes - a list of Genes
     # __name - name of the chromosome
     # __improving_func - a function name in kernel to gurantee a better mutation result.
+    # __ratio_wg_size - the work group size for calculating cumulative ratios.
+    # __work_group_sizes - a dict of kernel name to its local work size.
+    # __kernels - a dict of kernel name to the cl.Kernel created once for __prg.
+    # __gene_type - the kernel type and numpy dtype to store a gene. It is the
+    #               narrowest integer type which holds the largest element index.
     # dna - an listed of Gene's dna
     # dna_total_length - sum of the lenght of all genes's dna
     def __init__(self, genes, name = ''):
@@ -16,6 +22,12 @@ class SimpleChromosome:
         self.__genes = genes
         self.__name = name
         self.__improving_func = None
+        self.__ratio_wg_size = None
+        self.__work_group_sizes = {}
+        self.__prg = None
+        self.__kernels = {}
+        max_index = max([gene.elements_length for gene in genes]) - 1 if len(genes) > 0 else 0
+        self.__gene_type = utils.get_narrowest_int_type(max_index)
 
     @property
     def num_of_genes(self):
@@ -26,6 +38,11 @@ class SimpleChromosome:
     def name(self):
         return self.__name
 
+    @property
+    def improving_func(self):
+        # The helper function of improving only mutation, None if not used.
+        return self.__improving_func
+
     @property
     def dna_total_length(self):
         # Sum of the dna lenght of each gene.
@@ -53,6 +70,16 @@ class SimpleChromosome:
     def gene_elements_in_kernel(self):
         return [] if len(self.__genes) == 0 else self.__genes[0].elements_in_kernel
 
+    @property
+    def gene_type(self):
+        # The type name of a gene in kernel, e.g. uchar, ushort or int.
+        return self.__gene_type[0]
+
+    @property
+    def gene_dtype(self):
+        # The numpy dtype of a gene.
+        return self.__gene_type[1]
+
     @property
     def kernel_file(self):
         return 'simple_chromosome.cl'
@@ -89,7 +116,8 @@ class SimpleChromosome:
         elements_size_list = [str(gene.elements_length) for gene in self.__genes]
         candidates = '#define SIMPLE_CHROMOSOME_GENE_ELEMENTS_SIZE {' +\
                             ', '.join(elements_size_list) + '}\n'
-        defines = '#define SIMPLE_CHROMOSOME_GENE_SIZE ' + str(self.num_of_genes) + '\n' +\
+        defines = '#define GENE_TYPE ' + self.gene_type + '\n' +\
+                  '#define SIMPLE_CHROMOSOME_GENE_SIZE ' + str(self.num_of_genes) + '\n' +\
                   '#define SIMPLE_CHROMOSOME_GENE_MUTATE_FUNC ' +\
                         self.__genes[0].mutate_func_name + '\n'
 
@@ -98,21 +126,28 @@ class SimpleChromosome:
     def save(self, data, ctx, queue, population):
         total_dna_size = population * self.dna_total_length
         # prepare memory
-        other_chromosomes = numpy.zeros(total_dna_size, dtype=numpy.int32)
+        other_chromosomes = numpy.zeros(total_dna_size, dtype=self.gene_dtype)
         ratios = numpy.zeros(population, dtype=numpy.float32)
         # read data from cl
-        cl.enqueue_read_buffer(queue, self.__dev_ratios, ratios)
-        cl.enqueue_read_buffer(queue, self.__dev_other_chromosomes, other_chromosomes).wait()
+        cl.enqueue_copy(queue, ratios, self.__dev_ratios, is_blocking=False)
+        cl.enqueue_copy(queue, other_chromosomes, self.__dev_other_chromosomes,
+                        is_blocking=False).wait()
         # save all of them
         data['other_chromosomes'] = other_chromosomes
         data['ratios'] = ratios
 
     def restore(self, data, ctx, queue, population):
-        other_chromosomes = data['other_chromosomes']
-        ratios = data['ratios']
+        # other_chromosomes and ratios are rebuilt every generation, so they are
+        # not included in checkpoints.
+        total_dna_size = population * self.dna_total_length
+        other_chromosomes = numpy.asarray(data.get('other_chromosomes',
+                                                   numpy.zeros(total_dna_size)),
+                                          dtype=self.gene_dtype)
+        ratios = numpy.asarray(data.get('ratios', numpy.zeros(population)),
+                               dtype=numpy.float32)
         # prepare CL memory
         mf = cl.mem_flags
-        self.__dev_ratios = cl.Buffer(ctx, mf.WRITE_ONLY, ratios.nbytes)
+        self.__dev_ratios = cl.Buffer(ctx, mf.READ_WRITE, ratios.nbytes)
         self.__dev_other_chromosomes = cl.Buffer(ctx, mf.READ_WRITE | mf.COPY_HOST_PTR,
                                                  hostbuf=other_chromosomes)
         # Copy data from main memory to GPU memory
@@ -123,13 +158,13 @@ class SimpleChromosome:
         # initialize global variables for kernel execution
         total_dna_size = population * self.dna_total_length
 
-        other_chromosomes = numpy.zeros(total_dna_size, dtype=numpy.int32)
+        other_chromosomes = numpy.zeros(total_dna_size, dtype=self.gene_dtype)
         ratios = numpy.zeros(population, dtype=numpy.float32)
 
         mf = cl.mem_flags
 
         # prepare device memory for usage.
-        self.__dev_ratios = cl.Buffer(ctx, mf.WRITE_ONLY, ratios.nbytes)
+        self.__dev_ratios = cl.Buffer(ctx, mf.READ_WRITE, ratios.nbytes)
         self.__dev_other_chromosomes = cl.Buffer(ctx, mf.READ_WRITE | mf.COPY_HOST_PTR,
                                                  hostbuf=other_chromosomes)
 
@@ -144,66 +179,126 @@ class SimpleChromosome:
     def get_mutation_kernel_names(self):
         return ['simple_chromosome_mutate_all']
 
-    def execute_populate(self, prg, queue, population, dev_chromosomes, dev_rnum):
-        prg.simple_chromosome_populate(queue,
-                                       (population,),
-                                       (1,),
-                                       dev_chromosomes,
-                                       dev_rnum).wait()
-
-    def selection_preparation(self, prg, queue, dev_fitnesses):
-        prg.simple_chromosome_calc_ratio(queue,
-                                         (1,),
-                                         (1,),
-                                         dev_fitnesses,
-                                         self.__dev_ratios).wait()
+    def set_work_group_sizes(self, sizes):
+        # Set the local work size of kernels which are run over the population.
+        # The global work size is padded to a multiple of the local size.
+        self.__work_group_sizes.update(sizes)
+
+    def __kernel(self, prg, kernel_name):
+        # Kernels are created once for a built program and reused by launches.
+        if self.__prg is not prg:
+            self.__prg = prg
+            self.__kernels = utils.create_kernels(prg)
+        return self.__kernels[kernel_name]
+
+    def __ndrange(self, kernel_name, population):
+        local_size = self.__work_group_sizes.get(kernel_name, 1)
+        global_size = (population + local_size - 1) // local_size * local_size
+        return (global_size,), (local_size,)
+
+    # The execute functions below only enqueue kernels without waiting for them.
+    # They wait for the events in wait_for and return the list of events of the
+    # enqueued kernels in order, e.g. [pick, crossover] for execute_crossover.
+    # The kernels mark the chromosomes they change in dev_dirty, so that only
+    # these ones are evaluated again.
+    def execute_populate(self, prg, queue, population, generation_idx, dev_chromosomes,
+                         rand_seed, dev_dirty, wait_for=None):
+        kernel = self.__kernel(prg, 'simple_chromosome_populate')
+        evt = kernel(queue,
+                     *self.__ndrange('simple_chromosome_populate', population),
+                     dev_chromosomes,
+                     numpy.uint64(rand_seed),
+                     numpy.uint32(generation_idx),
+                     dev_dirty,
+                     wait_for=wait_for)
+        return [evt]
+
+    def selection_preparation(self, prg, queue, dev_fitnesses, num_of_islands = 1,
+                              wait_for=None):
+        if self.__ratio_wg_size is None:
+            # calc_ratio is run in a work group for each island and each work
+            # item uses a float of local memory.
+            self.__ratio_wg_size = utils.calculate_power_of_2_work_group_size(prg,
+                                                                              queue.device,
+                                                                              'simple_chromosome_calc_ratio',
+                                                                              4)
+        wg_size = self.__ratio_wg_size
+        kernel = self.__kernel(prg, 'simple_chromosome_calc_ratio')
+        evt = kernel(queue,
+                     (wg_size * num_of_islands,),
+                     (wg_size,),
+                     dev_fitnesses,
+                     self.__dev_ratios,
+                     cl.LocalMemory(wg_size * 4),
+                     wait_for=wait_for)
+        return [evt]
 
     def execute_get_current_elites(self, prg, queue, top,
                                    dev_chromosomes, dev_current_elites,
-                                   dev_best_indices):
-        prg.simple_chromosome_get_the_elites(queue, (1,), (1,),
-                                             dev_best_indices,
-                                             dev_chromosomes,
-                                             dev_current_elites,
-                                             numpy.int32(top)).wait()
+                                   dev_best_indices, wait_for=None):
+        kernel = self.__kernel(prg, 'simple_chromosome_get_the_elites')
+        evt = kernel(queue, (self.num_of_genes, top), None,
+                     dev_best_indices,
+                     dev_chromosomes,
+                     dev_current_elites,
+                     numpy.int32(top),
+                     wait_for=wait_for)
+        return [evt]
 
     def execute_update_current_elites(self, prg, queue, top, dev_worst_indices,
                                       dev_chromosomes, dev_updated_elites,
-                                      dev_fitnesses, dev_updated_elite_fitness):
-        prg.simple_chromosome_update_the_elites(queue, (1,), (1,),
-                                                numpy.int32(top),
-                                                dev_worst_indices,
-                                                dev_chromosomes,
-                                                dev_updated_elites,
-                                                dev_fitnesses,
-                                                dev_updated_elite_fitness).wait()
+                                      dev_fitnesses, dev_updated_elite_fitness,
+                                      wait_for=None):
+        kernel = self.__kernel(prg, 'simple_chromosome_update_the_elites')
+        evt = kernel(queue, (self.num_of_genes, top), None,
+                     numpy.int32(top),
+                     dev_worst_indices,
+                     dev_chromosomes,
+                     dev_updated_elites,
+                     dev_fitnesses,
+                     dev_updated_elite_fitness,
+                     wait_for=wait_for)
+        return [evt]
 
     def execute_crossover(self, prg, queue, population, generation_idx, prob_crossover,
-                          dev_chromosomes, dev_fitnesses, dev_rnum, best_fitness):
-        prg.simple_chromosome_pick_chromosomes(queue,
-                                               (population,),
-                                               (1,),
-                                               dev_chromosomes,
-                                               dev_fitnesses,
-                                               self.__dev_other_chromosomes,
-                                               self.__dev_ratios,
-                                               dev_rnum).wait()
-        prg.simple_chromosome_do_crossover(queue,
-                                           (population,),
-                                           (1,),
-                                           dev_chromosomes,
-                                           dev_fitnesses,
-                                           self.__dev_other_chromosomes,
-                                           dev_rnum,
-                                           numpy.float32(best_fitness),
-                                           numpy.float32(prob_crossover)).wait()
+                          dev_chromosomes, dev_fitnesses, rand_seed, dev_dirty,
+                          dev_best_fitnesses, dev_worst_fitnesses, wait_for=None):
+        pick_kernel = self.__kernel(prg, 'simple_chromosome_pick_chromosomes')
+        pick_evt = pick_kernel(queue,
+                               *self.__ndrange('simple_chromosome_pick_chromosomes', population),
+                               dev_chromosomes,
+                               dev_fitnesses,
+                               self.__dev_other_chromosomes,
+                               self.__dev_ratios,
+                               numpy.uint64(rand_seed),
+                               numpy.uint32(generation_idx),
+                               wait_for=wait_for)
+        crossover_kernel = self.__kernel(prg, 'simple_chromosome_do_crossover')
+        crossover_evt = crossover_kernel(queue,
+                                         *self.__ndrange('simple_chromosome_do_crossover', population),
+                                         dev_chromosomes,
+                                         dev_fitnesses,
+                                         self.__dev_other_chromosomes,
+                                         numpy.uint64(rand_seed),
+                                         numpy.uint32(generation_idx),
+                                         dev_dirty,
+                                         dev_best_fitnesses,
+                                         dev_worst_fitnesses,
+                                         numpy.float32(prob_crossover),
+                                         wait_for=[pick_evt])
+        return [pick_evt, crossover_evt]
 
 
     def execute_mutation(self, prg, queue, population, generation_idx, prob_mutate,
-                         dev_chromosomes, dev_fitnesses, dev_rnum, extra_list):
-        prg.simple_chromosome_mutate_all(queue,
-                                         (population,),
-                                         (1,),
-                                         dev_chromosomes,
-                                         dev_rnum,
-                                         numpy.float32(prob_mutate)).wait()
+                         dev_chromosomes, dev_fitnesses, rand_seed, dev_dirty,
+                         extra_list, wait_for=None):
+        kernel = self.__kernel(prg, 'simple_chromosome_mutate_all')
+        evt = kernel(queue,
+                     *self.__ndrange('simple_chromosome_mutate_all', population),
+                     dev_chromosomes,
+                     numpy.uint64(rand_seed),
+                     numpy.uint32(generation_idx),
+                     dev_dirty,
+                     numpy.float32(prob_mutate),
+                     wait_for=wait_for)
+        return [evt]
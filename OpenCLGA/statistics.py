@@ -0,0 +1,203 @@
+#!/usr/bin/python3
+import os
+import numpy
+from numpy.lib.format import open_memmap
+
+## A columnar store of per generation statistics.
+#  The generation index, best, worst, avg fitness and the timestamp of each
+#  generation are kept in preallocated numpy arrays, one array per column.
+#  The retention could be bounded by a capacity. If retention is 'ring', only
+#  the latest 'capacity' generations are kept. If it is 'downsample', every
+#  other generation is dropped when the store is full and only 1 of 'stride'
+#  generations is recorded afterwards, so the whole run is covered with a
+#  coarser resolution. Without capacity, the arrays grow as needed.
+#  The columns could be spilled to memory-mapped .npy files in a folder.
+#  @var __capacity The max number of retained generations, None if unbounded.
+#  @var __retention 'ring' or 'downsample'.
+#  @var __path The folder to spill columns, None if they are in memory.
+#  @var __columns A dictionary of column name to its numpy array.
+#  @var __size The number of valid rows.
+#  @var __head The row of the oldest generation, it is only used by 'ring'.
+#  @var __stride Only 1 of __stride generations is retained for 'downsample'.
+#  @var __total The number of all recorded generations, including the dropped.
+#  @var __last The row of the last recorded generation.
+#  @var avg_time_per_gen The avg. elapsed time per generation of the run.
+class Statistics(object):
+    COLUMNS = [('generation', numpy.int64),
+               ('best', numpy.float32),
+               ('worst', numpy.float32),
+               ('avg', numpy.float32),
+               ('time', numpy.float64)]
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, capacity = None, retention = 'ring', path = None):
+        assert retention in ['ring', 'downsample']
+        assert capacity is None or capacity > 1
+        self.__capacity = capacity
+        self.__retention = retention
+        self.__path = path
+        self.__columns = {}
+        self.__allocate(capacity if capacity else Statistics.INITIAL_CAPACITY)
+        self.clear()
+
+    ## Remove all recorded generations.
+    def clear(self):
+        self.__size = 0
+        self.__head = 0
+        self.__stride = 1
+        self.__total = 0
+        self.__last = None
+        self.avg_time_per_gen = 0
+
+    ## Create the arrays of columns with the given number of rows and copy the
+    #  valid rows of current columns into them.
+    def __allocate(self, rows):
+        columns = {}
+        for name, dtype in Statistics.COLUMNS:
+            if self.__path:
+                os.makedirs(self.__path, exist_ok=True)
+                path = os.path.join(self.__path, name + '.npy')
+                temp_path = path + '.tmp'
+                columns[name] = open_memmap(temp_path, mode='w+', dtype=dtype, shape=(rows,))
+            else:
+                columns[name] = numpy.zeros(rows, dtype=dtype)
+            if name in self.__columns:
+                columns[name][:self.__size] = self.__ordered(name)
+        if self.__path:
+            for name, dtype in Statistics.COLUMNS:
+                path = os.path.join(self.__path, name + '.npy')
+                columns[name].flush()
+                os.replace(path + '.tmp', path)
+        self.__columns = columns
+        self.__head = 0
+
+    def __len__(self):
+        return self.__size
+
+    @property
+    def total(self):
+        return self.__total
+
+    @property
+    def capacity(self):
+        return self.__capacity
+
+    @property
+    def column_names(self):
+        return [name for name, dtype in Statistics.COLUMNS]
+
+    ## Return the valid rows of a column from the oldest to the latest one.
+    def __ordered(self, name):
+        column = self.__columns[name]
+        if self.__head == 0:
+            return column[:self.__size]
+        return numpy.concatenate((column[self.__head:self.__size], column[:self.__head]))
+
+    ## Record the statistics of a generation.
+    #  @param generation The index of the generation.
+    #  @param best The best fitness.
+    #  @param worst The worst fitness.
+    #  @param avg The avg fitness.
+    #  @param timestamp The time when the generation is done.
+    def record(self, generation, best, worst, avg, timestamp):
+        row = (generation, best, worst, avg, timestamp)
+        self.__last = row
+        self.__total += 1
+        if self.__retention == 'downsample' and (self.__total - 1) % self.__stride != 0:
+            return
+
+        rows = len(self.__columns['generation'])
+        if self.__size == rows:
+            if self.__capacity is None:
+                self.__allocate(rows * 2)
+            elif self.__retention == 'downsample':
+                self.__downsample()
+                if (self.__total - 1) % self.__stride != 0:
+                    return
+            else:
+                # Overwrite the oldest one.
+                self.__write(self.__head, row)
+                self.__head = (self.__head + 1) % rows
+                return
+        self.__write(self.__size, row)
+        self.__size += 1
+
+    def __write(self, index, row):
+        for (name, dtype), value in zip(Statistics.COLUMNS, row):
+            self.__columns[name][index] = value
+
+    ## Keep every other retained generation and double the stride.
+    def __downsample(self):
+        kept = (self.__size + 1) // 2
+        for name, dtype in Statistics.COLUMNS:
+            column = self.__columns[name]
+            column[:kept] = column[:self.__size:2]
+        self.__size = kept
+        self.__stride *= 2
+
+    ## Return the statistics of the last recorded generation as a dictionary,
+    #  or None if nothing is recorded. It is always available even if the
+    #  generation is dropped by downsampling.
+    def last(self):
+        if self.__last is None:
+            return None
+        return dict(zip(self.column_names, self.__last))
+
+    ## Return the retained rows as a dictionary of column name to numpy array.
+    #  @param start The first generation to be included.
+    #  @param stop The generation to stop at, which is excluded.
+    #  @param columns The list of column names, all columns by default.
+    def query(self, start = None, stop = None, columns = None):
+        columns = columns if columns else self.column_names
+        generations = self.__ordered('generation')
+        mask = numpy.ones(len(generations), dtype=bool)
+        if start is not None:
+            mask &= generations >= start
+        if stop is not None:
+            mask &= generations < stop
+        return { name : self.__ordered(name)[mask] for name in columns }
+
+    ## Return a column of retained rows as a numpy array, e.g. store['best'].
+    def __getitem__(self, name):
+        assert name in self.column_names
+        return numpy.array(self.__ordered(name))
+
+    ## Return a compatible dictionary of the old statistics format. e.g.
+    #  { gen : { 'best': best_fitness, 'worst': worst_fitness, 'avg': avg_fitness },
+    #    'avg_time_per_gen': avg. elapsed time per generation }
+    def to_dict(self):
+        rows = self.query(columns=['generation', 'best', 'worst', 'avg'])
+        result = {}
+        for gen, best, worst, avg in zip(rows['generation'].tolist(),
+                                         rows['best'].tolist(),
+                                         rows['worst'].tolist(),
+                                         rows['avg'].tolist()):
+            result[gen] = { 'best' : best, 'worst' : worst, 'avg' : avg }
+        result['avg_time_per_gen'] = self.avg_time_per_gen
+        return result
+
+    ## Return a picklable dictionary of the store for saving.
+    def get_state(self):
+        return { 'columns' : self.query(),
+                 'total' : self.__total,
+                 'stride' : self.__stride,
+                 'last' : self.__last,
+                 'avg_time_per_gen' : self.avg_time_per_gen }
+
+    ## Load the dictionary from get_state. The old statistics format(a dict of
+    #  generation to its statistics) is also accepted.
+    def set_state(self, state):
+        self.clear()
+        if 'columns' not in state:
+            for gen in sorted([k for k in state if k != 'avg_time_per_gen']):
+                value = state[gen]
+                self.record(gen, value['best'], value['worst'], value['avg'], 0)
+            self.avg_time_per_gen = state.get('avg_time_per_gen', 0)
+            return
+        columns = state['columns']
+        for row in zip(*[columns[name] for name in self.column_names]):
+            self.record(*row)
+        self.__total = state['total']
+        self.__stride = max(self.__stride, state['stride'])
+        self.__last = state['last']
+        self.avg_time_per_gen = state['avg_time_per_gen']
@@ -1,5 +1,7 @@
 #!/usr/bin/python3
+import numpy
 import random
+import hashlib
 from math import pi, sqrt, asin, cos, sin, pow
 
 def get_local_IP():
@@ -16,6 +18,15 @@ def get_testing_params():
 def init_testing_rand_seed():
     random.seed(119)
 
+## Derive a 64 bits seed from the seed of a run and a key deterministically,
+#  e.g. the seed of each device or worker.
+#  @param seed The seed of a run.
+#  @param key Anything which could be formatted as a string to tell the
+#             derived seeds apart.
+def derive_seed(seed, key):
+    digest = hashlib.sha256('{}/{}'.format(seed, key).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'little')
+
 def calc_linear_distance(x1, y1, x2, y2):
     return sqrt((x2 - x1)**2 + (y2 - y1)**2)
 
@@ -138,3 +149,55 @@ def calculate_estimated_kernel_usage(prog, ctx, kernel_name):
         import traceback
         traceback.print_exc()
         return None, None, None, None
+
+## Create all kernels of a built program. The kernels should be reused by
+#  every launch, because retrieving a kernel by prg.<kernel_name> creates a
+#  new cl.Kernel each time.
+#  @param prog The built program.
+#  @return A dictionary of kernel name to cl.Kernel.
+def create_kernels(prog):
+    return { kernel.function_name : kernel for kernel in prog.all_kernels() }
+
+## Find the narrowest integer type which holds all values from 0 to max_value.
+#  @param max_value The largest value to be stored.
+#  @return A tuple of the type name in kernel and the numpy dtype.
+def get_narrowest_int_type(max_value):
+    for kernel_type, dtype in [('uchar', numpy.uint8), ('ushort', numpy.uint16)]:
+        if max_value <= numpy.iinfo(dtype).max:
+            return kernel_type, dtype
+    return 'int', numpy.int32
+
+## Find the largest power of 2 work group size for a kernel which is run in a
+#  single work group, e.g. a parallel reduction or scan.
+#  @param prog The built program.
+#  @param device The device to run the kernel.
+#  @param kernel_name The name of the kernel.
+#  @param local_mem_per_item The bytes of local memory used by each work item.
+#  @param max_size The upper bound of the work group size.
+def calculate_power_of_2_work_group_size(prog, device, kernel_name,
+                                         local_mem_per_item, max_size=256):
+    import pyopencl as cl
+    from pyopencl import kernel_work_group_info as kwgi
+    kernel = cl.Kernel(prog, kernel_name)
+    max_size = min(device.max_work_group_size,
+                   kernel.get_work_group_info(kwgi.WORK_GROUP_SIZE, device),
+                   max_size)
+    wg_size = 1
+    while wg_size * 2 <= max_size and\
+          wg_size * 2 * local_mem_per_item <= device.local_mem_size:
+        wg_size *= 2
+    return wg_size
+
+## Sum the sizes of device memory held by the attributes of objects, including
+#  the ones in lists. It is used to estimate the device memory usage of a GA.
+#  @param objects The objects to be examined, e.g. an OpenCLGA and its sample
+#                 chromosome.
+#  @return The size in bytes.
+def get_device_memory_size(*objects):
+    import pyopencl as cl
+    total = 0
+    for obj in objects:
+        for value in vars(obj).values():
+            values = value if isinstance(value, (list, tuple)) else [value]
+            total += sum([v.size for v in values if isinstance(v, cl.MemoryObjectHolder)])
+    return total
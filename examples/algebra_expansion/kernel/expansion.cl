@@ -7,7 +7,7 @@ float expansion_calc_difference(global __SimpleChromosome* chromosome,
   float calculated = 0.0;
 
   for (int i = 0; i < 11; i++) {
-    calculated += (*chromosome).genes[i] * pown((float)x, 10 - i) * pown((float)y, i);
+    calculated += CHROMOSOME_GENE(chromosome, i) * pown((float)x, 10 - i) * pown((float)y, i);
   }
   return fabs(expected - calculated);
 }
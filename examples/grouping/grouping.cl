@@ -8,9 +8,9 @@ void grouping_fitness(global __SimpleChromosome* chromosome,
                       global float* fitnesses,
                       int chromosome_size,
                       int chromosome_count,
-                      global int* numOfGroups,
-                      global float* pointX,
-                      global float* pointY)
+                      global const int* numOfGroups,
+                      global const float* pointX,
+                      global const float* pointY)
 {
   float dist = 0.0;
   int group = numOfGroups[0];
@@ -18,7 +18,7 @@ void grouping_fitness(global __SimpleChromosome* chromosome,
     for (int j = 0; j < chromosome_size; j++) {
       for (int k = j+1; k < chromosome_size; k++) {
         // Calculate the sum of dist among all points in the same group.
-        if (i == chromosome->genes[j] && i == chromosome->genes[k]) {
+        if (i == CHROMOSOME_GENE(chromosome, j) && i == CHROMOSOME_GENE(chromosome, k)) {
           dist += calc_linear_distance(pointX[j],
                                        pointY[j],
                                        pointX[k],
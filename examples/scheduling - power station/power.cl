@@ -42,13 +42,13 @@ void power_station_fitness(global __SimpleChromosome* chromosome,
   // The maximum load of each quarter
   int LOADS[] = {-80, -90, -65, -70};
   // calculate the power generation by unit 1 ~ 7 at each quarters.
-  generate_powers_type1(LOADS, chromosome->genes[0], CAPACITIES[0]);
-  generate_powers_type1(LOADS, chromosome->genes[1], CAPACITIES[1]);
-  generate_powers_type2(LOADS, chromosome->genes[2], CAPACITIES[2]);
-  generate_powers_type2(LOADS, chromosome->genes[3], CAPACITIES[3]);
-  generate_powers_type2(LOADS, chromosome->genes[4], CAPACITIES[4]);
-  generate_powers_type2(LOADS, chromosome->genes[5], CAPACITIES[5]);
-  generate_powers_type2(LOADS, chromosome->genes[6], CAPACITIES[6]);
+  generate_powers_type1(LOADS, CHROMOSOME_GENE(chromosome, 0), CAPACITIES[0]);
+  generate_powers_type1(LOADS, CHROMOSOME_GENE(chromosome, 1), CAPACITIES[1]);
+  generate_powers_type2(LOADS, CHROMOSOME_GENE(chromosome, 2), CAPACITIES[2]);
+  generate_powers_type2(LOADS, CHROMOSOME_GENE(chromosome, 3), CAPACITIES[3]);
+  generate_powers_type2(LOADS, CHROMOSOME_GENE(chromosome, 4), CAPACITIES[4]);
+  generate_powers_type2(LOADS, CHROMOSOME_GENE(chromosome, 5), CAPACITIES[5]);
+  generate_powers_type2(LOADS, CHROMOSOME_GENE(chromosome, 6), CAPACITIES[6]);
   // let
   *fitnesses = LOADS[0] < LOADS[1] ? LOADS[0] : LOADS[1];
 
@@ -12,58 +12,90 @@ float calc_spherical_distance(float x1, float y1, float x2, float y2)
 
 float taiwan_calc_fitness(global __ShufflerChromosome* chromosome,
                           int chromosome_size,
-                          global float* pointsX,
-                          global float* pointsY)
+                          global const float* pointsX,
+                          global const float* pointsY)
 {
   float dist = 0.0;
   for (int i = 0; i < chromosome_size - 1; i++) {
-    dist += calc_spherical_distance(pointsX[chromosome->genes[i + 1]],
-                                    pointsY[chromosome->genes[i + 1]],
-                                    pointsX[chromosome->genes[i]],
-                                    pointsY[chromosome->genes[i]]);
+    dist += calc_spherical_distance(pointsX[CHROMOSOME_GENE(chromosome, i + 1)],
+                                    pointsY[CHROMOSOME_GENE(chromosome, i + 1)],
+                                    pointsX[CHROMOSOME_GENE(chromosome, i)],
+                                    pointsY[CHROMOSOME_GENE(chromosome, i)]);
   }
-  return dist + calc_spherical_distance(pointsX[chromosome->genes[0]],
-                                        pointsY[chromosome->genes[0]],
-                                        pointsX[chromosome->genes[chromosome_size - 1]],
-                                        pointsY[chromosome->genes[chromosome_size - 1]]);
+  return dist + calc_spherical_distance(pointsX[CHROMOSOME_GENE(chromosome, 0)],
+                                        pointsY[CHROMOSOME_GENE(chromosome, 0)],
+                                        pointsX[CHROMOSOME_GENE(chromosome, chromosome_size - 1)],
+                                        pointsY[CHROMOSOME_GENE(chromosome, chromosome_size - 1)]);
 }
 
 void taiwan_fitness(global __ShufflerChromosome* chromosome,
                     global float* fitnesses,
                     int chromosome_size,
                     int chromosome_count,
-                    global float* pointsX,
-                    global float* pointsY)
+                    global const float* pointsX,
+                    global const float* pointsY)
 {
   *fitnesses = taiwan_calc_fitness(chromosome, chromosome_size, pointsX, pointsY);
 }
 
-void taiwan_fitness_swap(global __ShufflerChromosome* chromosome, int cp, int p1)
+int taiwan_swapped_gene(global __ShufflerChromosome* chromosome, int p, int i, int j)
 {
-  int temp_p = chromosome->genes[cp];
-  chromosome->genes[cp] = chromosome->genes[p1];
-  chromosome->genes[p1] = temp_p;
+  // the gene at position p after swapping the genes at position i and j.
+  return CHROMOSOME_GENE(chromosome, p == i ? j : (p == j ? i : p));
 }
 
-int improving_only_mutation_helper(global int* c,
+float taiwan_fitness_delta(global GENE_TYPE* c,
+                           int i,
+                           int j,
+                           int chromosome_size,
+                           global const float* pointsX,
+                           global const float* pointsY)
+{
+  global __ShufflerChromosome* chromosome = (global __ShufflerChromosome*) c;
+  // Only the edges starting at position i - 1, i, j - 1 and j are changed.
+  int edges[4] = { (i + chromosome_size - 1) % chromosome_size, i,
+                   (j + chromosome_size - 1) % chromosome_size, j };
+  float delta = 0.0;
+  for (int e = 0; e < 4; e++) {
+    // An edge is counted once if i and j are adjacent.
+    int counted = 0;
+    for (int k = 0; k < e; k++) {
+      counted |= edges[k] == edges[e];
+    }
+    if (counted) {
+      continue;
+    }
+    int from = edges[e];
+    int to = (from + 1) % chromosome_size;
+    int new_from = taiwan_swapped_gene(chromosome, from, i, j);
+    int new_to = taiwan_swapped_gene(chromosome, to, i, j);
+    delta += calc_spherical_distance(pointsX[new_to], pointsY[new_to],
+                                     pointsX[new_from], pointsY[new_from]) -
+             calc_spherical_distance(pointsX[CHROMOSOME_GENE(chromosome, to)],
+                                     pointsY[CHROMOSOME_GENE(chromosome, to)],
+                                     pointsX[CHROMOSOME_GENE(chromosome, from)],
+                                     pointsY[CHROMOSOME_GENE(chromosome, from)]);
+  }
+  return delta;
+}
+
+int improving_only_mutation_helper(global GENE_TYPE* c,
                                    int idx,
                                    int chromosome_size,
-                                   global float* pointsX,
-                                   global float* pointsY)
+                                   global const float* pointsX,
+                                   global const float* pointsY)
 {
-  global __ShufflerChromosome* chromosome = (global __ShufflerChromosome*) c;
-  // We will search the one whose distance is shorter than original one
+  // We will search the one whose distance is shorter than original one. Only
+  // the change of distance is calculated for each swapping.
   int best_index = idx;
-  float shortest = taiwan_calc_fitness(chromosome, chromosome_size, pointsX, pointsY);
+  float shortest = 0.0;
   float current;
 
-  for (int i = 0; i < chromosome_size - 1; i++) {
+  for (int i = 0; i < chromosome_size; i++) {
     if (i == idx) {
       continue;
     }
-    taiwan_fitness_swap(chromosome, i, idx);
-    current = taiwan_calc_fitness(chromosome, chromosome_size, pointsX, pointsY);
-    taiwan_fitness_swap(chromosome, i, idx);
+    current = taiwan_fitness_delta(c, idx, i, chromosome_size, pointsX, pointsY);
     if (current < shortest) {
       shortest = current;
       best_index = i;
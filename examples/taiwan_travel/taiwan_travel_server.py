@@ -56,6 +56,9 @@ def get_taiwan_travel_info():
     fstr = ''.join(f.readlines())
     f.close()
 
+    # The fitness of mutated chromosomes is updated by the change of distance
+    # instead of calculating the whole path again.
+    sample.use_delta_fitness('taiwan_fitness_delta')
     # It seems we don't need to use this helper if we enlarge the population size. Please
     # re-evaluate and remove or uncomment the following line:
     # sample.use_improving_only_mutation('improving_only_mutation_helper')
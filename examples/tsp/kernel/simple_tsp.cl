@@ -8,19 +8,19 @@ void simple_tsp_fitness(global __ShufflerChromosome* chromosome,
                         global float* fitnesses,
                         int chromosome_size,
                         int chromosome_count,
-                        global float* pointsX,
-                        global float* pointsY)
+                        global const float* pointsX,
+                        global const float* pointsY)
 {
   float dist = 0.0;
   for (int i = 0; i < chromosome_size-1; i++) {
-    dist += calc_linear_distance(pointsX[chromosome->genes[i + 1]],
-                                  pointsY[chromosome->genes[i + 1]],
-                                  pointsX[chromosome->genes[i]],
-                                  pointsY[chromosome->genes[i]]);
+    dist += calc_linear_distance(pointsX[CHROMOSOME_GENE(chromosome, i + 1)],
+                                  pointsY[CHROMOSOME_GENE(chromosome, i + 1)],
+                                  pointsX[CHROMOSOME_GENE(chromosome, i)],
+                                  pointsY[CHROMOSOME_GENE(chromosome, i)]);
   }
-  dist += calc_linear_distance(pointsX[chromosome->genes[0]],
-                                pointsY[chromosome->genes[0]],
-                                pointsX[chromosome->genes[chromosome_size - 1]],
-                                pointsY[chromosome->genes[chromosome_size - 1]]);
+  dist += calc_linear_distance(pointsX[CHROMOSOME_GENE(chromosome, 0)],
+                                pointsY[CHROMOSOME_GENE(chromosome, 0)],
+                                pointsX[CHROMOSOME_GENE(chromosome, chromosome_size - 1)],
+                                pointsY[CHROMOSOME_GENE(chromosome, chromosome_size - 1)]);
   *fitnesses = dist;
 }